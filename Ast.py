@@ -1,22 +1,78 @@
+from types import GeneratorType
+
 from Statement import (
-    IfStatement, WhileStatement, ForStatement, PrintStatement, AssignmentStatement,
-    BinaryExpression, UnaryExpression, IntegerLiteral, Identifier, StringLiteral, FunctionStatement, FunctionCall
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, PrintStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, IntegerLiteral, Identifier, StringLiteral, FunctionStatement, FunctionCall,
+    ArrayLiteral, MethodCall, ReturnStatement, MapLiteral, IndexExpression, IndexAssignment
+)
+from ErrorHandler import LexerError, ParserError, InterpreterError, nested_too_deeply
+from Resolver import UNSET, new_frame, resolve, left_chain
+from Output import make_output
+from Methods import site_of
+from Maps import get_item, set_item, build_map, index_error
+from Iteration import iterate
+from Builtins import find_builtin
+from Rope import STRING_TYPES, concat
+from Memo import DEFAULT_MEMO_SIZE, MISSING, Memoizer
+from Optimizer import NO_VALUE, apply_operator, counted_loop, counted_range
+from CallStack import (
+    DEFAULT_MAX_DEPTH, DEFAULT_RETURN, NORMAL, TailCall, Suspensions, run_calls, depth_exceeded
 )
-from ErrorHandler import LexerError, ParserError, InterpreterError
-
-class ArrayLiteral:
-    def __init__(self, elements):
-        self.elements = elements
-    
-    def append(self, element):
-        self.elements.append(element)
-        return None
-
-class MethodCall:
-    def __init__(self, object_name, method_name, arguments):
-        self.object_name = object_name
-        self.method_name = method_name
-        self.arguments = arguments
+
+# Binding powers, loosest first. `=` is right associative so `a = b = 1`
+# assigns both; any other operator the lexer produces binds like `*` and `/`
+# and fails when evaluated, as before.
+BINARY_PRECEDENCE = {
+    '=': 1,
+    '==': 2, '!=': 2,
+    '<': 3, '>': 3, '<=': 3, '>=': 3,
+    '+': 4, '-': 4,
+    '*': 5, '/': 5,
+}
+DEFAULT_PRECEDENCE = 5
+UNARY_PRECEDENCE = 6
+RIGHT_ASSOCIATIVE = frozenset(['='])
+
+class Block:
+    # A compound statement whose header is parsed and whose body is still being read.
+    def __init__(self, kind, token, header):
+        self.kind = kind
+        self.token = token
+        self.header = header
+        self.statements = []
+        self.memoize = True
+
+    def __str__(self):
+        return f"Block({self.kind}, {self.header}, {self.statements})"
+
+    def __repr__(self):
+        return self.__str__()
+
+GROUP_CLOSERS = {'array': 'RBRACKET', 'index': 'RBRACKET', 'map': 'RBRACE'}
+
+class Group:
+    # An open `[`, `(`, `{`, fn or method call argument list or index inside
+    # an expression. An index group holds the node being indexed in target.
+    def __init__(self, kind, token, method=None, target=None):
+        self.kind = kind
+        self.token = token
+        self.method = method
+        self.target = target
+        self.closer = GROUP_CLOSERS.get(kind, 'RPAREN')
+        self.elements = []
+
+    def __str__(self):
+        return f"Group({self.kind}, {self.elements})"
+
+    def __repr__(self):
+        return self.__str__()
+
+def adjacent(token, following):
+    # `name[i]` indexes only with nothing between the name (or the `]` of the
+    # previous index) and the `[`, so `[a [1]]` is still an array of two elements.
+    if token.column is None or following.column is None:
+        return True
+    return following.line == token.line and following.column == token.column + len(token.value)
 
 class Parser:
     def __init__(self, tokens):
@@ -31,327 +87,501 @@ class Parser:
         else:
             self.current_token = None
 
+    def position(self, node, token):
+        node.line = token.line
+        node.column = token.column
+        return node
+
     def parse(self):
-        statements = []
+        return [statement for statement, end in self.parse_top_level()]
+
+    def parse_top_level(self):
+        # Yields every top-level statement with the index of the token just past it,
+        # so callers can map statements back onto the token stream.
         while self.current_token is not None:
-            if self.current_token.type == 'KEYWORD':
-                if self.current_token.value == 'if':
-                    statements.append(self.parse_if())
-                elif self.current_token.value == 'while':
-                    statements.append(self.parse_while())
-                elif self.current_token.value == 'for':
-                    statements.append(self.parse_for())
-                elif self.current_token.value in ['print', 'println']:
-                    statements.append(self.parse_print())
-                elif self.current_token.value == 'fn':
-                    statements.append(self.parse_function())
-            elif self.current_token.type == 'IDENTIFIER':
-                statements.append(self.parse_assignment_or_function_call())
+            if self.current_token.type in ('KEYWORD', 'IDENTIFIER'):
+                yield self.parse_statement(top_level=True), self.current_pos
             else:
                 self.advance()
-        return statements
-
-    def parse_if(self):
-        self.advance() 
-        if self.current_token.type == 'LPAREN':
-            self.advance() 
-            condition = self.parse_expression()
-            if self.current_token.type == 'RPAREN':
-                self.advance() 
-                if self.current_token.type == 'LBRACE':
-                    self.advance() 
-                    true_statements = self.parse_statements()
-                    if self.current_token.type == 'RBRACE':
-                        self.advance() 
-                        false_statements = []
-                        if self.current_token is not None and self.current_token.type == 'KEYWORD' and self.current_token.value == 'else':
-                            self.advance() 
-                            if self.current_token.type == 'LBRACE':
-                                self.advance() 
-                                false_statements = self.parse_statements()
-                                if self.current_token.type == 'RBRACE':
-                                    self.advance() 
-                                else:
-                                    raise ParserError("Expected RBRACE")
-                            else:
-                                raise ParserError("Expected LBRACE")
-                        return IfStatement(condition, true_statements, false_statements)
-                    else:
-                        raise ParserError("Expected RBRACE")
-                else:
-                    raise ParserError("Expected LBRACE")
-            else:
-                raise ParserError("Expected RPAREN")
-        else:
-            raise ParserError("Expected LPAREN")
-    ...
 
-    def parse_while(self):
+    def check(self, token_type):
+        return self.current_token is not None and self.current_token.type == token_type
+
+    def expect(self, token_type, message):
+        if self.current_token is None:
+            raise ParserError(f"{message} at end of input")
+        if self.current_token.type != token_type:
+            raise ParserError(message)
         self.advance()
-        if self.current_token.type == 'LPAREN':
-            self.advance()
-            condition = self.parse_expression()
-            if self.current_token.type == 'RPAREN':
+
+    def parse_statement(self, top_level=False):
+        # Compound statements wait on `blocks` for their closing brace instead
+        # of recursing, so nesting depth doesn't touch the Python stack.
+        blocks = []
+        while True:
+            token = self.current_token
+            if blocks and token is not None and token.type == 'RBRACE':
                 self.advance()
-                if self.current_token.type == 'LBRACE':
-                    self.advance()
-                    statements = self.parse_statements()
-                    if self.current_token.type == 'RBRACE':
-                        self.advance()
-                        return WhileStatement(condition, statements)
-                    else:
-                        raise ParserError("Expected RBRACE")
-                else:
-                    raise ParserError("Expected LBRACE")
+                block = blocks.pop()
+                statement = self.close_block(block, blocks)
+                if statement is None:
+                    continue
+                token = block.token
             else:
-                raise ParserError("Expected RPAREN")
-        else:
-            raise ParserError("Expected LPAREN")
+                if token is None:
+                    raise ParserError("Expected RBRACE at end of input")
+                statement = self.open_statement(blocks, top_level and not blocks)
+                if statement is None:
+                    if not blocks:
+                        return None
+                    continue
+            self.position(statement, token)
+            if not blocks:
+                return statement
+            blocks[-1].statements.append(statement)
 
-    def parse_for(self):
-        self.advance()
-        if self.current_token.type == 'LPAREN':
+    def open_statement(self, blocks, top_level):
+        # Returns a simple statement, or None after pushing the block a compound one opens.
+        token = self.current_token
+        if token.type == 'KEYWORD':
+            if token.value == 'if':
+                self.advance()
+                blocks.append(Block('if', token, self.parse_condition()))
+                return None
+            elif token.value == 'while':
+                self.advance()
+                blocks.append(Block('while', token, self.parse_condition()))
+                return None
+            elif token.value == 'for':
+                self.advance()
+                kind, header = self.parse_for_header()
+                blocks.append(Block(kind, token, header))
+                return None
+            elif token.value in ('print', 'println'):
+                return self.parse_print()
+            elif token.value == 'fn':
+                self.advance()
+                blocks.append(Block('fn', token, self.parse_function_header()))
+                return None
+            elif token.value == 'return':
+                if not any(block.kind == 'fn' for block in blocks):
+                    raise ParserError("Unexpected return outside fn")
+                return self.parse_return()
+            elif top_level:
+                raise ParserError(f"Unexpected keyword {token}")
+        elif token.type == 'IDENTIFIER':
+            return self.parse_assignment_or_function_call()
+        elif token.type == 'SEMICOLON' and not top_level:
+            self.advance()
+            return None
+        elif token.type == 'COMMENT':
+            # `# nomemo` directly inside a fn body keeps that fn out of the memo caches.
             self.advance()
-            if self.current_token.type == 'IDENTIFIER':
-                identifier = self.current_token.value
+            if blocks and blocks[-1].kind == 'fn' and token.value.strip() == 'nomemo':
+                blocks[-1].memoize = False
+            return None
+        raise ParserError(f"Expected KEYWORD or IDENTIFIER but got {token}")
+
+    def close_block(self, block, blocks):
+        if block.kind == 'if':
+            if self.current_token is not None and self.current_token.type == 'KEYWORD' and self.current_token.value == 'else':
                 self.advance()
-                if self.current_token.type == 'OPERATOR' and self.current_token.value == '=':
-                    self.advance()
-                    start = self.parse_expression()
-                    if self.current_token.type == 'SEMICOLON':
-                        self.advance()
-                        condition = self.parse_expression()
-                        if self.current_token.type == 'SEMICOLON':
-                            self.advance()
-                            step = self.parse_expression()
-                            # print(step)
-                            if self.current_token.type == 'RPAREN':
-                                self.advance()
-                                if self.current_token.type == 'LBRACE':
-                                    self.advance()
-                                    statements = self.parse_statements()
-                                    if self.current_token.type == 'RBRACE':
-                                        self.advance()
-                                        return ForStatement(identifier, start, condition, step, statements)
-                                    else:
-                                        raise ParserError("Expected RBRACE")
-                                else:
-                                    raise ParserError("Expected LBRACE")
-                            else:
-                                raise ParserError("Expected RPAREN")
-                        else:
-                            raise ParserError("Expected SEMICOLON after step")
-                    else:
-                        raise ParserError("Expected SEMICOLON after condition")
-                else:
-                    raise ParserError("Expected OPERATOR")
-            else:
-                raise ParserError("Expected IDENTIFIER")
+                self.expect('LBRACE', "Expected LBRACE")
+                blocks.append(Block('else', block.token, (block.header, block.statements)))
+                return None
+            return IfStatement(block.header, block.statements, [])
+        elif block.kind == 'else':
+            condition, true_statements = block.header
+            return IfStatement(condition, true_statements, block.statements)
+        elif block.kind == 'while':
+            return WhileStatement(block.header, block.statements)
+        elif block.kind == 'for':
+            identifier, start, condition, step = block.header
+            return ForStatement(identifier, start, condition, step, block.statements)
+        elif block.kind == 'foreach':
+            identifier, iterable = block.header
+            return ForEachStatement(identifier, iterable, block.statements)
         else:
-            raise ParserError("Expected LPAREN")
+            name, parameters = block.header
+            function = FunctionStatement(name, parameters, block.statements)
+            function.memoize = block.memoize
+            return function
 
-    def parse_print(self):
+    def parse_condition(self):
+        self.expect('LPAREN', "Expected LPAREN")
+        condition = self.parse_expression()
+        self.expect('RPAREN', "Expected RPAREN")
+        self.expect('LBRACE', "Expected LBRACE")
+        return condition
+
+    def parse_for_header(self):
+        self.expect('LPAREN', "Expected LPAREN")
+        if not self.check('IDENTIFIER'):
+            raise ParserError("Expected IDENTIFIER")
+        identifier = self.current_token.value
         self.advance()
-        if self.current_token.type == 'LPAREN':
+        if self.check('IDENTIFIER') and self.current_token.value == 'in':
+            # `for (x in items)`. `in` is only special here, it stays a valid name.
             self.advance()
-            expression = self.parse_expression()
-            if self.current_token.type == 'RPAREN':
-                # print(self.current_token)
-                self.advance()
-                if self.current_token.type == 'SEMICOLON':
-                    self.advance()
-                    return PrintStatement(expression)
-                else:
-                    raise ParserError("Expected SEMICOLON")
-            else:
-                raise ParserError("Expected RPAREN")
-        else:
-            raise ParserError("Expected LPAREN")
-
-    def parse_function(self):
-        self.advance()  
-        if self.current_token.type == 'IDENTIFIER':
-            name = self.current_token.value
-            self.advance()  
-            if self.current_token.type == 'LPAREN':
-                self.advance()  
-                parameters = []
-                while self.current_token.type != 'RPAREN':
-                    if self.current_token.type == 'IDENTIFIER':
-                        parameters.append(self.current_token.value)
-                        # print(parameters)
-                        self.advance()
-                        if self.current_token.type == 'COMMA':
-                            self.advance()  
-                    else:
-                        raise ParserError("Expected IDENTIFIER or RPAREN")
-                if self.current_token.type == 'RPAREN':
-                    self.advance()  
-                    if self.current_token.type == 'LBRACE':
-                        self.advance()  
-                        body = self.parse_statements()
-                        if self.current_token.type == 'RBRACE':
-                            self.advance()  
-                            return FunctionStatement(name, parameters, body)
-                        else:
-                            raise ParserError("Expected RBRACE")
-                    else:
-                        raise ParserError("Expected LBRACE")
-                else:
-                    raise ParserError("Expected RPAREN")
-            else:
-                raise ParserError("Expected LPAREN")
-        else:
+            iterable = self.parse_expression()
+            self.expect('RPAREN', "Expected RPAREN")
+            self.expect('LBRACE', "Expected LBRACE")
+            return 'foreach', (identifier, iterable)
+        if not (self.check('OPERATOR') and self.current_token.value == '='):
+            raise ParserError("Expected OPERATOR")
+        self.advance()
+        start = self.parse_expression()
+        self.expect('SEMICOLON', "Expected SEMICOLON after condition")
+        condition = self.parse_expression()
+        self.expect('SEMICOLON', "Expected SEMICOLON after step")
+        step = self.parse_expression()
+        self.expect('RPAREN', "Expected RPAREN")
+        self.expect('LBRACE', "Expected LBRACE")
+        return 'for', (identifier, start, condition, step)
+
+    def parse_function_header(self):
+        if not self.check('IDENTIFIER'):
             raise ParserError("Expected IDENTIFIER")
+        name = self.current_token.value
+        self.advance()
+        self.expect('LPAREN', "Expected LPAREN")
+        parameters = []
+        while not self.check('RPAREN'):
+            if not self.check('IDENTIFIER'):
+                raise ParserError("Expected IDENTIFIER or RPAREN")
+            parameters.append(self.current_token.value)
+            self.advance()
+            if self.check('COMMA'):
+                self.advance()
+        self.advance()
+        self.expect('LBRACE', "Expected LBRACE")
+        return name, parameters
+
+    def parse_print(self):
+        newline = self.current_token.value == 'println'
+        self.advance()
+        self.expect('LPAREN', "Expected LPAREN")
+        expression = self.parse_expression()
+        self.expect('RPAREN', "Expected RPAREN")
+        self.expect('SEMICOLON', "Expected SEMICOLON")
+        return PrintStatement(expression, newline)
+
+    def parse_return(self):
+        self.advance()
+        value = None
+        if not self.check('SEMICOLON'):
+            value = self.parse_expression()
+        self.expect('SEMICOLON', "Expected SEMICOLON")
+        return ReturnStatement(value)
 
     def parse_assignment_or_function_call(self):
-        identifier = self.current_token.value
+        token = self.current_token
+        identifier = token.value
         self.advance()
-        if self.current_token.type == 'OPERATOR' and self.current_token.value == '=':
+        if self.check('LBRACKET') and adjacent(token, self.current_token):
+            return self.parse_index_assignment(token)
+        if self.check('OPERATOR') and self.current_token.value == '=':
             self.advance()
             value = self.parse_expression()
+            if self.current_token is None:
+                raise ParserError("Expected SEMICOLON at end of input")
+            # Without the semicolon the assignment is dropped and parsing goes on from there.
             if self.current_token.type == 'SEMICOLON':
                 self.advance()
                 return AssignmentStatement(identifier, value)
-        elif self.current_token.type == 'LPAREN':
+            return None
+        elif self.check('LPAREN'):
             self.advance()
-            arguments = []
-            while self.current_token.type != 'RPAREN':
-                arguments.append(self.parse_expression())
-                if self.current_token.type == 'COMMA':
-                    self.advance()
-                # print(arguments)
-            if self.current_token.type == 'RPAREN':
-                self.advance()
-                if self.current_token.type == 'SEMICOLON':
-                    self.advance()
-                    return FunctionCall(identifier, arguments)
-                else:
-                    raise ParserError("Expected SEMICOLON")
-            else:
-                raise ParserError("Expected RPAREN")
-        elif self.current_token.type == 'DOT':
+            arguments = self.parse_arguments('RPAREN')
+            self.expect('SEMICOLON', "Expected SEMICOLON")
+            return FunctionCall(identifier, arguments)
+        elif self.check('DOT'):
             self.advance()
-            method = self.current_token.value
+            method = self.current_token.value if self.current_token is not None else None
             self.eat('IDENTIFIER')
-            if self.current_token.type == 'LPAREN':
-                self.eat('LPAREN')
-                arguments = []
-                while self.current_token.type != 'RPAREN':
-                    arguments.append(self.parse_expression())
-                    if self.current_token.type == 'COMMA':
-                        self.eat('COMMA')
-                self.eat('RPAREN')
-                if self.current_token.type == 'SEMICOLON':
-                    self.eat('SEMICOLON')
-                    return MethodCall(identifier, method, arguments)
-                else:
-                    raise ParserError("Expected SEMICOLON")
-            else:
-                raise ParserError("Expected LPAREN")
+            self.expect('LPAREN', "Expected LPAREN")
+            arguments = self.parse_arguments('RPAREN')
+            self.expect('SEMICOLON', "Expected SEMICOLON")
+            return MethodCall(identifier, method, arguments)
         else:
             raise ParserError("Expected OPERATOR or LPAREN")
 
-    def parse_expression(self):
-        return self.parse_binary()
-
-    def parse_binary(self):
-        left = self.parse_unary()
-        while self.current_token.type == 'OPERATOR':
-            operator = self.current_token.value
+    def parse_index_assignment(self, token):
+        # `m[k] = v;` and `m[a][b] = v;`, everything but the last index is read.
+        target = self.position(Identifier(token.value), token)
+        while True:
             self.advance()
-            right = self.parse_unary()
-            left = BinaryExpression(left, operator, right)
-        return left
+            index = self.parse_expression()
+            closer = self.current_token
+            self.expect('RBRACKET', "Expected RBRACKET")
+            if not (self.check('LBRACKET') and adjacent(closer, self.current_token)):
+                break
+            target = self.position(IndexExpression(target, index), token)
+        if not (self.check('OPERATOR') and self.current_token.value == '='):
+            raise ParserError("Expected OPERATOR")
+        self.advance()
+        value = self.parse_expression()
+        self.expect('SEMICOLON', "Expected SEMICOLON")
+        return IndexAssignment(target, index, value)
 
-    def parse_unary(self):
-        if self.current_token.type == 'OPERATOR':
-            operator = self.current_token.value
-            self.advance()
-            return UnaryExpression(operator, self.parse_unary())
-        else:
-            return self.parse_primary()
+    def parse_arguments(self, closer):
+        # Commas between arguments are optional, as they always have been.
+        arguments = []
+        while not self.check(closer):
+            if self.current_token is None:
+                raise ParserError(f"Expected {closer} at end of input")
+            arguments.append(self.parse_expression())
+            if self.check('COMMA'):
+                self.advance()
+        self.advance()
+        return arguments
 
     def eat(self, token_type):
+        if self.current_token is None:
+            raise ParserError(f"Expected token type {token_type} at end of input")
         if self.current_token.type == token_type:
             self.advance()
         else:
             raise ParserError(f"Expected token type {token_type} but got {self.current_token.type}")
 
-    def parse_primary(self):
-        token = self.current_token
-        if token.type == 'INTEGER':
-            self.eat('INTEGER')
-            return IntegerLiteral(token.value)
-        elif token.type == 'IDENTIFIER':
-            self.eat('IDENTIFIER')
-            if self.current_token.type == 'DOT':
-                self.eat('DOT')
-                method = self.current_token.value
-                self.eat('IDENTIFIER')
-                if self.current_token.type == 'LPAREN':
-                    self.eat('LPAREN')
-                    arguments = []
-                    while self.current_token.type != 'RPAREN':
-                        arguments.append(self.parse_expression())
-                        if self.current_token.type == 'COMMA':
-                            self.eat('COMMA')
-                    self.eat('RPAREN')
-                    return MethodCall(token.value, method, arguments)
-            return Identifier(token.value)
-        elif token.type == 'STRING':
-            self.eat('STRING')
-            return StringLiteral(token.value)
-        elif token.type == 'LBRACKET':
-            self.eat('LBRACKET')
-            elements = []
-            while self.current_token.type != 'RBRACKET':
-                elements.append(self.parse_expression())
-                if self.current_token.type == 'COMMA':
-                    self.eat('COMMA')
-            self.eat('RBRACKET')
-            return ArrayLiteral(elements)
-        else:
-            print(f"Unhandled token: {token}")
-            raise ParserError("Expected INTEGER, IDENTIFIER, STRING, or LBRACKET")
-
-
-    def parse_statements(self):
-        statements = []
-        while self.current_token is not None and self.current_token.type != 'RBRACE':
-            statement = self.parse_statement()
-            if statement is not None:
-                statements.append(statement)
-        return statements
-
-    def parse_statement(self):
-        if self.current_token.type == 'KEYWORD' and self.current_token.value == 'if':
-            return self.parse_if()
-        elif self.current_token.type == 'KEYWORD' and self.current_token.value == 'while':
-            return self.parse_while()
-        elif self.current_token.type == 'KEYWORD' and self.current_token.value == 'for':
-            return self.parse_for()
-        elif self.current_token.type == 'KEYWORD' and self.current_token.value in ['print', 'println']:
-            return self.parse_print()
-        elif self.current_token.type == 'KEYWORD' and self.current_token.value == 'fn':
-            return self.parse_function()
-        elif self.current_token.type == 'IDENTIFIER':
-            return self.parse_assignment_or_function_call()
-        elif self.current_token.type == 'SEMICOLON':
-            self.advance()
-            return None
+    def parse_expression(self):
+        # Operator precedence parsing over explicit stacks. operands and
+        # operators belong to the innermost open bracket; opening `[`, `(` or a
+        # call's argument list saves them on `groups` and closing it
+        # restores them, so neither long operator chains nor deep nesting use
+        # the Python stack. The token index stays local until the expression ends.
+        tokens = self.tokens
+        size = len(tokens)
+        pos = self.current_pos
+        operands = []
+        operators = []
+        groups = []
+        while True:
+            # An operand, after any prefix operators.
+            token = tokens[pos] if pos < size else None
+            while token is not None and token.type == 'OPERATOR':
+                operators.append((UNARY_PRECEDENCE, token.value, token))
+                pos += 1
+                token = tokens[pos] if pos < size else None
+            if token is None:
+                raise ParserError("Expected INTEGER, IDENTIFIER, STRING, or LBRACKET at end of input")
+            token_type = token.type
+            pos += 1
+            if token_type == 'INTEGER':
+                node = IntegerLiteral(token.value)
+            elif token_type == 'IDENTIFIER':
+                node = None
+                if pos < size and tokens[pos].type == 'DOT':
+                    pos += 1
+                    method = tokens[pos] if pos < size else None
+                    if method is None:
+                        raise ParserError("Expected token type IDENTIFIER at end of input")
+                    if method.type != 'IDENTIFIER':
+                        raise ParserError(f"Expected token type IDENTIFIER but got {method.type}")
+                    pos += 1
+                    # Without an argument list `x.name` reads just `x`.
+                    if pos < size and tokens[pos].type == 'LPAREN':
+                        pos += 1
+                        if pos < size and tokens[pos].type == 'RPAREN':
+                            pos += 1
+                            node = MethodCall(token.value, method.value, [])
+                        else:
+                            groups.append((operands, operators, Group('method', token, method.value)))
+                            operands, operators = [], []
+                            continue
+                elif pos < size and tokens[pos].type == 'LPAREN':
+                    pos += 1
+                    if pos < size and tokens[pos].type == 'RPAREN':
+                        pos += 1
+                        node = FunctionCall(token.value, [])
+                    else:
+                        groups.append((operands, operators, Group('call', token)))
+                        operands, operators = [], []
+                        continue
+                elif pos < size and tokens[pos].type == 'LBRACKET' and adjacent(token, tokens[pos]):
+                    pos += 1
+                    target = self.position(Identifier(token.value), token)
+                    groups.append((operands, operators, Group('index', token, target=target)))
+                    operands, operators = [], []
+                    continue
+                if node is None:
+                    node = Identifier(token.value)
+            elif token_type == 'STRING':
+                node = StringLiteral(token.value)
+            elif token_type == 'LBRACKET':
+                if pos < size and tokens[pos].type == 'RBRACKET':
+                    pos += 1
+                    node = ArrayLiteral([])
+                else:
+                    groups.append((operands, operators, Group('array', token)))
+                    operands, operators = [], []
+                    continue
+            elif token_type == 'LPAREN':
+                groups.append((operands, operators, Group('paren', token)))
+                operands, operators = [], []
+                continue
+            elif token_type == 'LBRACE':
+                if pos < size and tokens[pos].type == 'RBRACE':
+                    pos += 1
+                    node = MapLiteral([], [])
+                else:
+                    groups.append((operands, operators, Group('map', token)))
+                    operands, operators = [], []
+                    continue
+            else:
+                print(f"Unhandled token: {token}")
+                raise ParserError("Expected INTEGER, IDENTIFIER, STRING, or LBRACKET")
+            node.line = token.line
+            node.column = token.column
+            operands.append(node)
+
+            # A binary operator leads to the next operand; anything else ends the
+            # expression, or the current element of the innermost bracket.
+            while True:
+                token = tokens[pos] if pos < size else None
+                if token is not None and token.type == 'OPERATOR':
+                    operator = token.value
+                    precedence = BINARY_PRECEDENCE.get(operator, DEFAULT_PRECEDENCE)
+                    if operator in RIGHT_ASSOCIATIVE:
+                        while operators and operators[-1][0] > precedence:
+                            self.reduce(operands, operators)
+                    else:
+                        while operators and operators[-1][0] >= precedence:
+                            self.reduce(operands, operators)
+                    # Binary operators carry no token, prefix ones keep theirs for the position.
+                    operators.append((precedence, operator, None))
+                    pos += 1
+                    break
+                while operators:
+                    self.reduce(operands, operators)
+                if not groups:
+                    self.current_pos = pos
+                    self.current_token = token
+                    return operands[0]
+                group = groups[-1][2]
+                group.elements.append(operands[0])
+                if group.kind == 'paren' or group.kind == 'index':
+                    if token is None:
+                        raise ParserError(f"Expected {group.closer} at end of input")
+                    if token.type != group.closer:
+                        raise ParserError(f"Expected {group.closer}")
+                elif group.kind == 'map' and len(group.elements) % 2:
+                    # A key, its value follows the colon.
+                    if token is None:
+                        raise ParserError("Expected COLON at end of input")
+                    if token.type != 'COLON':
+                        raise ParserError("Expected COLON")
+                    pos += 1
+                    operands, operators = [], []
+                    break
+                else:
+                    # Commas between elements are optional, as they always have been.
+                    if token is not None and token.type == 'COMMA':
+                        pos += 1
+                        token = tokens[pos] if pos < size else None
+                    if token is None:
+                        raise ParserError(f"Expected {group.closer} at end of input")
+                    if token.type != group.closer:
+                        operands, operators = [], []
+                        break
+                pos += 1
+                operands, operators, group = groups.pop()
+                if group.kind == 'array':
+                    node = ArrayLiteral(group.elements)
+                elif group.kind == 'method':
+                    node = MethodCall(group.token.value, group.method, group.elements)
+                elif group.kind == 'call':
+                    node = FunctionCall(group.token.value, group.elements)
+                elif group.kind == 'map':
+                    node = MapLiteral(group.elements[0::2], group.elements[1::2])
+                elif group.kind == 'index':
+                    node = IndexExpression(group.target, group.elements[0])
+                    closer = tokens[pos - 1]
+                    if pos < size and tokens[pos].type == 'LBRACKET' and adjacent(closer, tokens[pos]):
+                        # `m[a][b]`: index what was just read.
+                        pos += 1
+                        node.line = group.token.line
+                        node.column = group.token.column
+                        groups.append((operands, operators, Group('index', group.token, target=node)))
+                        operands, operators = [], []
+                        break
+                else:
+                    operands.append(group.elements[0])
+                    continue
+                node.line = group.token.line
+                node.column = group.token.column
+                operands.append(node)
+
+    def reduce(self, operands, operators):
+        precedence, operator, token = operators.pop()
+        if token is not None:
+            operands.append(self.position(UnaryExpression(operator, operands.pop()), token))
         else:
-            raise ParserError(f"Expected KEYWORD or IDENTIFIER but got {self.current_token}")
+            # Binary expressions start where their left operand does.
+            right = operands.pop()
+            left = operands.pop()
+            expression = BinaryExpression(left, operator, right)
+            expression.line = left.line
+            expression.column = left.column
+            operands.append(expression)
 
 class Interpreter:
-    def __init__(self, statements):
-        self.statements = statements
+    MODES = ("tree", "closure")
+
+    def __init__(self, statements, mode="tree", output=None, profiler=None, memo_size=DEFAULT_MEMO_SIZE,
+                 max_depth=DEFAULT_MAX_DEPTH):
+        if mode not in self.MODES:
+            raise InterpreterError(f"Unknown interpreter mode: {mode}")
+        self.mode = mode
+        # Calls to pure fns are answered from per-fn LRU caches, memo_size=0 turns that off.
+        self.memo = Memoizer(memo_size) if memo_size else None
+        self.prepare(statements)
         self.variables = {}
         self.functions = {}
+        self.frame = None
+        self.output = make_output(output)
+        self.profiler = profiler
+        # Calls run on run_calls' explicit stack, see CallStack.py.
+        self.max_depth = max_depth
+        self.calls = []
+        self.suspends = Suspensions()
+        # counted_loop's verdict per ForStatement, see execute_for.
+        self.counted_loops = {}
+        if profiler is not None:
+            # Shadow the hot methods on this instance only, so an interpreter
+            # without a profiler runs exactly the same code as before.
+            self.execute = self.execute_profiled
+            self.execute_steps = self.execute_steps_profiled
+            self.call_function = self.call_function_profiled
+            self.function_steps = self.function_steps_profiled
+
+    def prepare(self, statements):
+        try:
+            self.statements = resolve(statements)
+            if self.memo is not None:
+                self.memo.analyze(self.statements)
+        except RecursionError:
+            raise nested_too_deeply(f"{self.mode} engine") from None
 
     def interpret(self):
-        for statement in self.statements:
-            self.execute(statement)
+        # Calls don't use the Python stack, but walking nested blocks and
+        # expressions does.
+        try:
+            if self.mode == "closure":
+                program = ClosureCompiler(self).compile_block(self.statements)
+                program(None)
+                return
+            for statement in self.statements:
+                self.execute(statement)
+        except RecursionError:
+            raise nested_too_deeply(f"{self.mode} engine") from None
+        finally:
+            self.output.flush()
+
+    def run(self, statements):
+        # Runs more statements against the same variables and functions (used by the REPL).
+        self.prepare(statements)
+        self.interpret()
 
     def execute(self, statement):
         if isinstance(statement, IfStatement):
@@ -360,6 +590,8 @@ class Interpreter:
             self.execute_while(statement)
         elif isinstance(statement, ForStatement):
             self.execute_for(statement)
+        elif isinstance(statement, ForEachStatement):
+            self.execute_for_each(statement)
         elif isinstance(statement, PrintStatement):
             self.execute_print(statement)
         elif isinstance(statement, AssignmentStatement):
@@ -370,30 +602,35 @@ class Interpreter:
             self.execute_function_call(statement)
         elif isinstance(statement, MethodCall):
             self.execute_method_call(statement)
+        elif isinstance(statement, IndexAssignment):
+            self.execute_index_assignment(statement)
+        elif isinstance(statement, ReturnStatement):
+            raise InterpreterError("return outside fn")
         else:
             raise InterpreterError(f"Unknown statement type: {type(statement)}")
 
+    def load(self, name, slot, default):
+        if slot is not None:
+            value = self.frame[slot]
+            if value is not UNSET:
+                return value
+        return self.variables.get(name, default)
+
+    def store(self, name, slot, value):
+        if slot is None:
+            self.variables[name] = value
+        else:
+            self.frame[slot] = value
+
     def execute_method_call(self, statement):
-        obj = self.variables.get(statement.object_name)
-        if obj is None:
-            raise InterpreterError(f"Object {statement.object_name} not defined")
-        if statement.method_name == 'count':
-            if isinstance(obj, str):
-                return len(obj)
-            elif isinstance(obj, list):
-                return len(obj)
-            elif isinstance(obj, dict):
-                return len(obj)
-            else:
-                raise InterpreterError(f"Object {statement.object_name} is not a string, list, or dictionary")
-        method = getattr(obj, statement.method_name, None)
-        if method is None:
-            raise InterpreterError(f"Method {statement.method_name} not found on object {statement.object_name}")
+        obj = self.load(statement.object_name, statement.slot, None)
+        site = statement.site or site_of(statement)
+        function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
         arguments = [self.evaluate(arg) for arg in statement.arguments]
         try:
-            return method(*arguments)
+            return function(obj, *arguments)
         except Exception as e:
-            raise InterpreterError(f"Error executing method {statement.method_name} on object {statement.object_name}: {e}")
+            raise site.failure(e)
 
     def evaluate(self, expression):
         if isinstance(expression, IntegerLiteral):
@@ -401,17 +638,31 @@ class Interpreter:
         elif isinstance(expression, StringLiteral):
             return expression.value
         elif isinstance(expression, Identifier):
+            if expression.slot is not None:
+                value = self.frame[expression.slot]
+                if value is not UNSET:
+                    return value
             return self.variables.get(expression.identifier, 0)
         elif isinstance(expression, ArrayLiteral):
             return [self.evaluate(element) for element in expression.elements]
+        elif isinstance(expression, IndexExpression):
+            return get_item(self.evaluate(expression.target), self.evaluate(expression.index))
+        elif isinstance(expression, MapLiteral):
+            items = []
+            for key, value in zip(expression.keys, expression.values):
+                items.append(self.evaluate(key))
+                items.append(self.evaluate(value))
+            return build_map(items)
         elif isinstance(expression, MethodCall):
             return self.execute_method_call(expression)
+        elif isinstance(expression, FunctionCall):
+            return self.execute_function_call(expression)
         elif isinstance(expression, BinaryExpression):
             left = self.evaluate(expression.left)
             right = self.evaluate(expression.right)
             if expression.operator == '+':
-                if isinstance(left, str) or isinstance(right, str):
-                    return str(left) + str(right)
+                if isinstance(left, STRING_TYPES) or isinstance(right, STRING_TYPES):
+                    return concat(left, right)
                 return left + right
             elif expression.operator == '-':
                 return left - right
@@ -433,7 +684,7 @@ class Interpreter:
                 return left <= right
             elif expression.operator == '=':
                 if isinstance(expression.left, Identifier):
-                    self.variables[expression.left.identifier] = right
+                    self.store(expression.left.identifier, expression.left.slot, right)
                     return right
                 else:
                     raise InterpreterError("Left side of assignment must be an identifier")
@@ -463,38 +714,1125 @@ class Interpreter:
                 self.execute(stmt)
 
     def execute_for(self, statement):
-        # print(statement.identifier)
-        self.variables[statement.identifier] = self.evaluate(statement.start)
+        start = self.evaluate(statement.start)
+        self.store(statement.identifier, statement.slot, start)
+        counters = self.counted_range(statement, start)
+        if counters is not None:
+            for counter in counters:
+                self.store(statement.identifier, statement.slot, counter)
+                for stmt in statement.statements:
+                    self.execute(stmt)
+            self.store(statement.identifier, statement.slot, start + len(counters) * counters.step)
+            return
         while self.evaluate(statement.condition):
             for stmt in statement.statements:
                 self.execute(stmt)
-            self.variables[statement.identifier] = self.evaluate(statement.step)
+            self.store(statement.identifier, statement.slot, self.evaluate(statement.step))
+
+    def execute_for_each(self, statement):
+        for value in iterate(self.evaluate(statement.iterable)):
+            self.store(statement.identifier, statement.slot, value)
+            for stmt in statement.statements:
+                self.execute(stmt)
+
+    def counted_range(self, statement, start):
+        # A for loop counting an int towards an int bound runs over a range
+        # instead of evaluating its condition and step every time. Anything
+        # else, including a bound that isn't an int, takes the general path.
+        loop = self.counted_loops.get(statement, NO_VALUE)
+        if loop is NO_VALUE:
+            loop = self.counted_loops[statement] = counted_loop(statement)
+        if loop is None or type(start) is not int:
+            return None
+        operator, bound, step = loop
+        bound = self.evaluate(bound)
+        if type(bound) is not int:
+            return None
+        return counted_range(start, operator, bound, step)
 
     def execute_print(self, statement):
         value = self.evaluate(statement.expression)
-        print(value)
+        self.output.write(value, statement.newline)
 
     def execute_assignment(self, statement):
-        self.variables[statement.identifier] = self.evaluate(statement.value)
+        self.store(statement.identifier, statement.slot, self.evaluate(statement.value))
+
+    def execute_index_assignment(self, statement):
+        container = self.evaluate(statement.target)
+        key = self.evaluate(statement.index)
+        set_item(container, key, self.evaluate(statement.value))
 
     def execute_function(self, statement):
+        previous = self.functions.get(statement.name)
         self.functions[statement.name] = statement
+        if previous is not None and previous is not statement and self.memo is not None:
+            self.memo.invalidate()
 
     def execute_function_call(self, statement):
+        # A call made outside any fn body. It and every call it leads to run on
+        # one explicit stack; the ones inside fn bodies are yielded to it.
+        frame = self.frame
+        try:
+            return run_calls(self.call(statement), self.max_depth, self.calls)
+        finally:
+            self.frame = frame
+
+    # The *_steps methods are generator versions of execute and evaluate for the
+    # nodes that call a fn or return (see CallStack.py). Everything else inside
+    # a fn body still runs through execute and evaluate. Statements give back
+    # NORMAL, or the value of the `return` they ran.
+
+    def function_steps(self, function, frame):
+        self.frame = frame
+        return (yield from self.block_steps(function.body, DEFAULT_RETURN))
+
+    def block_steps(self, statements, finished=NORMAL):
+        suspends = self.suspends
+        for statement in statements:
+            if not suspends(statement):
+                self.execute(statement)
+            elif type(statement) is FunctionCall and self.profiler is None and not suspends.nested(statement):
+                steps = self.call(statement)
+                if type(steps) is GeneratorType:
+                    caller = self.frame
+                    yield steps
+                    self.frame = caller
+            else:
+                result = yield from self.execute_steps(statement)
+                if result is not NORMAL:
+                    return result
+        return finished
+
+    def execute_steps(self, statement):
+        if isinstance(statement, ReturnStatement):
+            if statement.value is None:
+                return DEFAULT_RETURN
+            if isinstance(statement.value, FunctionCall):
+                if self.suspends.nested(statement.value):
+                    return (yield from self.call_steps(statement.value, tail=True))
+                result = self.call(statement.value, tail=True)
+                if type(result) is TailCall:
+                    yield result
+                return result
+            return (yield from self.evaluate_steps(statement.value))
+        elif isinstance(statement, IfStatement):
+            if (yield from self.evaluate_steps(statement.condition)):
+                return (yield from self.block_steps(statement.true_statements))
+            return (yield from self.block_steps(statement.false_statements))
+        elif isinstance(statement, WhileStatement):
+            while (yield from self.evaluate_steps(statement.condition)):
+                result = yield from self.block_steps(statement.statements)
+                if result is not NORMAL:
+                    return result
+        elif isinstance(statement, ForStatement):
+            start = yield from self.evaluate_steps(statement.start)
+            self.store(statement.identifier, statement.slot, start)
+            counters = self.counted_range(statement, start)
+            if counters is not None:
+                for counter in counters:
+                    self.store(statement.identifier, statement.slot, counter)
+                    result = yield from self.block_steps(statement.statements)
+                    if result is not NORMAL:
+                        return result
+                self.store(statement.identifier, statement.slot, start + len(counters) * counters.step)
+                return NORMAL
+            while (yield from self.evaluate_steps(statement.condition)):
+                result = yield from self.block_steps(statement.statements)
+                if result is not NORMAL:
+                    return result
+                self.store(statement.identifier, statement.slot, (yield from self.evaluate_steps(statement.step)))
+        elif isinstance(statement, ForEachStatement):
+            for value in iterate((yield from self.evaluate_steps(statement.iterable))):
+                self.store(statement.identifier, statement.slot, value)
+                result = yield from self.block_steps(statement.statements)
+                if result is not NORMAL:
+                    return result
+        elif isinstance(statement, PrintStatement):
+            self.output.write((yield from self.evaluate_steps(statement.expression)), statement.newline)
+        elif isinstance(statement, AssignmentStatement):
+            self.store(statement.identifier, statement.slot, (yield from self.evaluate_steps(statement.value)))
+        elif isinstance(statement, IndexAssignment):
+            container = yield from self.evaluate_steps(statement.target)
+            key = yield from self.evaluate_steps(statement.index)
+            set_item(container, key, (yield from self.evaluate_steps(statement.value)))
+        elif isinstance(statement, FunctionCall):
+            yield from self.call_steps(statement)
+        elif isinstance(statement, MethodCall):
+            yield from self.method_call_steps(statement)
+        else:
+            self.execute(statement)
+        return NORMAL
+
+    def evaluate_steps(self, expression):
+        if not self.suspends(expression):
+            return self.evaluate(expression)
+        if isinstance(expression, FunctionCall):
+            if self.suspends.nested(expression):
+                return (yield from self.call_steps(expression))
+            value = self.call(expression)
+            if type(value) is GeneratorType:
+                caller = self.frame
+                value = yield value
+                self.frame = caller
+            return value
+        elif isinstance(expression, BinaryExpression):
+            left = yield from self.evaluate_steps(expression.left)
+            right = yield from self.evaluate_steps(expression.right)
+            if expression.operator == '=':
+                if isinstance(expression.left, Identifier):
+                    self.store(expression.left.identifier, expression.left.slot, right)
+                    return right
+                raise InterpreterError("Left side of assignment must be an identifier")
+            value = apply_operator(expression.operator, left, right)
+            if value is NO_VALUE:
+                raise InterpreterError(f"Unknown operator: {expression.operator}")
+            return value
+        elif isinstance(expression, UnaryExpression):
+            value = yield from self.evaluate_steps(expression.expression)
+            if expression.operator == '-':
+                return -value
+            raise InterpreterError(f"Unknown operator: {expression.operator}")
+        elif isinstance(expression, ArrayLiteral):
+            elements = []
+            for element in expression.elements:
+                elements.append((yield from self.evaluate_steps(element)))
+            return elements
+        elif isinstance(expression, IndexExpression):
+            container = yield from self.evaluate_steps(expression.target)
+            return get_item(container, (yield from self.evaluate_steps(expression.index)))
+        elif isinstance(expression, MapLiteral):
+            items = []
+            for key, value in zip(expression.keys, expression.values):
+                items.append((yield from self.evaluate_steps(key)))
+                items.append((yield from self.evaluate_steps(value)))
+            return build_map(items)
+        elif isinstance(expression, MethodCall):
+            return (yield from self.method_call_steps(expression))
+        raise InterpreterError(f"Unknown expression type: {type(expression)}")
+
+    def method_call_steps(self, statement):
+        obj = self.load(statement.object_name, statement.slot, None)
+        site = statement.site or site_of(statement)
+        function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
+        arguments = []
+        for argument in statement.arguments:
+            arguments.append((yield from self.evaluate_steps(argument)))
+        try:
+            return function(obj, *arguments)
+        except Exception as e:
+            raise site.failure(e)
+
+    def call(self, statement, tail=False):
+        # Starts a call whose arguments call nothing. Gives back its value when
+        # that is known already (a memo hit, or a fn that neither calls nor
+        # returns, which runs right here), otherwise what the caller yields:
+        # the steps of the fn body, or a TailCall.
+        function, frame = self.call_frame(statement)
+        if frame is None:
+            return function.call([self.evaluate(arg) for arg in statement.arguments])
+        for slot, arg in zip(function.parameter_slots, statement.arguments):
+            frame[slot] = self.evaluate(arg)
+        return self.enter(function, frame, tail)
+
+    def call_steps(self, statement, tail=False):
+        function, frame = self.call_frame(statement)
+        if frame is None:
+            arguments = []
+            for arg in statement.arguments:
+                arguments.append((yield from self.evaluate_steps(arg)))
+            return function.call(arguments)
+        for slot, arg in zip(function.parameter_slots, statement.arguments):
+            frame[slot] = yield from self.evaluate_steps(arg)
+        steps = self.enter(function, frame, tail)
+        if type(steps) is GeneratorType or type(steps) is TailCall:
+            caller = self.frame
+            steps = yield steps
+            self.frame = caller
+        return steps
+
+    def call_frame(self, statement):
+        # A builtin (see Builtins.py) comes back with no frame, it is called directly.
         function = self.functions.get(statement.name)
         if function is None:
-            raise InterpreterError(f"Function {statement.name} not defined")
-        
-        local_variables = self.variables.copy()
+            return find_builtin(statement.name, len(statement.arguments)), None
+        frame = new_frame(function)
         if len(function.parameters) != len(statement.arguments):
             raise InterpreterError(f"Function {statement.name} expects {len(function.parameters)} arguments but got {len(statement.arguments)}")
-        for param, arg in zip(function.parameters, statement.arguments):
-            local_variables[param] = self.evaluate(arg)
+        return function, frame
 
-        original_variables = self.variables
-        self.variables = local_variables
+    def enter(self, function, frame, tail=False):
+        key = None
+        cache = self.memo.caches.get(function) if self.memo is not None else None
+        if cache is not None and cache.active:
+            key, result = cache.lookup([frame[slot] for slot in function.parameter_slots])
+            if result is not MISSING:
+                return result
+        if self.suspends.leaf(function):
+            # One level deeper than the caller, unless it takes the caller's place.
+            if len(self.calls) >= self.max_depth + tail:
+                raise depth_exceeded(self.max_depth)
+            self.call_function(function, frame)
+            if key is not None:
+                cache.store(key, DEFAULT_RETURN)
+            return DEFAULT_RETURN
+        if tail:
+            # The callee takes this call's place. Its result goes straight to
+            # our caller, so it is not stored in the cache on the way.
+            return TailCall(self.function_steps, (function, frame))
+        steps = self.function_steps(function, frame)
+        if key is not None:
+            return store_steps(cache, key, steps)
+        return steps
+
+    def call_function(self, function, frame):
+        original_frame = self.frame
+        self.frame = frame
         try:
             for stmt in function.body:
                 self.execute(stmt)
         finally:
-            self.variables = original_variables
+            self.frame = original_frame
+
+    def execute_profiled(self, statement):
+        profiler = self.profiler
+        profiler.enter(profiler.statement_entry(statement))
+        try:
+            Interpreter.execute(self, statement)
+        finally:
+            profiler.exit()
+
+    def execute_steps_profiled(self, statement):
+        profiler = self.profiler
+        profiler.enter(profiler.statement_entry(statement))
+        try:
+            return (yield from Interpreter.execute_steps(self, statement))
+        finally:
+            profiler.exit()
+
+    def call_function_profiled(self, function, frame):
+        profiler = self.profiler
+        profiler.enter(profiler.function_entry(function), True)
+        try:
+            Interpreter.call_function(self, function, frame)
+        finally:
+            profiler.exit()
+
+    def function_steps_profiled(self, function, frame):
+        profiler = self.profiler
+        profiler.enter(profiler.function_entry(function), True)
+        try:
+            return (yield from Interpreter.function_steps(self, function, frame))
+        finally:
+            profiler.exit()
+
+class CompiledFunction:
+    # A leaf fn neither calls nor returns and its body is a plain closure, any
+    # other fn's body is a generator function run by run_calls.
+    def __init__(self, name, parameters, body, parameter_slots, frame_size, statement=None, leaf=False):
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+        self.parameter_slots = parameter_slots
+        self.frame_size = frame_size
+        self.statement = statement
+        self.leaf = leaf
+
+    def __str__(self):
+        return f"CompiledFunction({self.name}, {self.parameters})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ClosureCompiler:
+    # Turns every node into a Python closure taking the active frame (None at the
+    # top level), so node types, operators and variable slots are resolved once
+    # here instead of on every visit.
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.variables = interpreter.variables
+        self.profiler = interpreter.profiler
+        self.suspends = interpreter.suspends
+        if self.profiler is not None:
+            self.compile_statement = self.compile_profiled_statement
+            self.compile_steps = self.compile_profiled_steps
+
+    def compile_load(self, name, slot, default):
+        variables = self.variables
+        if slot is None:
+            return lambda frame: variables.get(name, default)
+        def load_local(frame):
+            value = frame[slot]
+            if value is UNSET:
+                return variables.get(name, default)
+            return value
+        return load_local
+
+    def compile_block(self, statements):
+        compiled = [self.compile_statement(statement) for statement in statements]
+        if len(compiled) == 1:
+            return compiled[0]
+        if len(compiled) == 2:
+            first, second = compiled
+            def run_pair(frame):
+                first(frame)
+                second(frame)
+            return run_pair
+        def run_block(frame):
+            for statement in compiled:
+                statement(frame)
+        return run_block
+
+    def compile_body(self, statements):
+        # Loop bodies are iterated inline by their loop closure.
+        return tuple(self.compile_statement(statement) for statement in statements)
+
+    def compile_statement(self, statement):
+        if isinstance(statement, IfStatement):
+            return self.compile_if(statement)
+        elif isinstance(statement, WhileStatement):
+            return self.compile_while(statement)
+        elif isinstance(statement, ForStatement):
+            return self.compile_for(statement)
+        elif isinstance(statement, ForEachStatement):
+            return self.compile_for_each(statement)
+        elif isinstance(statement, PrintStatement):
+            expression = self.compile_expression(statement.expression)
+            write = self.interpreter.output.write
+            newline = statement.newline
+            def run_print(frame):
+                write(expression(frame), newline)
+            return run_print
+        elif isinstance(statement, AssignmentStatement):
+            name = statement.identifier
+            slot = statement.slot
+            value = self.compile_expression(statement.value)
+            if slot is None:
+                variables = self.variables
+                def run_global_assignment(frame):
+                    variables[name] = value(frame)
+                return run_global_assignment
+            def run_local_assignment(frame):
+                frame[slot] = value(frame)
+            return run_local_assignment
+        elif isinstance(statement, FunctionStatement):
+            return self.compile_function(statement)
+        elif isinstance(statement, FunctionCall):
+            return self.compile_function_call(statement)
+        elif isinstance(statement, MethodCall):
+            return self.compile_method_call(statement)
+        elif isinstance(statement, IndexAssignment):
+            target = self.compile_expression(statement.target)
+            index = self.compile_expression(statement.index)
+            value = self.compile_expression(statement.value)
+            def run_index_assignment(frame):
+                container = target(frame)
+                key = index(frame)
+                set_item(container, key, value(frame))
+            return run_index_assignment
+        elif isinstance(statement, ReturnStatement):
+            return self.compile_error("return outside fn")
+        else:
+            return self.compile_error(f"Unknown statement type: {type(statement)}")
+
+    def compile_profiled_statement(self, statement):
+        profiler = self.profiler
+        entry = profiler.statement_entry(statement)
+        enter = profiler.enter
+        exit = profiler.exit
+        run = ClosureCompiler.compile_statement(self, statement)
+        def run_profiled(frame):
+            enter(entry)
+            try:
+                return run(frame)
+            finally:
+                exit()
+        return run_profiled
+
+    def compile_error(self, message):
+        def run_error(frame):
+            raise InterpreterError(message)
+        return run_error
+
+    def compile_if(self, statement):
+        condition = self.compile_expression(statement.condition)
+        true_block = self.compile_block(statement.true_statements)
+        false_block = self.compile_block(statement.false_statements)
+        def run_if(frame):
+            if condition(frame):
+                true_block(frame)
+            else:
+                false_block(frame)
+        return run_if
+
+    def compile_while(self, statement):
+        condition = self.compile_expression(statement.condition)
+        body = self.compile_body(statement.statements)
+        def run_while(frame):
+            while condition(frame):
+                for stmt in body:
+                    stmt(frame)
+        return run_while
+
+    def compile_for(self, statement):
+        start = self.compile_expression(statement.start)
+        condition = self.compile_expression(statement.condition)
+        step = self.compile_expression(statement.step)
+        body = self.compile_body(statement.statements)
+        if statement.slot is None:
+            # Globals live in a dict, so bind it as the counter's storage.
+            storage = self.variables
+            key = statement.identifier
+        else:
+            storage = None
+            key = statement.slot
+        loop = counted_loop(statement)
+        if loop is None:
+            def run_for(frame):
+                target = frame if storage is None else storage
+                target[key] = start(frame)
+                while condition(frame):
+                    for stmt in body:
+                        stmt(frame)
+                    target[key] = step(frame)
+            return run_for
+        # Counts over a range when start and bound turn out to be ints, see
+        # Interpreter.counted_range.
+        operator, bound, stride = loop
+        bound = self.compile_expression(bound)
+        def run_counted_for(frame):
+            target = frame if storage is None else storage
+            first = target[key] = start(frame)
+            if type(first) is int:
+                last = bound(frame)
+                if type(last) is int:
+                    counters = counted_range(first, operator, last, stride)
+                    for counter in counters:
+                        target[key] = counter
+                        for stmt in body:
+                            stmt(frame)
+                    target[key] = first + len(counters) * stride
+                    return
+            while condition(frame):
+                for stmt in body:
+                    stmt(frame)
+                target[key] = step(frame)
+        return run_counted_for
+
+    def compile_for_each(self, statement):
+        iterable = self.compile_expression(statement.iterable)
+        body = self.compile_body(statement.statements)
+        storage = self.variables if statement.slot is None else None
+        key = statement.identifier if statement.slot is None else statement.slot
+        def run_for_each(frame):
+            target = frame if storage is None else storage
+            for value in iterate(iterable(frame)):
+                target[key] = value
+                for stmt in body:
+                    stmt(frame)
+        return run_for_each
+
+    # Inside fn bodies, statements and expressions that call a fn or return
+    # compile to generator functions instead (see CallStack.py); a statement
+    # one gives back NORMAL, or the value of the `return` it ran.
+
+    def compile_steps_block(self, statements, finished=NORMAL):
+        # Runs of statements that neither call nor return stay one plain
+        # closure, and the value of a call statement is dropped.
+        parts = []
+        plain = []
+        for statement in statements:
+            if self.suspends(statement):
+                if plain:
+                    parts.append((PLAIN_PART, self.compile_block(plain)))
+                    plain = []
+                if (isinstance(statement, FunctionCall) and self.profiler is None
+                        and not self.suspends.nested(statement)):
+                    parts.append((CALL_PART, self.compile_call(statement)))
+                elif isinstance(statement, (FunctionCall, MethodCall)):
+                    parts.append((VALUE_PART, self.compile_steps(statement)))
+                else:
+                    parts.append((STEPS_PART, self.compile_steps(statement)))
+            else:
+                plain.append(statement)
+        if plain:
+            parts.append((PLAIN_PART, self.compile_block(plain)))
+        if not parts:
+            return lift(lambda frame: finished)
+        parts = tuple(parts)
+        def run_block_steps(frame):
+            for kind, run in parts:
+                if kind is PLAIN_PART:
+                    run(frame)
+                elif kind is CALL_PART:
+                    steps = run(frame)
+                    if type(steps) is GeneratorType:
+                        yield steps
+                elif kind is STEPS_PART:
+                    result = yield from run(frame)
+                    if result is not NORMAL:
+                        return result
+                else:
+                    yield from run(frame)
+            return finished
+        return run_block_steps
+
+    def compile_value_steps(self, expression):
+        if self.suspends(expression):
+            return self.compile_expression_steps(expression)
+        return lift(self.compile_expression(expression))
+
+    def compile_steps(self, statement):
+        if isinstance(statement, ReturnStatement):
+            if isinstance(statement.value, FunctionCall):
+                return self.compile_call_steps(statement.value, tail=True)
+            if statement.value is None:
+                return lift(lambda frame: DEFAULT_RETURN)
+            return self.compile_value_steps(statement.value)
+        elif isinstance(statement, IfStatement):
+            condition = self.compile_value_steps(statement.condition)
+            true_block = self.compile_steps_block(statement.true_statements)
+            false_block = self.compile_steps_block(statement.false_statements)
+            def run_if_steps(frame):
+                if (yield from condition(frame)):
+                    return (yield from true_block(frame))
+                return (yield from false_block(frame))
+            return run_if_steps
+        elif isinstance(statement, WhileStatement):
+            condition = self.compile_value_steps(statement.condition)
+            body = self.compile_steps_block(statement.statements)
+            def run_while_steps(frame):
+                while (yield from condition(frame)):
+                    result = yield from body(frame)
+                    if result is not NORMAL:
+                        return result
+                return NORMAL
+            return run_while_steps
+        elif isinstance(statement, ForStatement):
+            start = self.compile_value_steps(statement.start)
+            condition = self.compile_value_steps(statement.condition)
+            step = self.compile_value_steps(statement.step)
+            body = self.compile_steps_block(statement.statements)
+            storage = self.variables if statement.slot is None else None
+            key = statement.identifier if statement.slot is None else statement.slot
+            loop = counted_loop(statement)
+            if loop is not None:
+                operator, bound, stride = loop
+                bound = self.compile_expression(bound)
+            else:
+                bound = None
+            def run_for_steps(frame):
+                target = frame if storage is None else storage
+                first = target[key] = yield from start(frame)
+                if bound is not None and type(first) is int:
+                    last = bound(frame)
+                    if type(last) is int:
+                        counters = counted_range(first, operator, last, stride)
+                        for counter in counters:
+                            target[key] = counter
+                            result = yield from body(frame)
+                            if result is not NORMAL:
+                                return result
+                        target[key] = first + len(counters) * stride
+                        return NORMAL
+                while (yield from condition(frame)):
+                    result = yield from body(frame)
+                    if result is not NORMAL:
+                        return result
+                    target[key] = yield from step(frame)
+                return NORMAL
+            return run_for_steps
+        elif isinstance(statement, ForEachStatement):
+            iterable = self.compile_value_steps(statement.iterable)
+            body = self.compile_steps_block(statement.statements)
+            storage = self.variables if statement.slot is None else None
+            key = statement.identifier if statement.slot is None else statement.slot
+            def run_for_each_steps(frame):
+                target = frame if storage is None else storage
+                for value in iterate((yield from iterable(frame))):
+                    target[key] = value
+                    result = yield from body(frame)
+                    if result is not NORMAL:
+                        return result
+                return NORMAL
+            return run_for_each_steps
+        elif isinstance(statement, PrintStatement):
+            expression = self.compile_value_steps(statement.expression)
+            write = self.interpreter.output.write
+            newline = statement.newline
+            def run_print_steps(frame):
+                write((yield from expression(frame)), newline)
+                return NORMAL
+            return run_print_steps
+        elif isinstance(statement, AssignmentStatement):
+            value = self.compile_value_steps(statement.value)
+            storage = self.variables if statement.slot is None else None
+            key = statement.identifier if statement.slot is None else statement.slot
+            def run_assignment_steps(frame):
+                target = frame if storage is None else storage
+                target[key] = yield from value(frame)
+                return NORMAL
+            return run_assignment_steps
+        elif isinstance(statement, IndexAssignment):
+            target = self.compile_value_steps(statement.target)
+            index = self.compile_value_steps(statement.index)
+            value = self.compile_value_steps(statement.value)
+            def run_index_assignment_steps(frame):
+                container = yield from target(frame)
+                key = yield from index(frame)
+                set_item(container, key, (yield from value(frame)))
+                return NORMAL
+            return run_index_assignment_steps
+        # A call statement, its value is dropped by compile_steps_block.
+        return self.compile_expression_steps(statement)
+
+    def compile_profiled_steps(self, statement):
+        profiler = self.profiler
+        entry = profiler.statement_entry(statement)
+        enter = profiler.enter
+        exit = profiler.exit
+        run = ClosureCompiler.compile_steps(self, statement)
+        def run_profiled_steps(frame):
+            enter(entry)
+            try:
+                return (yield from run(frame))
+            finally:
+                exit()
+        return run_profiled_steps
+
+    def compile_expression_steps(self, expression):
+        if isinstance(expression, FunctionCall):
+            return self.compile_call_steps(expression)
+        elif isinstance(expression, BinaryExpression):
+            operator = expression.operator
+            if operator != '=':
+                chain = left_chain(expression)
+                if len(chain) > CHAIN_LENGTH:
+                    return self.compile_chain_steps(chain)
+            left = self.compile_value_steps(expression.left)
+            right = self.compile_value_steps(expression.right)
+            if operator == '=':
+                if not isinstance(expression.left, Identifier):
+                    def run_bad_assignment_steps(frame):
+                        yield from left(frame)
+                        yield from right(frame)
+                        raise InterpreterError("Left side of assignment must be an identifier")
+                    return run_bad_assignment_steps
+                storage = self.variables if expression.left.slot is None else None
+                key = expression.left.identifier if expression.left.slot is None else expression.left.slot
+                def run_assign_steps(frame):
+                    target = frame if storage is None else storage
+                    value = target[key] = yield from right(frame)
+                    return value
+                return run_assign_steps
+            def run_binary_steps(frame):
+                a = yield from left(frame)
+                b = yield from right(frame)
+                value = apply_operator(operator, a, b)
+                if value is NO_VALUE:
+                    raise InterpreterError(f"Unknown operator: {operator}")
+                return value
+            return run_binary_steps
+        elif isinstance(expression, UnaryExpression):
+            operand = self.compile_value_steps(expression.expression)
+            operator = expression.operator
+            def run_unary_steps(frame):
+                value = yield from operand(frame)
+                if operator == '-':
+                    return -value
+                raise InterpreterError(f"Unknown operator: {operator}")
+            return run_unary_steps
+        elif isinstance(expression, ArrayLiteral):
+            elements = [self.compile_value_steps(element) for element in expression.elements]
+            def run_array_steps(frame):
+                values = []
+                for element in elements:
+                    values.append((yield from element(frame)))
+                return values
+            return run_array_steps
+        elif isinstance(expression, IndexExpression):
+            target = self.compile_value_steps(expression.target)
+            index = self.compile_value_steps(expression.index)
+            def run_index_steps(frame):
+                container = yield from target(frame)
+                return get_item(container, (yield from index(frame)))
+            return run_index_steps
+        elif isinstance(expression, MapLiteral):
+            items = [self.compile_value_steps(item) for pair in zip(expression.keys, expression.values)
+                     for item in pair]
+            def run_map_steps(frame):
+                values = []
+                for item in items:
+                    values.append((yield from item(frame)))
+                return build_map(values)
+            return run_map_steps
+        elif isinstance(expression, MethodCall):
+            return self.compile_method_call_steps(expression)
+        return self.compile_value_steps(expression)
+
+    def compile_chain_steps(self, chain):
+        # The steps version of compile_chain, for a chain with a call in it.
+        first = self.compile_value_steps(chain[0].left)
+        steps = [(expression.operator, self.compile_value_steps(expression.right)) for expression in chain]
+        def run_chain_steps(frame):
+            value = yield from first(frame)
+            for operator, right in steps:
+                value = apply_operator(operator, value, (yield from right(frame)))
+                if value is NO_VALUE:
+                    raise InterpreterError(f"Unknown operator: {operator}")
+            return value
+        return run_chain_steps
+
+    def compile_method_call_steps(self, statement):
+        site = site_of(statement)
+        load_object = self.compile_load(statement.object_name, statement.slot, None)
+        arguments = [self.compile_value_steps(argument) for argument in statement.arguments]
+        def run_method_call_steps(frame):
+            obj = load_object(frame)
+            function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
+            values = []
+            for arg in arguments:
+                values.append((yield from arg(frame)))
+            try:
+                return function(obj, *values)
+            except Exception as e:
+                raise site.failure(e)
+        return run_method_call_steps
+
+    def compile_call(self, statement, tail=False):
+        # Starts a call whose arguments call nothing, see Interpreter.call.
+        functions = self.interpreter.functions
+        name = statement.name
+        arguments = [self.compile_expression(argument) for argument in statement.arguments]
+        enter = self.compile_enter(tail)
+        def run_call(frame):
+            function = functions.get(name)
+            if function is None:
+                return find_builtin(name, len(arguments)).call([arg(frame) for arg in arguments])
+            local_frame = [UNSET] * function.frame_size
+            if len(function.parameters) != len(arguments):
+                raise InterpreterError(f"Function {name} expects {len(function.parameters)} arguments but got {len(arguments)}")
+            for slot, arg in zip(function.parameter_slots, arguments):
+                local_frame[slot] = arg(frame)
+            return enter(function, local_frame)
+        return run_call
+
+    def compile_call_steps(self, statement, tail=False):
+        if not self.suspends.nested(statement):
+            call = self.compile_call(statement, tail)
+            if tail:
+                def run_tail_call_steps(frame):
+                    result = call(frame)
+                    if type(result) is TailCall:
+                        yield result
+                    return result
+                return run_tail_call_steps
+            def run_call_value_steps(frame):
+                value = call(frame)
+                if type(value) is GeneratorType:
+                    value = yield value
+                return value
+            return run_call_value_steps
+        functions = self.interpreter.functions
+        name = statement.name
+        arguments = [self.compile_value_steps(argument) for argument in statement.arguments]
+        enter = self.compile_enter(tail)
+        def run_call_steps(frame):
+            function = functions.get(name)
+            if function is None:
+                builtin = find_builtin(name, len(arguments))
+                values = []
+                for arg in arguments:
+                    values.append((yield from arg(frame)))
+                return builtin.call(values)
+            local_frame = [UNSET] * function.frame_size
+            if len(function.parameters) != len(arguments):
+                raise InterpreterError(f"Function {name} expects {len(function.parameters)} arguments but got {len(arguments)}")
+            for slot, arg in zip(function.parameter_slots, arguments):
+                local_frame[slot] = yield from arg(frame)
+            steps = enter(function, local_frame)
+            if type(steps) is GeneratorType or type(steps) is TailCall:
+                steps = yield steps
+            return steps
+        return run_call_steps
+
+    def compile_enter(self, tail):
+        memo = self.interpreter.memo
+        calls = self.interpreter.calls
+        max_depth = self.interpreter.max_depth
+        limit = max_depth + tail
+        def enter(function, local_frame):
+            key = None
+            if memo is not None:
+                cache = memo.caches.get(function.statement)
+                if cache is not None and cache.active:
+                    key, result = cache.lookup([local_frame[slot] for slot in function.parameter_slots])
+                    if result is not MISSING:
+                        return result
+            if function.leaf:
+                # One level deeper than the caller, unless it takes the caller's place.
+                if len(calls) >= limit:
+                    raise depth_exceeded(max_depth)
+                function.body(local_frame)
+                if key is not None:
+                    cache.store(key, DEFAULT_RETURN)
+                return DEFAULT_RETURN
+            if tail:
+                # Not stored in the cache, the result goes straight to our caller.
+                return TailCall(function.body, (local_frame,))
+            if key is not None:
+                return store_steps(cache, key, function.body(local_frame))
+            return function.body(local_frame)
+        return enter
+
+    def compile_function(self, statement):
+        functions = self.interpreter.functions
+        leaf = self.suspends.leaf(statement)
+        if leaf:
+            body = self.compile_block(statement.body)
+        else:
+            body = self.compile_steps_block(statement.body, DEFAULT_RETURN)
+        if self.profiler is not None:
+            body = self.profile_function(statement, body, leaf)
+        function = CompiledFunction(statement.name, statement.parameters, body,
+                                    statement.parameter_slots, statement.frame_size, statement, leaf)
+        memo = self.interpreter.memo
+        def run_function(frame):
+            previous = functions.get(function.name)
+            functions[function.name] = function
+            if previous is not None and previous is not function and memo is not None:
+                memo.invalidate()
+        return run_function
+
+    def profile_function(self, statement, body, leaf):
+        entry = self.profiler.function_entry(statement)
+        enter = self.profiler.enter
+        exit = self.profiler.exit
+        if leaf:
+            def run_profiled_leaf(frame):
+                enter(entry, True)
+                try:
+                    body(frame)
+                finally:
+                    exit()
+            return run_profiled_leaf
+        def run_profiled_body(frame):
+            enter(entry, True)
+            try:
+                return (yield from body(frame))
+            finally:
+                exit()
+        return run_profiled_body
+
+    def compile_function_call(self, statement):
+        # A call made outside any fn body, run with the calls it leads to on one explicit stack.
+        call = self.compile_call(statement)
+        max_depth = self.interpreter.max_depth
+        calls = self.interpreter.calls
+        def run_function_call(frame):
+            return run_calls(call(frame), max_depth, calls)
+        return run_function_call
+
+    def compile_method_call(self, statement):
+        site = site_of(statement)
+        load_object = self.compile_load(statement.object_name, statement.slot, None)
+        arguments = [self.compile_expression(argument) for argument in statement.arguments]
+        if not arguments:
+            # e.g. `n = items.count();`
+            def run_method_call_no_arguments(frame):
+                obj = load_object(frame)
+                function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
+                try:
+                    return function(obj)
+                except Exception as e:
+                    raise site.failure(e)
+            return run_method_call_no_arguments
+        def run_method_call(frame):
+            obj = load_object(frame)
+            function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
+            values = [arg(frame) for arg in arguments]
+            try:
+                return function(obj, *values)
+            except Exception as e:
+                raise site.failure(e)
+        return run_method_call
+
+    def compile_expression(self, expression):
+        if isinstance(expression, (IntegerLiteral, StringLiteral)):
+            value = expression.value
+            return lambda frame: value
+        elif isinstance(expression, Identifier):
+            return self.compile_load(expression.identifier, expression.slot, 0)
+        elif isinstance(expression, ArrayLiteral):
+            elements = [self.compile_expression(element) for element in expression.elements]
+            return lambda frame: [element(frame) for element in elements]
+        elif isinstance(expression, IndexExpression):
+            return self.compile_index(expression)
+        elif isinstance(expression, MapLiteral):
+            items = [self.compile_expression(item) for pair in zip(expression.keys, expression.values)
+                     for item in pair]
+            return lambda frame: build_map([item(frame) for item in items])
+        elif isinstance(expression, MethodCall):
+            return self.compile_method_call(expression)
+        elif isinstance(expression, FunctionCall):
+            return self.compile_function_call(expression)
+        elif isinstance(expression, BinaryExpression):
+            return self.compile_binary(expression)
+        elif isinstance(expression, UnaryExpression):
+            operand = self.compile_expression(expression.expression)
+            if expression.operator == '-':
+                return lambda frame: -operand(frame)
+            message = f"Unknown operator: {expression.operator}"
+            def run_unknown_unary(frame):
+                operand(frame)
+                raise InterpreterError(message)
+            return run_unknown_unary
+        else:
+            return self.compile_error(f"Unknown expression type: {type(expression)}")
+
+    def compile_index(self, expression):
+        target = self.compile_expression(expression.target)
+        if isinstance(expression.index, (IntegerLiteral, StringLiteral)):
+            # `m["name"]`, `items[0]`
+            key = expression.index.value
+            def run_constant_index(frame):
+                container = target(frame)
+                try:
+                    return container[key]
+                except (KeyError, IndexError, TypeError) as e:
+                    raise index_error(container, key, e)
+            return run_constant_index
+        index = self.compile_expression(expression.index)
+        def run_index(frame):
+            container = target(frame)
+            key = index(frame)
+            try:
+                return container[key]
+            except (KeyError, IndexError, TypeError) as e:
+                raise index_error(container, key, e)
+        return run_index
+
+    def compile_binary(self, expression):
+        operator = expression.operator
+        if operator != '=':
+            chain = left_chain(expression)
+            if len(chain) > CHAIN_LENGTH:
+                return self.compile_chain(chain)
+        left = self.compile_expression(expression.left)
+        right = self.compile_expression(expression.right)
+        if operator == '=':
+            if not isinstance(expression.left, Identifier):
+                message = "Left side of assignment must be an identifier"
+                def run_bad_assignment(frame):
+                    left(frame)
+                    right(frame)
+                    raise InterpreterError(message)
+                return run_bad_assignment
+            name = expression.left.identifier
+            slot = expression.left.slot
+            if slot is None:
+                variables = self.variables
+                def run_global_assign(frame):
+                    value = variables[name] = right(frame)
+                    return value
+                return run_global_assign
+            def run_local_assign(frame):
+                value = frame[slot] = right(frame)
+                return value
+            return run_local_assign
+
+        if isinstance(expression.right, IntegerLiteral):
+            # `x OP constant` is the shape of nearly every loop condition and counter update.
+            factory = CONSTANT_OPERATIONS.get(operator)
+            if factory is not None:
+                return factory(left, expression.right.value)
+
+        if operator == '+':
+            if isinstance(expression.left, StringLiteral) or isinstance(expression.right, StringLiteral):
+                return lambda frame: concat(left(frame), right(frame))
+            def run_add(frame):
+                a = left(frame)
+                b = right(frame)
+                if isinstance(a, STRING_TYPES) or isinstance(b, STRING_TYPES):
+                    return concat(a, b)
+                return a + b
+            return run_add
+        factory = BINARY_OPERATIONS.get(operator)
+        if factory is not None:
+            return factory(left, right)
+        message = f"Unknown operator: {operator}"
+        def run_unknown_binary(frame):
+            left(frame)
+            right(frame)
+            raise InterpreterError(message)
+        return run_unknown_binary
+
+    def compile_chain(self, chain):
+        # `a + b - c ...` would be one closure calling the next, as deep as the
+        # chain is long, so a long chain runs as a loop over its steps instead.
+        first = self.compile_expression(chain[0].left)
+        steps = [(expression.operator, self.compile_expression(expression.right)) for expression in chain]
+        def run_chain(frame):
+            value = first(frame)
+            for operator, right in steps:
+                value = apply_operator(operator, value, right(frame))
+                if value is NO_VALUE:
+                    raise InterpreterError(f"Unknown operator: {operator}")
+            return value
+        return run_chain
+
+def store_steps(cache, key, steps):
+    # Runs in place of the fn body, so a memoized call is no deeper than others.
+    result = yield from steps
+    cache.store(key, result)
+    return result
+
+# Kinds of compile_steps_block parts: plain statements, a statement run as
+# steps, a call or method call whose value is dropped, and a call started
+# with compile_call.
+PLAIN_PART = 0
+STEPS_PART = 1
+VALUE_PART = 2
+CALL_PART = 3
+
+def lift(run):
+    # A generator function that never suspends, for a plain closure where steps are expected.
+    def run_steps(frame):
+        return run(frame)
+        yield
+    return run_steps
+
+def add_constant(left, constant):
+    def run(frame):
+        value = left(frame)
+        if isinstance(value, STRING_TYPES):
+            return concat(value, constant)
+        return value + constant
+    return run
+
+# Longer chains of binary operators compile to one loop, see compile_chain.
+CHAIN_LENGTH = 16
+
+BINARY_OPERATIONS = {
+    '-': lambda left, right: lambda frame: left(frame) - right(frame),
+    '*': lambda left, right: lambda frame: left(frame) * right(frame),
+    '/': lambda left, right: lambda frame: left(frame) / right(frame),
+    '>': lambda left, right: lambda frame: left(frame) > right(frame),
+    '<': lambda left, right: lambda frame: left(frame) < right(frame),
+    '==': lambda left, right: lambda frame: left(frame) == right(frame),
+    '!=': lambda left, right: lambda frame: left(frame) != right(frame),
+    '>=': lambda left, right: lambda frame: left(frame) >= right(frame),
+    '<=': lambda left, right: lambda frame: left(frame) <= right(frame),
+}
+
+CONSTANT_OPERATIONS = {
+    '+': add_constant,
+    '-': lambda left, constant: lambda frame: left(frame) - constant,
+    '*': lambda left, constant: lambda frame: left(frame) * constant,
+    '/': lambda left, constant: lambda frame: left(frame) / constant,
+    '>': lambda left, constant: lambda frame: left(frame) > constant,
+    '<': lambda left, constant: lambda frame: left(frame) < constant,
+    '==': lambda left, constant: lambda frame: left(frame) == constant,
+    '!=': lambda left, constant: lambda frame: left(frame) != constant,
+    '>=': lambda left, constant: lambda frame: left(frame) >= constant,
+    '<=': lambda left, constant: lambda frame: left(frame) <= constant,
+}
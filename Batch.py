@@ -0,0 +1,279 @@
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Ast import Interpreter
+from Lexer import parse_source
+from Bytecode import compile_program
+from VM import VM
+from Cache import AstCache
+from Optimizer import optimize
+from Output import OutputSink
+from Memo import DEFAULT_MEMO_SIZE
+from CallStack import DEFAULT_MAX_DEPTH
+from Transpiler import PythonCode, PythonInterpreter, compile_python, TRANSPILER_VERSION
+
+# Runs many independent scripts across a process pool. Every worker process
+# imports the interpreter once and is handed scripts `chunksize` at a time
+# until the batch is done, and each script runs on a fresh engine with its
+# output captured, so nothing leaks from one script into the next. An error
+# ends only the script that raised it and is kept in its ScriptResult.
+
+ENGINES = ("tree", "closure", "vm", "python")
+
+class BatchOptions:
+    def __init__(self, engine="tree", optimize=False, memo_size=DEFAULT_MEMO_SIZE, max_depth=DEFAULT_MAX_DEPTH,
+                 use_cache=True):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        self.engine = engine
+        self.optimize = optimize
+        self.memo_size = memo_size
+        self.max_depth = max_depth
+        self.use_cache = use_cache
+
+    def __str__(self):
+        return (f"BatchOptions({self.engine}, optimize={self.optimize}, memo_size={self.memo_size}, "
+                f"max_depth={self.max_depth}, use_cache={self.use_cache})")
+
+    def __repr__(self):
+        return self.__str__()
+
+class ScriptResult:
+    def __init__(self, path, output="", error_type=None, error=None, elapsed=0.0, worker=None):
+        self.path = path
+        self.output = output
+        self.error_type = error_type
+        self.error = error
+        self.elapsed = elapsed
+        self.worker = worker
+
+    @property
+    def ok(self):
+        return self.error_type is None
+
+    def to_dict(self):
+        return {'path': self.path, 'ok': self.ok, 'error_type': self.error_type, 'error': self.error,
+                'elapsed': self.elapsed, 'worker': self.worker, 'output': self.output}
+
+    def __str__(self):
+        status = "ok" if self.ok else f"{self.error_type}: {self.error}"
+        return f"ScriptResult({self.path}, {status}, {self.elapsed:.4f}s)"
+
+    def __repr__(self):
+        return self.__str__()
+
+class BatchSummary:
+    def __init__(self, results, elapsed, workers):
+        self.results = results
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+    def error_counts(self):
+        counts = {}
+        for result in self.failed:
+            counts[result.error_type] = counts.get(result.error_type, 0) + 1
+        return counts
+
+    def stats(self):
+        script_time = sum(result.elapsed for result in self.results)
+        return {'scripts': len(self.results), 'ok': len(self.results) - len(self.failed),
+                'failed': len(self.failed), 'errors': self.error_counts(), 'workers': self.workers,
+                'worker_processes': len({result.worker for result in self.results}),
+                'wall_time': self.elapsed, 'script_time': script_time,
+                # Per-script times include waiting for a core, so this is how many
+                # scripts ran at once on average, not a speedup.
+                'concurrency': script_time / self.elapsed if self.elapsed else 0.0}
+
+    def to_dict(self):
+        return {'summary': self.stats(), 'results': [result.to_dict() for result in self.results]}
+
+    def write_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def report(self, limit=None):
+        # Slowest scripts first, then the totals.
+        lines = [f"{'seconds':>10}  {'status':<18} script"]
+        results = sorted(self.results, key=lambda result: -result.elapsed)
+        for result in results[:limit] if limit is not None else results:
+            lines.append(f"{result.elapsed:>10.4f}  {'ok' if result.ok else result.error_type:<18} {result.path}")
+        stats = self.stats()
+        errors = ", ".join(f"{count} {name}" for name, count in sorted(stats['errors'].items()))
+        lines.append(f"{stats['scripts']} scripts, {stats['ok']} ok, {stats['failed']} failed"
+                     + (f" ({errors})" if errors else ""))
+        lines.append(f"{stats['wall_time']:.3f}s wall, {stats['script_time']:.3f}s in scripts across "
+                     f"{stats['worker_processes']} worker processes (concurrency {stats['concurrency']:.1f})")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return f"BatchSummary({self.stats()})"
+
+    def __repr__(self):
+        return self.__str__()
+
+def expand_scripts(patterns):
+    # Globs (`**` included) and directories, which stand for every .rpl file
+    # under them. Plain paths are kept even if missing so they fail as a result.
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "**", "*.rpl"), recursive=True))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+# Set once per worker process by start_worker.
+worker_options = None
+
+def start_worker(options):
+    global worker_options
+    worker_options = options
+
+def load_program(path, options):
+    if options.engine == "python" and options.use_cache:
+        # Same cache files as `Lexer.py --engine python`.
+        if options.optimize:
+            transpile_source = lambda source_code: compile_python(optimize(parse_source(source_code)), path)
+        else:
+            transpile_source = lambda source_code: compile_python(parse_source(source_code), path)
+        suffix = f"py{TRANSPILER_VERSION}" + ("-opt" if options.optimize else "")
+        return AstCache(transpile_source, suffix=suffix, payload_type=PythonCode).load(path)
+    if options.use_cache:
+        statements = AstCache(parse_source).load(path)
+    else:
+        with open(path, "r") as file:
+            statements = parse_source(file.read())
+    return prepare_program(statements, options, path)
+
+def load_source(source_code, options, name="<yal>"):
+    return prepare_program(parse_source(source_code), options, name)
+
+def prepare_program(statements, options, name):
+    if options.optimize:
+        statements = optimize(statements)
+    if options.engine == "python":
+        return compile_python(statements, name)
+    return statements
+
+def make_interpreter(program, options, output):
+    # A fresh engine for a program from load_program or load_source.
+    if options.engine == "vm":
+        return VM(compile_program(program), output=output, max_depth=options.max_depth)
+    if options.engine == "python":
+        return PythonInterpreter(program, output=output, max_depth=options.max_depth)
+    return Interpreter(program, mode=options.engine, output=output, memo_size=options.memo_size,
+                       max_depth=options.max_depth)
+
+def run_script(path, options=None):
+    if options is None:
+        options = worker_options
+    target = io.StringIO()
+    output = OutputSink(target, flush_policy="end")
+    error_type = error = None
+    start = time.perf_counter()
+    # Stray prints (the parser reports some tokens it skips) belong to the script too.
+    stdout = sys.stdout
+    sys.stdout = target
+    try:
+        make_interpreter(load_program(path, options), options, output).interpret()
+    except Exception as e:
+        # LexerError, ParserError and InterpreterError mostly, but a missing
+        # file or a Python error inside an operator is recorded the same way.
+        error_type, error = type(e).__name__, str(e)
+    finally:
+        # Whatever the script printed before failing is kept too.
+        output.flush()
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - start
+    return ScriptResult(path, target.getvalue(), error_type, error, elapsed, os.getpid())
+
+class BatchRunner:
+    def __init__(self, workers=None, options=None, chunksize=1):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.options = options if options is not None else BatchOptions()
+        self.chunksize = chunksize
+
+    def run(self, patterns):
+        # Results come back in the order of the expanded script list.
+        paths = expand_scripts(patterns)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=start_worker,
+                                 initargs=(self.options,)) as executor:
+            results = list(executor.map(run_script, paths, chunksize=self.chunksize))
+        return BatchSummary(results, time.perf_counter() - start, self.workers)
+
+    def __str__(self):
+        return f"BatchRunner({self.workers} workers, {self.options})"
+
+    def __repr__(self):
+        return self.__str__()
+
+def run_batch(patterns, workers=None, chunksize=1, **options):
+    return BatchRunner(workers, BatchOptions(**options), chunksize).run(patterns)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run many YAL scripts in parallel")
+    arg_parser.add_argument("scripts", nargs="+",
+                            help="script paths, globs (quote them, `**` recurses) or directories of .rpl files")
+    arg_parser.add_argument("--workers", type=int, default=None, metavar="N",
+                            help="worker processes, one per CPU by default")
+    arg_parser.add_argument("--chunksize", type=int, default=1, metavar="N",
+                            help="scripts handed to a worker at a time, larger values cut overhead on tiny scripts")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="tree")
+    arg_parser.add_argument("--optimize", action="store_true",
+                            help="fold constants and drop dead branches and loops before running")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always lex and parse instead of using the __yalcache__ AST cache")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                            help="results kept per pure fn by the tree and closure engines, 0 turns memoization off")
+    arg_parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH, metavar="N",
+                            help="deepest fn call nesting allowed before a script stops with an error")
+    arg_parser.add_argument("--show-output", action="store_true",
+                            help="print each script's output after its name")
+    arg_parser.add_argument("--json", metavar="PATH",
+                            help="write every result, output included, and the summary as JSON to PATH")
+    arg_parser.add_argument("--top", type=int, default=20, metavar="N",
+                            help="slowest scripts listed in the summary, 0 lists all of them")
+    args = arg_parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        arg_parser.error("--workers must be at least 1")
+    if args.chunksize < 1:
+        arg_parser.error("--chunksize must be at least 1")
+    if args.memo_size < 0:
+        arg_parser.error("--memo-size can't be negative")
+    if args.max_depth < 1:
+        arg_parser.error("--max-depth must be at least 1")
+
+    summary = run_batch(args.scripts, workers=args.workers, chunksize=args.chunksize, engine=args.engine,
+                        optimize=args.optimize, memo_size=args.memo_size, max_depth=args.max_depth,
+                        use_cache=not args.no_cache)
+    for result in summary.results:
+        if args.show_output:
+            print(f"== {result.path}")
+            print(result.output, end="")
+        if not result.ok:
+            print(f"{result.path}: {result.error_type}: {result.error}", file=sys.stderr)
+    print(summary.report(args.top or None), file=sys.stderr)
+    if args.json:
+        summary.write_json(args.json)
+    sys.exit(1 if summary.failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from ErrorHandler import InterpreterError
+from Iteration import make_range
+
+# Functions a script can call without defining them. Engines look a name up
+# here only when no fn of that name has been defined, so a script's own fn
+# takes the place of a builtin from its definition on. parameters is there for
+# the usual arity check, every engine tests len(function.parameters).
+
+class Builtin:
+    __slots__ = ('name', 'function', 'parameters')
+
+    def __init__(self, name, function, parameters):
+        self.name = name
+        self.function = function
+        self.parameters = parameters
+
+    def call(self, arguments):
+        return self.function(*arguments)
+
+    def __str__(self):
+        return f"Builtin({self.name}, {list(self.parameters)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+BUILTINS = {
+    'range': Builtin('range', make_range, ('start', 'stop')),
+}
+
+def find_builtin(name, argc):
+    # Checked before the arguments are evaluated, like a call to a defined fn.
+    function = BUILTINS.get(name)
+    if function is None:
+        raise InterpreterError(f"Function {name} not defined")
+    if len(function.parameters) != argc:
+        raise InterpreterError(f"Function {name} expects {len(function.parameters)} arguments but got {argc}")
+    return function
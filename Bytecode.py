@@ -0,0 +1,386 @@
+from Statement import (
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, PrintStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, IntegerLiteral, Identifier, StringLiteral, FunctionStatement, FunctionCall
+)
+from Statement import ArrayLiteral, MethodCall, ReturnStatement, MapLiteral, IndexExpression, IndexAssignment
+from ErrorHandler import nested_too_deeply
+from Resolver import resolve
+from CallStack import DEFAULT_RETURN
+from Methods import site_of
+
+# Every instruction is two ints in CodeObject.code: an opcode and its argument.
+# Binary operators take their right operand from the stack when the argument is
+# OPERAND_STACK, otherwise the argument encodes a constant, a global name or a
+# local slot directly (see encode_operand) so `i < 10` or `s + i` need no
+# separate load. Locals resolved by Resolver.py live in a per-call frame list and
+# use the *_FAST opcodes.
+#
+# A call is LOAD_FUNCTION, which checks the callee and pushes it, then the
+# arguments and CALL_FUNCTION argc. The VM keeps the caller's state on its own
+# call stack instead of recursing, RETURN_VALUE resumes it, and TAIL_CALL
+# (for `return f(...)`) reuses the current call's place. A method call is
+# LOAD_METHOD, which pushes the function its MethodSite finds for the object
+# (see Methods.py) and the object, then the arguments and CALL_METHOD, or just
+# CALL_METHOD_NOARGS when there are no arguments.
+#
+# `m[k]` is LOAD_INDEX, which takes its key like a binary operator takes its
+# right operand; `m[k] = v;` pushes m, k and v for STORE_INDEX. BUILD_MAP n
+# makes a map of the n key, value pairs on the stack.
+#
+# `for (x in v)` turns v into a Python iterator with GET_ITER and leaves it on
+# the stack; FOR_ITER pushes its next value, or pops it and jumps past the
+# loop once it is done. A call to a builtin (see Builtins.py) is compiled like
+# any other call, LOAD_FUNCTION finds the Builtin and CALL_FUNCTION runs it in
+# place.
+#
+# Loops jump back to their condition with JUMP_BACKWARD. Together with calls
+# those are the only ways to run code again, so they are where a VM running in
+# time slices counts its steps and can pause (see Scheduler.py).
+LOAD_CONST = 0
+LOAD_NAME = 1
+STORE_NAME = 2
+DUP_TOP = 3
+POP_TOP = 4
+JUMP = 5
+POP_JUMP_IF_FALSE = 6
+BINARY_ADD = 7
+BINARY_SUB = 8
+BINARY_MUL = 9
+BINARY_DIV = 10
+COMPARE_GT = 11
+COMPARE_LT = 12
+COMPARE_EQ = 13
+COMPARE_NE = 14
+COMPARE_GE = 15
+COMPARE_LE = 16
+UNARY_NEG = 17
+BUILD_ARRAY = 18
+PRINT = 19
+LOAD_METHOD = 20
+CALL_METHOD = 21
+CALL_METHOD_NOARGS = 22
+LOAD_FUNCTION = 23
+CALL_FUNCTION = 24
+DEFINE_FUNCTION = 25
+FAIL = 26
+STORE_NAME_KEEP = 27
+LOAD_FAST = 28
+STORE_FAST = 29
+STORE_FAST_KEEP = 30
+RETURN_VALUE = 31
+TAIL_CALL = 32
+JUMP_BACKWARD = 33
+BUILD_MAP = 34
+LOAD_INDEX = 35
+STORE_INDEX = 36
+GET_ITER = 37
+FOR_ITER = 38
+
+OPNAMES = [
+    'LOAD_CONST', 'LOAD_NAME', 'STORE_NAME', 'DUP_TOP', 'POP_TOP', 'JUMP', 'POP_JUMP_IF_FALSE',
+    'BINARY_ADD', 'BINARY_SUB', 'BINARY_MUL', 'BINARY_DIV',
+    'COMPARE_GT', 'COMPARE_LT', 'COMPARE_EQ', 'COMPARE_NE', 'COMPARE_GE', 'COMPARE_LE',
+    'UNARY_NEG', 'BUILD_ARRAY', 'PRINT', 'LOAD_METHOD', 'CALL_METHOD', 'CALL_METHOD_NOARGS',
+    'LOAD_FUNCTION', 'CALL_FUNCTION', 'DEFINE_FUNCTION', 'FAIL', 'STORE_NAME_KEEP',
+    'LOAD_FAST', 'STORE_FAST', 'STORE_FAST_KEEP', 'RETURN_VALUE', 'TAIL_CALL', 'JUMP_BACKWARD',
+    'BUILD_MAP', 'LOAD_INDEX', 'STORE_INDEX', 'GET_ITER', 'FOR_ITER'
+]
+
+BINARY_OPCODES = {
+    '+': BINARY_ADD,
+    '-': BINARY_SUB,
+    '*': BINARY_MUL,
+    '/': BINARY_DIV,
+    '>': COMPARE_GT,
+    '<': COMPARE_LT,
+    '==': COMPARE_EQ,
+    '!=': COMPARE_NE,
+    '>=': COMPARE_GE,
+    '<=': COMPARE_LE,
+}
+
+OPERAND_STACK = 0
+OPERAND_CONST = 1
+OPERAND_NAME = 2
+OPERAND_FAST = 3
+
+def encode_operand(kind, index):
+    return index << 2 | kind
+
+class CodeObject:
+    def __init__(self, code, constants, names, local_names=None):
+        self.code = code
+        self.constants = constants
+        self.names = names
+        self.local_names = local_names or []
+
+    def disassemble(self):
+        lines = []
+        for pc in range(0, len(self.code), 2):
+            opcode = self.code[pc]
+            arg = self.code[pc + 1]
+            if opcode == LOAD_CONST or opcode == FAIL:
+                detail = f" ({self.constants[arg]!r})"
+            elif opcode in (LOAD_NAME, STORE_NAME, STORE_NAME_KEEP):
+                detail = f" ({self.names[arg]})"
+            elif opcode in (LOAD_FAST, STORE_FAST, STORE_FAST_KEEP):
+                detail = f" ({self.local_names[arg]})"
+            elif (opcode in BINARY_OPCODES.values() or opcode == LOAD_INDEX) and arg != OPERAND_STACK:
+                kind = arg & 3
+                if kind == OPERAND_CONST:
+                    detail = f" (const {self.constants[arg >> 2]!r})"
+                elif kind == OPERAND_NAME:
+                    detail = f" (name {self.names[arg >> 2]})"
+                else:
+                    detail = f" (fast {self.local_names[arg >> 2]})"
+            elif opcode in (LOAD_METHOD, CALL_METHOD, CALL_METHOD_NOARGS, LOAD_FUNCTION):
+                detail = f" {self.constants[arg]}"
+            elif opcode == DEFINE_FUNCTION:
+                detail = f" ({self.constants[arg].name})"
+            elif opcode == PRINT:
+                detail = " (newline)" if arg else ""
+            else:
+                detail = ""
+            lines.append(f"{pc:>6} {OPNAMES[opcode]:<18} {arg}{detail}")
+        for constant in self.constants:
+            if isinstance(constant, FunctionObject):
+                lines.append("")
+                lines.append(f"fn {constant.name}({', '.join(constant.parameters)}):")
+                lines.append(constant.code.disassemble())
+        return "\n".join(lines)
+
+    def __str__(self):
+        return f"CodeObject({len(self.code) // 2} instructions, {len(self.constants)} constants, {len(self.names)} names)"
+
+    def __repr__(self):
+        return self.__str__()
+
+class FunctionObject:
+    def __init__(self, name, parameters, code, parameter_slots, frame_size):
+        self.name = name
+        self.parameters = parameters
+        self.code = code
+        self.parameter_slots = parameter_slots
+        self.frame_size = frame_size
+
+    def __str__(self):
+        return f"FunctionObject({self.name}, {self.parameters})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class Compiler:
+    def __init__(self, local_names=None):
+        self.local_names = local_names or []
+        self.code = []
+        self.constants = []
+        self.constant_index = {}
+        self.names = []
+        self.name_index = {}
+
+    def compile(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+        return CodeObject(self.code, self.constants, self.names, self.local_names)
+
+    def compile_function_body(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+        self.emit(LOAD_CONST, self.add_constant(DEFAULT_RETURN))
+        self.emit(RETURN_VALUE)
+        return CodeObject(self.code, self.constants, self.names, self.local_names)
+
+    def emit(self, opcode, arg=0):
+        self.code.append(opcode)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def patch(self, position, target):
+        self.code[position + 1] = target
+
+    def add_constant(self, value):
+        # Keep 1 and True apart, they hash the same but print differently.
+        key = (type(value), value)
+        try:
+            index = self.constant_index.get(key)
+        except TypeError:
+            index = None
+            key = None
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            if key is not None:
+                self.constant_index[key] = index
+        return index
+
+    def add_name(self, name):
+        index = self.name_index.get(name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(name)
+            self.name_index[name] = index
+        return index
+
+    def emit_store(self, name, slot, keep=False):
+        if slot is None:
+            self.emit(STORE_NAME_KEEP if keep else STORE_NAME, self.add_name(name))
+        else:
+            self.emit(STORE_FAST_KEEP if keep else STORE_FAST, slot)
+
+    def compile_block(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+
+    def compile_statement(self, statement):
+        if isinstance(statement, IfStatement):
+            self.compile_expression(statement.condition)
+            jump_to_else = self.emit(POP_JUMP_IF_FALSE)
+            self.compile_block(statement.true_statements)
+            jump_to_end = self.emit(JUMP)
+            self.patch(jump_to_else, len(self.code))
+            self.compile_block(statement.false_statements)
+            self.patch(jump_to_end, len(self.code))
+        elif isinstance(statement, WhileStatement):
+            loop_start = len(self.code)
+            self.compile_expression(statement.condition)
+            jump_to_end = self.emit(POP_JUMP_IF_FALSE)
+            self.compile_block(statement.statements)
+            self.emit(JUMP_BACKWARD, loop_start)
+            self.patch(jump_to_end, len(self.code))
+        elif isinstance(statement, ForStatement):
+            self.compile_expression(statement.start)
+            self.emit_store(statement.identifier, statement.slot)
+            loop_start = len(self.code)
+            self.compile_expression(statement.condition)
+            jump_to_end = self.emit(POP_JUMP_IF_FALSE)
+            self.compile_block(statement.statements)
+            self.compile_expression(statement.step)
+            self.emit_store(statement.identifier, statement.slot)
+            self.emit(JUMP_BACKWARD, loop_start)
+            self.patch(jump_to_end, len(self.code))
+        elif isinstance(statement, ForEachStatement):
+            self.compile_expression(statement.iterable)
+            self.emit(GET_ITER)
+            loop_start = len(self.code)
+            jump_to_end = self.emit(FOR_ITER)
+            self.emit_store(statement.identifier, statement.slot)
+            self.compile_block(statement.statements)
+            self.emit(JUMP_BACKWARD, loop_start)
+            self.patch(jump_to_end, len(self.code))
+        elif isinstance(statement, PrintStatement):
+            self.compile_expression(statement.expression)
+            self.emit(PRINT, 1 if statement.newline else 0)
+        elif isinstance(statement, AssignmentStatement):
+            self.compile_expression(statement.value)
+            self.emit_store(statement.identifier, statement.slot)
+        elif isinstance(statement, FunctionStatement):
+            code = Compiler(list(statement.local_names)).compile_function_body(statement.body)
+            function = FunctionObject(statement.name, list(statement.parameters), code,
+                                      list(statement.parameter_slots), statement.frame_size)
+            self.emit(DEFINE_FUNCTION, self.add_constant(function))
+        elif isinstance(statement, FunctionCall):
+            self.compile_function_call(statement)
+            self.emit(POP_TOP)
+        elif isinstance(statement, MethodCall):
+            self.compile_method_call(statement)
+            self.emit(POP_TOP)
+        elif isinstance(statement, IndexAssignment):
+            self.compile_expression(statement.target)
+            self.compile_expression(statement.index)
+            self.compile_expression(statement.value)
+            self.emit(STORE_INDEX)
+        elif isinstance(statement, ReturnStatement):
+            if isinstance(statement.value, FunctionCall):
+                self.compile_function_call(statement.value, TAIL_CALL)
+                # Only reached when the callee was a builtin, which leaves its result here.
+                self.emit(RETURN_VALUE)
+            else:
+                if statement.value is None:
+                    self.emit(LOAD_CONST, self.add_constant(DEFAULT_RETURN))
+                else:
+                    self.compile_expression(statement.value)
+                self.emit(RETURN_VALUE)
+        else:
+            self.emit(FAIL, self.add_constant(f"Unknown statement type: {type(statement)}"))
+
+    def compile_function_call(self, expression, opcode=CALL_FUNCTION):
+        self.emit(LOAD_FUNCTION, self.add_constant((expression.name, len(expression.arguments))))
+        for argument in expression.arguments:
+            self.compile_expression(argument)
+        self.emit(opcode, len(expression.arguments))
+
+    def compile_method_call(self, expression):
+        site = self.add_constant((site_of(expression), expression.slot))
+        if not expression.arguments:
+            self.emit(CALL_METHOD_NOARGS, site)
+            return
+        self.emit(LOAD_METHOD, site)
+        for argument in expression.arguments:
+            self.compile_expression(argument)
+        self.emit(CALL_METHOD, site)
+
+    def compile_operand(self, expression):
+        if isinstance(expression, (IntegerLiteral, StringLiteral)):
+            return encode_operand(OPERAND_CONST, self.add_constant(expression.value))
+        elif isinstance(expression, Identifier):
+            if expression.slot is not None:
+                return encode_operand(OPERAND_FAST, expression.slot)
+            return encode_operand(OPERAND_NAME, self.add_name(expression.identifier))
+        self.compile_expression(expression)
+        return OPERAND_STACK
+
+    def compile_expression(self, expression):
+        if isinstance(expression, (IntegerLiteral, StringLiteral)):
+            self.emit(LOAD_CONST, self.add_constant(expression.value))
+        elif isinstance(expression, Identifier):
+            if expression.slot is not None:
+                self.emit(LOAD_FAST, expression.slot)
+            else:
+                self.emit(LOAD_NAME, self.add_name(expression.identifier))
+        elif isinstance(expression, ArrayLiteral):
+            for element in expression.elements:
+                self.compile_expression(element)
+            self.emit(BUILD_ARRAY, len(expression.elements))
+        elif isinstance(expression, IndexExpression):
+            self.compile_expression(expression.target)
+            self.emit(LOAD_INDEX, self.compile_operand(expression.index))
+        elif isinstance(expression, MapLiteral):
+            for key, value in zip(expression.keys, expression.values):
+                self.compile_expression(key)
+                self.compile_expression(value)
+            self.emit(BUILD_MAP, len(expression.keys))
+        elif isinstance(expression, MethodCall):
+            self.compile_method_call(expression)
+        elif isinstance(expression, FunctionCall):
+            self.compile_function_call(expression)
+        elif isinstance(expression, BinaryExpression):
+            if expression.operator == '=':
+                if isinstance(expression.left, Identifier):
+                    self.compile_expression(expression.right)
+                    self.emit_store(expression.left.identifier, expression.left.slot, keep=True)
+                else:
+                    self.compile_expression(expression.left)
+                    self.compile_expression(expression.right)
+                    self.emit(FAIL, self.add_constant("Left side of assignment must be an identifier"))
+                return
+            self.compile_expression(expression.left)
+            opcode = BINARY_OPCODES.get(expression.operator)
+            if opcode is None:
+                self.compile_expression(expression.right)
+                self.emit(FAIL, self.add_constant(f"Unknown operator: {expression.operator}"))
+            else:
+                self.emit(opcode, self.compile_operand(expression.right))
+        elif isinstance(expression, UnaryExpression):
+            self.compile_expression(expression.expression)
+            if expression.operator == '-':
+                self.emit(UNARY_NEG)
+            else:
+                self.emit(FAIL, self.add_constant(f"Unknown operator: {expression.operator}"))
+        else:
+            self.emit(FAIL, self.add_constant(f"Unknown expression type: {type(expression)}"))
+
+def compile_program(statements):
+    try:
+        return Compiler().compile(resolve(statements))
+    except RecursionError:
+        raise nested_too_deeply("vm compiler") from None
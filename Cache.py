@@ -0,0 +1,141 @@
+import hashlib
+import os
+import pickle
+import struct
+import sys
+
+# Bump whenever the Statement/Ast node classes change shape, or the parser builds
+# different trees from the same source, so stale caches are ignored.
+AST_VERSION = 12
+CACHE_TAG = f"yal{AST_VERSION}-py{sys.version_info[0]}{sys.version_info[1]}"
+CACHE_DIRECTORY = "__yalcache__"
+# The second format, whose header also carries a digest of the payload.
+MAGIC = b"YAL2"
+# magic, tag, source mtime in ns, source size in bytes, sha256 of the source,
+# sha256 of the pickled payload
+HEADER = struct.Struct("<4s16sQQ32s32s")
+
+class AstCache:
+    # parse_source turns source text into the cached value: a statement list by
+    # default, or anything else picklable given a matching suffix and payload_type.
+    def __init__(self, parse_source, cache_dir=None, verbose=False, suffix="ast", payload_type=list):
+        self.parse_source = parse_source
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.suffix = suffix
+        self.payload_type = payload_type
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0, 'writes': 0}
+
+    def log(self, event, path, detail=""):
+        if self.verbose:
+            message = f"AstCache: {event} {path}"
+            if detail:
+                message += f" ({detail})"
+            print(message, file=sys.stderr)
+
+    def cache_path(self, path):
+        directory, filename = os.path.split(os.path.abspath(path))
+        if self.cache_dir is not None:
+            # Mangle the absolute path so same-named scripts don't collide in a shared directory.
+            digest = hashlib.sha256(directory.encode()).hexdigest()[:16]
+            return os.path.join(self.cache_dir, f"{filename}.{digest}.{CACHE_TAG}.{self.suffix}")
+        return os.path.join(directory, CACHE_DIRECTORY, f"{filename}.{CACHE_TAG}.{self.suffix}")
+
+    def load(self, path):
+        stat = os.stat(path)
+        cache_path = self.cache_path(path)
+        header, payload = self.read(cache_path)
+
+        if header is not None and header[2] == stat.st_mtime_ns and header[3] == stat.st_size:
+            statements = self.unpack(cache_path, payload)
+            if statements is not None:
+                self.stats['hits'] += 1
+                self.log("hit", path)
+                return statements
+            header = None
+
+        with open(path, "r") as file:
+            source_code = file.read()
+        digest = hashlib.sha256(source_code.encode()).digest()
+
+        if header is not None and header[4] == digest:
+            # Touched but unchanged, so keep the AST and refresh the stat fields.
+            statements = self.unpack(cache_path, payload)
+            if statements is not None:
+                self.stats['hits'] += 1
+                self.log("hit", path, "revalidated by hash")
+                self.write(cache_path, stat, digest, payload)
+                return statements
+            header = None
+
+        if header is not None:
+            self.stats['invalidations'] += 1
+            self.log("invalidated", path)
+        self.stats['misses'] += 1
+        self.log("miss", path)
+        statements = self.parse_source(source_code)
+        try:
+            payload = pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, RecursionError, TypeError, ValueError) as e:
+            self.stats['errors'] += 1
+            self.log("not cached", path, str(e))
+            return statements
+        self.write(cache_path, stat, digest, payload)
+        return statements
+
+    def read(self, cache_path):
+        try:
+            with open(cache_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None, None
+        if len(data) < HEADER.size:
+            self.stats['errors'] += 1
+            self.log("corrupt", cache_path, "truncated header")
+            return None, None
+        header = HEADER.unpack_from(data)
+        if header[0] != MAGIC or header[1].rstrip(b"\0") != CACHE_TAG.encode():
+            self.stats['errors'] += 1
+            self.log("corrupt", cache_path, "bad magic or tag")
+            return None, None
+        payload = data[HEADER.size:]
+        # A damaged payload may still unpickle, into the wrong program.
+        if hashlib.sha256(payload).digest() != header[5]:
+            self.stats['errors'] += 1
+            self.log("corrupt", cache_path, "payload checksum mismatch")
+            return None, None
+        return header, payload
+
+    def unpack(self, cache_path, payload):
+        try:
+            statements = pickle.loads(payload)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.log("corrupt", cache_path, str(e))
+            return None
+        if not isinstance(statements, self.payload_type):
+            self.stats['errors'] += 1
+            self.log("corrupt", cache_path, f"payload is not a {self.payload_type.__name__}")
+            return None
+        return statements
+
+    def write(self, cache_path, stat, digest, payload):
+        header = HEADER.pack(MAGIC, CACHE_TAG.encode(), stat.st_mtime_ns, stat.st_size, digest,
+                             hashlib.sha256(payload).digest())
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(temporary_path, "wb") as file:
+                file.write(header)
+                file.write(payload)
+            os.replace(temporary_path, cache_path)
+        except OSError as e:
+            self.stats['errors'] += 1
+            self.log("write failed", cache_path, str(e))
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            return
+        self.stats['writes'] += 1
+        self.log("wrote", cache_path)
@@ -0,0 +1,158 @@
+from types import GeneratorType
+
+from ErrorHandler import InterpreterError
+from Statement import (
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, PrintStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, FunctionCall, ArrayLiteral, MethodCall, ReturnStatement,
+    MapLiteral, IndexExpression, IndexAssignment
+)
+
+# YAL calls never recurse on the Python stack. A running call is a generator
+# over its fn body; to call another fn it yields the callee's generator and is
+# resumed with the callee's result, and `return f(x)` yields a TailCall so the
+# callee replaces the caller instead of stacking on top of it. run_calls keeps
+# the suspended generators in a list, so YAL recursion is only limited by
+# max_depth and memory, and a tail-recursive fn runs in constant depth.
+#
+# A fn that neither calls nor returns needs no generator, and the tree and
+# closure engines run those in place. In the python engine every fn that calls
+# nothing is a plain def whose result gets yielded instead of a generator, so
+# run_calls passes any other value straight back as the result of the call.
+#
+# Every engine counts max_depth the same way, as the number of calls running
+# at once, and a tail call takes the place of the call making it.
+
+DEFAULT_MAX_DEPTH = 1_000_000
+# What a fn returns when it ends without `return`, or with a bare `return;`.
+DEFAULT_RETURN = 0
+# Result of a statement that finished without returning.
+NORMAL = object()
+
+class TailCall:
+    # The callee is only started once the caller is gone, so a fn that runs to
+    # completion right away is already one call shallower.
+    def __init__(self, function, arguments):
+        self.function = function
+        self.arguments = arguments
+
+    def __repr__(self):
+        return f"TailCall({self.function}, {self.arguments})"
+
+def run_calls(steps, max_depth=DEFAULT_MAX_DEPTH, stack=None):
+    # Passing in the stack lets call sites check the depth themselves when they
+    # run a fn that never calls or returns directly instead of through here.
+    if type(steps) is not GeneratorType:
+        return steps
+    if stack is None:
+        stack = []
+    base = len(stack)
+    push = stack.append
+    pop = stack.pop
+    push(steps)
+    value = None
+    try:
+        while True:
+            try:
+                request = stack[-1].send(value)
+            except StopIteration as stop:
+                pop()
+                if len(stack) == base:
+                    return stop.value
+                value = stop.value
+                continue
+            if type(request) is GeneratorType:
+                if len(stack) >= max_depth:
+                    raise depth_exceeded(max_depth)
+                push(request)
+                value = None
+            elif type(request) is TailCall:
+                pop().close()
+                steps = request.function(*request.arguments)
+                if type(steps) is GeneratorType:
+                    push(steps)
+                    value = None
+                elif len(stack) == base:
+                    return steps
+                else:
+                    value = steps
+            else:
+                value = request
+    finally:
+        # After an error, unwind the suspended calls innermost first.
+        while len(stack) > base:
+            pop().close()
+
+def depth_exceeded(max_depth):
+    return InterpreterError(f"Maximum call depth of {max_depth} exceeded")
+
+class Suspensions:
+    # Remembers which nodes can call a fn or return. Only those need the
+    # generator path, everything else runs the usual way.
+    def __init__(self):
+        self.known = {}
+        self.leaves = {}
+        self.calls = {}
+
+    def __call__(self, node):
+        known = self.known.get(node)
+        if known is None:
+            known = self.known[node] = self.find(node)
+        return known
+
+    def find(self, node):
+        if isinstance(node, (FunctionCall, ReturnStatement)):
+            return True
+        elif isinstance(node, IfStatement):
+            return self(node.condition) or self.any(node.true_statements) or self.any(node.false_statements)
+        elif isinstance(node, WhileStatement):
+            return self(node.condition) or self.any(node.statements)
+        elif isinstance(node, ForStatement):
+            return (self(node.start) or self(node.condition) or self(node.step)
+                    or self.any(node.statements))
+        elif isinstance(node, ForEachStatement):
+            return self(node.iterable) or self.any(node.statements)
+        elif isinstance(node, PrintStatement):
+            return self(node.expression)
+        elif isinstance(node, AssignmentStatement):
+            return self(node.value)
+        elif isinstance(node, BinaryExpression):
+            # Down the left side of `a + b + c ...` in a loop, a long chain would recurse as deep.
+            rights = []
+            while isinstance(node, BinaryExpression):
+                rights.append(node.right)
+                node = node.left
+            return self(node) or self.any(reversed(rights))
+        elif isinstance(node, UnaryExpression):
+            return self(node.expression)
+        elif isinstance(node, ArrayLiteral):
+            return self.any(node.elements)
+        elif isinstance(node, MethodCall):
+            return self.any(node.arguments)
+        elif isinstance(node, IndexExpression):
+            return self(node.target) or self(node.index)
+        elif isinstance(node, IndexAssignment):
+            return self(node.target) or self(node.index) or self(node.value)
+        elif isinstance(node, MapLiteral):
+            return self.any(node.keys) or self.any(node.values)
+        # A nested fn's calls and returns happen when it is called, not where it is defined.
+        return False
+
+    def leaf(self, function):
+        # A fn whose body neither calls nor returns can run without a generator.
+        leaf = self.leaves.get(function)
+        if leaf is None:
+            leaf = self.leaves[function] = not self.any(function.body)
+        return leaf
+
+    def nested(self, call):
+        # A call whose arguments call a fn has to evaluate them as steps too.
+        nested = self.calls.get(call)
+        if nested is None:
+            nested = self.calls[call] = self.any(call.arguments)
+        return nested
+
+    def any(self, nodes):
+        for node in nodes:
+            if self(node):
+                return True
+        return False
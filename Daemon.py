@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+from ErrorHandler import InterpreterError
+from Output import OutputSink
+from Memo import DEFAULT_MEMO_SIZE
+from CallStack import DEFAULT_MAX_DEPTH
+from Batch import ENGINES, BatchOptions, load_program, load_source, make_interpreter
+from DaemonClient import DEFAULT_SOCKET
+
+# A long running server that imports the lexer, parser and engines once, so a
+# script run through DaemonClient.py doesn't pay for starting Python and
+# importing them again. See DaemonClient.py for the protocol.
+#
+# The server is pre-forked: the master process binds the Unix socket and forks
+# `workers` processes that all accept() on it, so the kernel hands each new
+# client to an idle worker and up to `workers` clients run at once. A worker
+# runs one request at a time on a fresh engine, like Batch.py does, and
+# streams its output back as it is flushed. The master only restarts workers
+# that die and stops them all on SIGTERM or Ctrl-C.
+
+# Output is sent back whenever this much is pending (flush policy "size").
+STREAM_BUFFER_SIZE = 8192
+
+def send(connection, message):
+    connection.sendall((json.dumps(message) + "\n").encode())
+
+class StreamTarget:
+    # Where a request's OutputSink (and anything else it prints) writes to:
+    # every write goes to the client as an output message.
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, text):
+        if text:
+            send(self.connection, {'output': text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+def request_options(request, defaults):
+    # The server's BatchOptions, with whatever the request overrides.
+    names = ("engine", "optimize", "use_cache", "memo_size", "max_depth")
+    return BatchOptions(**{name: request.get(name, getattr(defaults, name)) for name in names})
+
+def error_answer(error_type, error, elapsed):
+    return {'done': True, 'ok': False, 'error_type': error_type, 'error': error,
+            'elapsed': elapsed, 'worker': os.getpid()}
+
+def timed_out(signum, frame):
+    raise InterpreterError("Request timed out")
+
+class DaemonServer:
+    def __init__(self, socket_path=DEFAULT_SOCKET, workers=None, options=None, timeout=None, backlog=128):
+        self.socket_path = socket_path
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.options = options if options is not None else BatchOptions()
+        self.timeout = timeout
+        self.backlog = backlog
+        self.listener = None
+        self.pids = set()
+        self.stopping = False
+
+    def bind(self):
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except ConnectionRefusedError:
+                # Left behind by a daemon that didn't shut down cleanly.
+                os.unlink(self.socket_path)
+            else:
+                raise OSError(f"A daemon is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen(self.backlog)
+        self.listener = listener
+
+    def serve_forever(self):
+        self.bind()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            for _ in range(self.workers):
+                self.spawn()
+            while not self.stopping:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                self.pids.discard(pid)
+                if not self.stopping:
+                    print(f"Daemon: worker {pid} exited ({status}), starting another", file=sys.stderr)
+                    self.spawn()
+        finally:
+            self.shutdown()
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def shutdown(self):
+        self.stop()
+        for pid in list(self.pids):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.pids.clear()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            return
+        # Worker: SIGTERM ends it, Ctrl-C is for the master to handle.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            self.work()
+        finally:
+            os._exit(0)
+
+    def work(self):
+        while True:
+            connection, _ = self.listener.accept()
+            with connection:
+                try:
+                    self.handle(connection)
+                except OSError:
+                    # The client went away, nothing to tell it.
+                    pass
+                except Exception as e:
+                    # A bad request ends itself, the worker takes the next one.
+                    try:
+                        send(connection, error_answer(type(e).__name__, str(e), 0.0))
+                    except OSError:
+                        pass
+
+    def handle(self, connection):
+        with connection.makefile("rb") as reader:
+            line = reader.readline()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request is a JSON object")
+        except ValueError as e:
+            send(connection, error_answer("ValueError", f"Bad request: {e}", 0.0))
+            return
+        if request.get('ping'):
+            send(connection, {'pong': os.getpid()})
+            return
+        send(connection, self.run(request, connection))
+
+    def run(self, request, connection):
+        target = StreamTarget(connection)
+        error_type = error = None
+        start = time.perf_counter()
+        # Stray prints (the parser reports some tokens it skips) go to the client too.
+        stdout = sys.stdout
+        sys.stdout = target
+        try:
+            # The timer is off again before the outer try ends, so a timeout
+            # that fires just as the script finishes is still caught below.
+            try:
+                if self.timeout:
+                    signal.signal(signal.SIGALRM, timed_out)
+                    signal.setitimer(signal.ITIMER_REAL, self.timeout)
+                options = request_options(request, self.options)
+                output = OutputSink(target, buffer_size=STREAM_BUFFER_SIZE,
+                                    flush_policy=request.get('flush_policy', "size"))
+                if 'source' in request:
+                    program = load_source(request['source'], options, request.get('name', "<source>"))
+                elif 'path' in request:
+                    program = load_program(request['path'], options)
+                else:
+                    raise ValueError("Bad request: no path or source")
+                make_interpreter(program, options, output).interpret()
+            finally:
+                if self.timeout:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away while the script was printing, stop it.
+            raise
+        except Exception as e:
+            # Like Batch.run_script: the error ends this request, not the worker.
+            error_type, error = type(e).__name__, str(e)
+        finally:
+            sys.stdout = stdout
+        if error_type is not None:
+            return error_answer(error_type, error, time.perf_counter() - start)
+        return {'done': True, 'ok': True, 'error_type': None, 'error': None,
+                'elapsed': time.perf_counter() - start, 'worker': os.getpid()}
+
+    def __str__(self):
+        return f"DaemonServer({self.socket_path}, {self.workers} workers, {self.options})"
+
+    def __repr__(self):
+        return self.__str__()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Serve YAL script runs over a Unix socket")
+    arg_parser.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH",
+                            help=f"Unix socket to listen on (default {DEFAULT_SOCKET})")
+    arg_parser.add_argument("--workers", type=int, default=None, metavar="N",
+                            help="worker processes, which is how many requests run at once, one per CPU by default")
+    arg_parser.add_argument("--timeout", type=float, default=None, metavar="SECONDS",
+                            help="stop a request that runs longer than this with an error")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="tree",
+                            help="engine for requests that don't name one")
+    arg_parser.add_argument("--optimize", action="store_true",
+                            help="optimize every request, unless it says otherwise")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always lex and parse script files instead of using the __yalcache__ AST cache")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                            help="results kept per pure fn by the tree and closure engines, 0 turns memoization off")
+    arg_parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH, metavar="N",
+                            help="deepest fn call nesting allowed before a script stops with an error")
+    args = arg_parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        arg_parser.error("--workers must be at least 1")
+    if args.timeout is not None and args.timeout <= 0:
+        arg_parser.error("--timeout must be positive")
+    if args.memo_size < 0:
+        arg_parser.error("--memo-size can't be negative")
+    if args.max_depth < 1:
+        arg_parser.error("--max-depth must be at least 1")
+
+    options = BatchOptions(args.engine, args.optimize, args.memo_size, args.max_depth, not args.no_cache)
+    server = DaemonServer(args.socket, args.workers, options, args.timeout)
+    print(f"Daemon: {server.workers} workers listening on {server.socket_path}", file=sys.stderr)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
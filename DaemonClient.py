@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Client side of the Daemon.py protocol. Only imports the standard library, so
+# running a script through a warm daemon doesn't pay for importing the lexer,
+# parser and engines.
+#
+# The protocol is JSON, one object per line. A client sends one request:
+#
+#     {"path": "/abs/script.rpl", "engine": "vm"}       a file, read by the daemon
+#     {"source": "println(1);", "name": "<stdin>"}      source text
+#     {"ping": true}                                    answered with {"pong": pid}
+#
+# optionally with "engine", "optimize", "use_cache", "memo_size", "max_depth"
+# and "flush_policy". The daemon answers with any number of {"output": text}
+# messages while the script runs, then {"done": true, "ok": ..., "error_type":
+# ..., "error": ..., "elapsed": seconds, "worker": pid} and closes the
+# connection.
+
+# Not tempfile.gettempdir(), importing tempfile takes longer than the rest of the client.
+DEFAULT_SOCKET = os.path.join(os.environ.get("TMPDIR", "/tmp"), f"yal-{os.getuid()}.sock")
+REQUEST_OPTIONS = ("engine", "optimize", "use_cache", "memo_size", "max_depth", "flush_policy")
+
+class DaemonError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+def connect(socket_path=DEFAULT_SOCKET):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        connection.close()
+        raise DaemonError(f"No YAL daemon listening on {socket_path}, start one with `python Daemon.py`")
+    return connection
+
+def request(message, socket_path=DEFAULT_SOCKET, on_output=None):
+    # Sends one request and returns the daemon's last message. Output is handed
+    # to on_output as it arrives, or collected into the result's "output".
+    chunks = []
+    if on_output is None:
+        on_output = chunks.append
+    with connect(socket_path) as connection:
+        connection.sendall((json.dumps(message) + "\n").encode())
+        with connection.makefile("rb") as reader:
+            for line in reader:
+                reply = json.loads(line)
+                if "output" in reply:
+                    on_output(reply["output"])
+                else:
+                    if chunks:
+                        reply["output"] = "".join(chunks)
+                    return reply
+    raise DaemonError("The daemon closed the connection without an answer")
+
+def run_remote(path=None, source=None, name="<source>", socket_path=DEFAULT_SOCKET, on_output=None, **options):
+    # run_remote("script.rpl", engine="vm") or run_remote(source="println(1);").
+    unknown = set(options) - set(REQUEST_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+    if (path is None) == (source is None):
+        raise ValueError("Give either a path or source text")
+    if path is not None:
+        # The daemon's working directory isn't ours.
+        message = {'path': os.path.abspath(path)}
+    else:
+        message = {'source': source, 'name': name}
+    message.update(options)
+    return request(message, socket_path, on_output)
+
+def ping(socket_path=DEFAULT_SOCKET):
+    return request({'ping': True}, socket_path)['pong']
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run a YAL script on a warm Daemon.py server")
+    arg_parser.add_argument("path", help="script to run, - reads the source from stdin")
+    arg_parser.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH",
+                            help=f"Unix socket of the daemon (default {DEFAULT_SOCKET})")
+    arg_parser.add_argument("--engine", choices=["tree", "closure", "vm", "python"],
+                            help="engine to run the script with, the daemon's default otherwise")
+    arg_parser.add_argument("--optimize", action="store_true",
+                            help="fold constants and drop dead branches and loops before running")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always lex and parse instead of using the __yalcache__ AST cache")
+    arg_parser.add_argument("--memo-size", type=int, metavar="N",
+                            help="results kept per pure fn by the tree and closure engines, 0 turns memoization off")
+    arg_parser.add_argument("--max-depth", type=int, metavar="N",
+                            help="deepest fn call nesting allowed before the script stops with an error")
+    arg_parser.add_argument("--flush-policy", choices=["size", "line", "end"],
+                            help="when the daemon sends buffered print/println output back")
+    args = arg_parser.parse_args()
+
+    options = {}
+    for name in ("engine", "memo_size", "max_depth", "flush_policy"):
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    if args.optimize:
+        options['optimize'] = True
+    if args.no_cache:
+        options['use_cache'] = False
+
+    def write(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    try:
+        if args.path == "-":
+            result = run_remote(source=sys.stdin.read(), name="<stdin>", socket_path=args.socket,
+                                on_output=write, **options)
+        else:
+            result = run_remote(args.path, socket_path=args.socket, on_output=write, **options)
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    if not result['ok']:
+        print(f"{result['error_type']}: {result['error']}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,9 @@ class ParserError(Exception):
 
 class InterpreterError(Exception):
     def __init__(self, message):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+def nested_too_deeply(stage):
+    # Stands in for a RecursionError from walking a program nested deeper than
+    # the Python stack allows (thousands of blocks, or of operators in a row).
+    return InterpreterError(f"Program is nested too deeply for the {stage}")
@@ -0,0 +1,206 @@
+import bisect
+import os
+import re
+import sys
+import time
+
+from ErrorHandler import LexerError, ParserError
+from Ast import Parser
+from Lexer import StreamingLexer, TOKEN_PATTERN
+from Statement import Node, node_values
+
+# The source is split into chunks, one per top-level statement (or fn block).
+# A chunk starts at its first token and runs up to the first token of the next
+# chunk, so trailing whitespace and comments belong to the chunk before them.
+# After an edit only the chunks overlapping the changed bytes are lexed and
+# parsed again, plus the chunk before them (an edit can attach an `else` to
+# it). The region is grown until lexing it ends exactly on the first token of
+# the next untouched chunk and that token's line is untouched, which keeps the
+# tokens, statements and columns after the region valid. Anything else falls
+# back to a full parse.
+
+NEWLINE = re.compile("\n")
+
+class Chunk:
+    def __init__(self, start, line, column, statements):
+        self.start = start
+        self.line = line
+        self.column = column
+        self.statements = statements
+
+    def __str__(self):
+        return f"Chunk({self.start}, {self.line}:{self.column}, {self.statements})"
+
+    def __repr__(self):
+        return self.__str__()
+
+def shift_lines(node, delta):
+    if node.line is not None:
+        node.line += delta
+    for value in node_values(node):
+        if isinstance(value, Node):
+            shift_lines(value, delta)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, Node):
+                    shift_lines(item, delta)
+
+def common_length(matches, limit):
+    # Largest size <= limit with matches(size), found by bisection so the
+    # comparisons run over whole slices instead of one character at a time.
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if matches(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def split_chunks(tokens, offset_of):
+    chunks = []
+    if not tokens:
+        return chunks
+    previous = 0
+    for statement, end in Parser(tokens).parse_top_level():
+        first = tokens[previous]
+        chunks.append(Chunk(offset_of(first), first.line, first.column, [statement]))
+        previous = end
+    if previous < len(tokens):
+        first = tokens[previous]
+        chunks.append(Chunk(offset_of(first), first.line, first.column, []))
+    return chunks
+
+class IncrementalParser:
+    def __init__(self):
+        self.source = None
+        self.chunks = []
+        self.statements = []
+        self.stats = {'full_parses': 0, 'incremental_parses': 0, 'unchanged': 0,
+                      'relexed_bytes': 0, 'reparsed_statements': 0}
+        self.last_update = None
+
+    def parse(self, source):
+        if self.source is not None:
+            if source == self.source:
+                self.stats['unchanged'] += 1
+                self.last_update = "unchanged"
+                return self.statements
+            try:
+                if self.update(source):
+                    return self.statements
+            except (LexerError, ParserError, AttributeError, IndexError):
+                pass
+        return self.full_parse(source)
+
+    def full_parse(self, source):
+        tokens = StreamingLexer(source).tokenize()
+        line_starts = [0] + [match.end() for match in NEWLINE.finditer(source)]
+        chunks = split_chunks(tokens, lambda token: line_starts[token.line - 1] + token.column - 1)
+        self.commit(source, chunks)
+        self.stats['full_parses'] += 1
+        self.stats['relexed_bytes'] += len(source)
+        self.stats['reparsed_statements'] += len(self.statements)
+        self.last_update = f"full parse, {len(self.statements)} statements"
+        return self.statements
+
+    def commit(self, source, chunks):
+        if chunks:
+            # Lexing from offset 0 gives the same tokens, and edits in leading whitespace stay in the first chunk.
+            chunks[0].start, chunks[0].line, chunks[0].column = 0, 1, 1
+        self.source = source
+        self.chunks = chunks
+        self.statements = [statement for chunk in chunks for statement in chunk.statements]
+
+    def update(self, source):
+        old = self.source
+        chunks = self.chunks
+        if not chunks:
+            return False
+        limit = min(len(old), len(source))
+        prefix = common_length(lambda size: old[:size] == source[:size], limit)
+        suffix = common_length(lambda size: old[len(old) - size:] == source[len(source) - size:], limit - prefix)
+        delta = len(source) - len(old)
+        suffix_start = len(source) - suffix
+
+        starts = [chunk.start for chunk in chunks]
+        first = max(0, bisect.bisect_right(starts, prefix) - 2)
+        end = bisect.bisect_right(starts, len(old) - suffix)
+        region_start = chunks[first].start
+        while True:
+            region_end = starts[end] + delta if end < len(chunks) else len(source)
+            crossed = None
+            for match in TOKEN_PATTERN.finditer(source, region_start):
+                if match.start() >= region_end:
+                    if match.start() > region_end:
+                        crossed = match.start()
+                    break
+                if match.end() > region_end:
+                    crossed = match.end()
+                    break
+            if crossed is None and end < len(chunks):
+                # The newline starting the next chunk's line must be untouched so its columns still hold.
+                if source.rfind("\n", region_start, region_end) < suffix_start:
+                    crossed = region_end + 1
+            if crossed is None:
+                break
+            if end >= len(chunks):
+                return False
+            end = max(end + 1, bisect.bisect_left(starts, crossed - delta))
+
+        region = source[region_start:region_end]
+        head = chunks[first]
+        tokens = StreamingLexer(region, line=head.line, column=head.column).tokenize()
+        line_starts = [0] + [match.end() for match in NEWLINE.finditer(region)]
+
+        def offset_of(token):
+            if token.line == head.line:
+                return region_start + token.column - head.column
+            return region_start + line_starts[token.line - head.line] + token.column - 1
+
+        replaced = split_chunks(tokens, offset_of)
+        old_region_end = starts[end] if end < len(chunks) else len(old)
+        line_delta = region.count("\n") - old.count("\n", region_start, old_region_end)
+        following = chunks[end:]
+        for chunk in following:
+            chunk.start += delta
+            if line_delta:
+                chunk.line += line_delta
+                for statement in chunk.statements:
+                    if statement is not None:
+                        shift_lines(statement, line_delta)
+        self.commit(source, chunks[:first] + replaced + following)
+        self.stats['incremental_parses'] += 1
+        self.stats['relexed_bytes'] += len(region)
+        self.stats['reparsed_statements'] += sum(len(chunk.statements) for chunk in replaced)
+        self.last_update = (f"incremental, relexed {len(region)} of {len(source)} bytes, "
+                            f"reparsed {sum(len(chunk.statements) for chunk in replaced)} of "
+                            f"{len(self.statements)} statements")
+        return True
+
+def watch(path, run, interval=0.25, log=sys.stderr):
+    # Re-runs the script whenever its mtime or size changes, until interrupted.
+    parser = IncrementalParser()
+    last_seen = None
+    try:
+        while True:
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                print(f"watch: {e}", file=log)
+                time.sleep(interval)
+                continue
+            seen = (stat.st_mtime_ns, stat.st_size)
+            if seen != last_seen:
+                last_seen = seen
+                try:
+                    with open(path, "r") as file:
+                        source_code = file.read()
+                    statements = parser.parse(source_code)
+                    print(f"--- {path}: {parser.last_update} ---", file=log)
+                    run(statements)
+                except Exception as e:
+                    print(f"{type(e).__name__}: {e}", file=log)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,33 @@
+from ErrorHandler import InterpreterError
+from Rope import Rope
+from Maps import type_name
+
+# What `for (x in value) { ... }` walks over, see iterate. Arrays, numeric
+# arrays, strings and ranges are iterated in place, nothing is copied: a
+# string gives its characters, a range its integers one at a time, so
+# `for (i in range(0, 100000000))` runs in constant memory. A map gives its
+# keys, from a copy of them taken when the loop starts, so the body may add
+# and remove keys. Any other value whose Python type is iterable (a host
+# program's own types) works too.
+#
+# An array grown by the loop body is iterated up to its new end, like a
+# Python list.
+
+def iterate(value):
+    # Something a Python for loop can run over, giving YAL values.
+    value_type = type(value)
+    if value_type is list or value_type is range or value_type is str:
+        return value
+    if value_type is Rope:
+        return value.flatten()
+    if value_type is dict:
+        return list(value)
+    if value_type in (int, float, bool) or not hasattr(value_type, '__iter__'):
+        raise InterpreterError(f"Can't iterate over {type_name(value)}")
+    return value
+
+def make_range(start, stop):
+    # range(a, b): a, a + 1, ..., b - 1, without ever building the list.
+    if type(start) is not int or type(stop) is not int:
+        raise InterpreterError(f"range expects integers but got {type_name(start)} and {type_name(stop)}")
+    return range(start, stop)
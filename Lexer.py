@@ -4,18 +4,48 @@ from Statement import (
 )
 from ErrorHandler import LexerError, ParserError, InterpreterError
 from Ast import Parser, Interpreter
+import re
+from Bytecode import compile_program
+from VM import VM
+from Cache import AstCache
+from Optimizer import optimize, dump
+from Output import OutputSink
+from Profiler import Profiler
+from Memo import DEFAULT_MEMO_SIZE
+from CallStack import DEFAULT_MAX_DEPTH
+from Transpiler import PythonCode, PythonInterpreter, compile_python, TRANSPILER_VERSION
+import argparse
+import copy
+from array import array
+import io
+import os
+import sys
+
+KEYWORDS = frozenset(['if', 'while', 'for', 'print', 'println', 'else', 'fn', 'return'])
 
 class Lexer:
-    def __init__(self, source_code):
+    def __init__(self, source_code, debug=False):
         self.source_code = source_code
         self.current_pos = 0
         self.current_char = self.source_code[self.current_pos]
         self.tokens = []
+        self.debug = debug
+        self.line = 1
+        self.column = 1
 
     def error(self):
         raise LexerError("Invalid character")
 
+    def log(self, token):
+        if self.debug:
+            print(f"Lexer: {token}")
+
     def advance(self):
+        if self.current_char == '\n':
+            self.line += 1
+            self.column = 1
+        else:
+            self.column += 1
         self.current_pos += 1       
         if self.current_pos < len(self.source_code):
             self.current_char = self.source_code[self.current_pos]        
@@ -64,33 +94,33 @@ class Lexer:
 
             if self.current_char.isdigit():
                 token = Token('INTEGER', self.integer())
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
 
             if self.current_char == '[':
                 self.advance()
                 token = Token('LBRACKET', '[')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
 
             if self.current_char == ']':
                 self.advance()
                 token = Token('RBRACKET', ']')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
 
             if self.current_char.isalpha():
                 identifier = self.identifier()
-                if identifier in ['if', 'while', 'for', 'print', 'println', 'else', 'fn']:
+                if identifier in KEYWORDS:
                     token = Token('KEYWORD', identifier)
                 else:
                     token = Token('IDENTIFIER', identifier)
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
 
             if self.current_char == '"' or self.current_char == "'":
                 token = Token('STRING', self.string())
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
 
             if self.current_char == '=':
@@ -100,7 +130,7 @@ class Lexer:
                     token = Token('OPERATOR', '==')
                 else:
                     token = Token('OPERATOR', '=')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '!':
                 self.advance()
@@ -109,7 +139,7 @@ class Lexer:
                     token = Token('OPERATOR', '!=')
                 else:
                     token = Token('OPERATOR', '!')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '>':
                 self.advance()
@@ -118,7 +148,7 @@ class Lexer:
                     token = Token('OPERATOR', '>=')
                 else:
                     token = Token('OPERATOR', '>')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '<':
                 self.advance()
@@ -127,87 +157,100 @@ class Lexer:
                     token = Token('OPERATOR', '<=')
                 else:
                     token = Token('OPERATOR', '<')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '+':
                 self.advance()
                 token = Token('OPERATOR', '+')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '-':
                 self.advance()
                 token = Token('OPERATOR', '-')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '*':
                 self.advance()
                 token = Token('OPERATOR', '*')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '/':
                 self.advance()
                 token = Token('OPERATOR', '/')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '(':
                 self.advance()
                 token = Token('LPAREN', '(')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == ')':
                 self.advance()
                 token = Token('RPAREN', ')')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '{':
                 self.advance()
                 token = Token('LBRACE', '{')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '}':
                 self.advance()
                 token = Token('RBRACE', '}')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == ';':
                 self.advance()
                 token = Token('SEMICOLON', ';')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == ',':
                 self.advance()
                 token = Token('COMMA', ',')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             elif self.current_char == '.':
                 self.advance()
                 token = Token('DOT', '.')
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
+                return token
+            elif self.current_char == ':':
+                self.advance()
+                token = Token('COLON', ':')
+                self.log(token)
                 return token
             elif self.current_char == "#":
                 self.advance()
                 token = Token('COMMENT', self.comment())
-                print(f"Lexer: {token}")  # Log the token
+                self.log(token)
                 return token
             else:
                 self.error()
 
         token = Token('EOF', None)
-        print(f"Lexer: {token}")  # Log the token
+        self.log(token)
         return token
 
     def tokenize(self):
         while True:
+            self.skip_whitespace()
+            line, column = self.line, self.column
             token = self.get_next_token()
             if token.type == 'EOF':
                 break
+            token.line = line
+            token.column = column
             self.tokens.append(token)
         return self.tokens
 
 class Token:
-    def __init__(self, type, value):
+    __slots__ = ('type', 'value', 'line', 'column')
+
+    def __init__(self, type, value, line=None, column=None):
         self.type = type
         self.value = value
+        self.line = line
+        self.column = column
 
     def __str__(self):
         return f"Token({self.type}, {self.value})"
@@ -215,22 +258,357 @@ class Token:
     def __repr__(self):
         return self.__str__()
 
-def tokenize(source_code):
-    lexer = Lexer(source_code)
-    return lexer.tokenize()
+# Type codes for TokenBuffer, which keeps one byte per token instead of a string.
+TOKEN_TYPES = ('KEYWORD', 'IDENTIFIER', 'INTEGER', 'STRING', 'COMMENT', 'OPERATOR', 'LPAREN', 'RPAREN',
+               'LBRACKET', 'RBRACKET', 'LBRACE', 'RBRACE', 'SEMICOLON', 'COMMA', 'DOT', 'EOF',
+               'COLON')
+TOKEN_CODES = {name: code for code, name in enumerate(TOKEN_TYPES)}
+INTERNED_CODES = frozenset(TOKEN_CODES[name] for name in ('KEYWORD', 'IDENTIFIER', 'OPERATOR'))
+
+class TokenBuffer:
+    # A token list stored as parallel arrays: token i is types[i], a code into
+    # TOKEN_TYPES, values[i] and its position lines[i]:columns[i]. Names,
+    # keywords and operators are interned, so every `i` shares one string.
+    # Indexing builds a Token view on demand, which is all the Parser needs,
+    # so a large program costs a few bytes per token instead of an object each.
+    def __init__(self, tokens=()):
+        self.types = array('B')
+        self.values = []
+        self.lines = array('L')
+        self.columns = array('L')
+        self.extend(tokens)
+
+    def append(self, token):
+        self.extend((token,))
+
+    def extend(self, tokens):
+        types, values, lines, columns = self.types, self.values, self.lines, self.columns
+        codes = TOKEN_CODES
+        interned = INTERNED_CODES
+        intern = sys.intern
+        for token in tokens:
+            code = codes[token.type]
+            value = token.value
+            if code in interned:
+                value = intern(value)
+            types.append(code)
+            values.append(value)
+            lines.append(token.line or 0)
+            columns.append(token.column or 0)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        return Token(TOKEN_TYPES[self.types[index]], self.values[index],
+                     self.lines[index] or None, self.columns[index] or None)
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+    def __str__(self):
+        return f"TokenBuffer({len(self)} tokens)"
+
+    def __repr__(self):
+        return self.__str__()
+
+# Each match is the text of one token, leading whitespace is skipped by finditer.
+# The trailing \S catches single-character tokens and invalid characters alike,
+# so CHARACTER_CLASSES decides the token type from the first character.
+# Newlines are matched too, only to keep track of line numbers.
+TOKEN_PATTERN = re.compile(r'''[^\W\d_]+|\d+|==|!=|>=|<=|"[^"]*"?|'[^"]*"?|\#[^\n]*|\S|\n''')
+
+CHARACTER_CLASSES = {
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '[': 'LBRACKET',
+    ']': 'RBRACKET',
+    '{': 'LBRACE',
+    '}': 'RBRACE',
+    ';': 'SEMICOLON',
+    ',': 'COMMA',
+    '.': 'DOT',
+    ':': 'COLON',
+    '"': 'STRING',
+    "'": 'STRING',
+    '#': 'COMMENT',
+    '\n': 'NEWLINE',
+}
+for character in '=!<>+-*/':
+    CHARACTER_CLASSES[character] = 'OPERATOR'
+for character in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ':
+    CHARACTER_CLASSES[character] = 'NAME'
+for character in '0123456789':
+    CHARACTER_CLASSES[character] = 'INTEGER'
+
+class StreamingLexer:
+    # line and column give the position of source_code[0], for lexing a slice of a larger file.
+    def __init__(self, source_code, debug=False, line=1, column=1):
+        self.source_code = source_code
+        self.debug = debug
+        self.line = line
+        self.column = column
+        self.resume = None
+
+    def __iter__(self):
+        return self.tokens()
+
+    def tokens(self):
+        return self.scan(self.source_code, len(self.source_code), self.line, 1 - self.column, True)
+
+    def scan(self, source, end, line, line_start, final):
+        # Lexes source[:end]. Unless final, end is just past a whitespace
+        # character, so only a string or comment can be cut off there; scanning
+        # stops in front of it and self.resume holds (offset, line, line_start)
+        # to carry on from once more text has been read.
+        debug = self.debug
+        keywords = KEYWORDS
+        classes = CHARACTER_CLASSES
+        intern = sys.intern
+        for match in TOKEN_PATTERN.finditer(source, 0, end):
+            text = match.group()
+            kind = classes.get(text[0])
+            if kind is None:
+                if text[0].isalpha():
+                    kind = 'NAME'
+                elif text[0].isdigit():
+                    kind = 'INTEGER'
+                else:
+                    raise LexerError("Invalid character")
+            if kind == 'NEWLINE':
+                line += 1
+                line_start = match.end()
+                continue
+            column = match.start() - line_start + 1
+            if kind == 'NAME':
+                # Interned, so every occurrence of a name shares one string, in the AST too.
+                token = Token('KEYWORD' if text in keywords else 'IDENTIFIER', intern(text), line, column)
+            elif kind == 'INTEGER':
+                token = Token('INTEGER', int(text), line, column)
+            elif kind == 'STRING':
+                if len(text) > 1 and text[-1] == '"':
+                    token = Token('STRING', text[1:-1], line, column)
+                else:
+                    if not final and match.end() == end:
+                        self.resume = (match.start(), line, line_start)
+                        return
+                    token = Token('STRING', text[1:], line, column)
+                if '\n' in text:
+                    line += text.count('\n')
+                    line_start = match.start() + text.rfind('\n') + 1
+            elif kind == 'COMMENT':
+                if not final and match.end() == end:
+                    self.resume = (match.start(), line, line_start)
+                    return
+                token = Token('COMMENT', text[1:], line, column)
+            else:
+                token = Token(kind, text, line, column)
+            if debug:
+                print(f"Lexer: {token}")
+            yield token
+        self.resume = (end, line, line_start)
+
+    def tokenize(self):
+        return list(self.tokens())
+
+class FileLexer(StreamingLexer):
+    # Lexes a file a chunk at a time, so memory stays at about two chunks plus
+    # the longest token no matter how large the file is. source is a path or
+    # an open file, binary files are decoded with encoding. Text after the
+    # last whitespace of a chunk waits for the next one, because a name,
+    # number, `==`, string or comment can continue into it.
+    def __init__(self, source, debug=False, chunk_size=1 << 20, encoding=None):
+        super().__init__("", debug)
+        self.source = source
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+
+    def tokens(self):
+        if isinstance(self.source, (str, bytes, os.PathLike)):
+            return self.scan_file(open(self.source, "r", encoding=self.encoding), close=True)
+        if isinstance(self.source, io.TextIOBase):
+            return self.scan_file(self.source)
+        return self.scan_file(io.TextIOWrapper(self.source, encoding=self.encoding), detach=True)
+
+    def scan_file(self, file, close=False, detach=False):
+        try:
+            pending = ""
+            line, line_start = 1, 0
+            while True:
+                chunk = file.read(self.chunk_size)
+                text = pending + chunk
+                if not chunk:
+                    yield from self.scan(text, len(text), line, line_start, True)
+                    return
+                end = max(text.rfind("\n"), text.rfind(" "), text.rfind("\t")) + 1
+                if end == 0:
+                    pending = text
+                    continue
+                yield from self.scan(text, end, line, line_start, False)
+                rest, line, line_start = self.resume
+                pending = text[rest:]
+                line_start -= rest
+        finally:
+            if close:
+                file.close()
+            elif detach:
+                # Leave the caller's binary file open.
+                file.detach()
+
+def iter_tokens(source_code, debug=False):
+    return StreamingLexer(source_code, debug).tokens()
+
+def tokenize(source_code, debug=False):
+    return StreamingLexer(source_code, debug).tokenize()
+
+def buffer_tokens(source_code, debug=False):
+    return TokenBuffer(iter_tokens(source_code, debug))
 
 def parse(tokens):
     parser = Parser(tokens)
     return parser.parse()
 
+def parse_source(source_code):
+    return parse(tokenize(source_code))
+
 def main():
-    with open("Example.rpl", "r") as file:
-        source_code = file.read()
-    tokens = tokenize(source_code)
-    
-    statements = parse(tokens)
-    interpreter = Interpreter(statements)
-    interpreter.interpret()
+    arg_parser = argparse.ArgumentParser(description="Run a YAL script")
+    arg_parser.add_argument("path", nargs="?", default="Example.rpl")
+    arg_parser.add_argument("--engine", choices=["tree", "closure", "vm", "python"], default="tree",
+                            help="tree walks the AST, closure compiles every node into a Python closure, "
+                                 "vm compiles it to bytecode first, python transpiles it to Python source")
+    arg_parser.add_argument("--disassemble", action="store_true",
+                            help="print the compiled bytecode instead of running it")
+    arg_parser.add_argument("--debug-tokens", action="store_true",
+                            help="log every token produced by the lexer")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always lex and parse instead of using the __yalcache__ AST cache")
+    arg_parser.add_argument("--cache-verbose", action="store_true",
+                            help="report AST cache hits, misses and invalidations on stderr")
+    arg_parser.add_argument("--optimize", action="store_true",
+                            help="fold constants and drop dead branches and loops before running")
+    arg_parser.add_argument("--dump-ast", action="store_true",
+                            help="print the AST to stderr, before and after --optimize")
+    arg_parser.add_argument("--flush-policy", choices=OutputSink.FLUSH_POLICIES, default="size",
+                            help="when buffered print/println output is written out")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="print per statement and per function timings to stderr when the script ends")
+    arg_parser.add_argument("--profile-json", metavar="PATH",
+                            help="write the profile as JSON to PATH")
+    arg_parser.add_argument("--profile-collapsed", metavar="PATH",
+                            help="write the profile as collapsed stacks for flamegraph tools to PATH")
+    arg_parser.add_argument("--dump-python", metavar="PATH",
+                            help="write the Python source generated by --engine python to PATH")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                            help="results kept per pure fn by the tree and closure engines, 0 turns memoization off")
+    arg_parser.add_argument("--memo-stats", action="store_true",
+                            help="print memo cache hits, misses and evictions per fn to stderr when the script ends")
+    arg_parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH, metavar="N",
+                            help="deepest fn call nesting allowed before the script stops with an error")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="run the script again whenever the file changes, re-parsing only the edited statements")
+    arg_parser.add_argument("--repl", action="store_true",
+                            help="read statements interactively, keeping variables and functions between inputs")
+    args = arg_parser.parse_args()
+    if args.memo_size < 0:
+        arg_parser.error("--memo-size can't be negative")
+    if args.max_depth < 1:
+        arg_parser.error("--max-depth must be at least 1")
+    if args.memo_stats and args.engine in ("vm", "python"):
+        arg_parser.error("--memo-stats is only supported by the tree and closure engines")
+    if args.repl:
+        # Imported here because Repl and Incremental import this module.
+        from Repl import Repl
+        if args.engine not in Interpreter.MODES:
+            arg_parser.error("--repl is only supported by the tree and closure engines")
+        Repl(mode=args.engine, output=OutputSink(flush_policy="line"), memo_size=args.memo_size,
+             max_depth=args.max_depth).run()
+        return
+    if args.watch:
+        from Incremental import watch
+        watch(args.path, lambda statements: run_statements(statements, args))
+        return
+    profiling = args.profile or args.profile_json or args.profile_collapsed
+    if profiling and args.engine in ("vm", "python"):
+        arg_parser.error("profiling is only supported by the tree and closure engines")
+    if args.dump_python and args.engine != "python":
+        arg_parser.error("--dump-python needs --engine python")
+
+    if args.engine == "python" and not (args.no_cache or args.debug_tokens or args.dump_ast):
+        # The generated code is cached next to the AST, keyed by --optimize as well.
+        if args.optimize:
+            transpile_source = lambda source_code: compile_python(optimize(parse_source(source_code)), args.path)
+        else:
+            transpile_source = lambda source_code: compile_python(parse_source(source_code), args.path)
+        suffix = f"py{TRANSPILER_VERSION}" + ("-opt" if args.optimize else "")
+        cache = AstCache(transpile_source, verbose=args.cache_verbose, suffix=suffix, payload_type=PythonCode)
+        run_python(cache.load(args.path), args)
+        return
+
+    if args.no_cache or args.debug_tokens:
+        # The parser needs every token, but the source itself is never held in
+        # memory at once and the tokens are packed into a TokenBuffer.
+        statements = parse(TokenBuffer(FileLexer(args.path, debug=args.debug_tokens)))
+    else:
+        statements = AstCache(parse_source, verbose=args.cache_verbose).load(args.path)
+    if args.dump_ast:
+        print("AST:" if not args.optimize else "AST before optimization:", file=sys.stderr)
+        print("\n".join(dump(statements)), file=sys.stderr)
+    if args.optimize:
+        statements = optimize(statements)
+        if args.dump_ast:
+            print("AST after optimization:", file=sys.stderr)
+            print("\n".join(dump(statements)), file=sys.stderr)
+    if args.engine == "python":
+        run_python(compile_python(statements, args.path), args)
+        return
+    if args.engine == "vm" or args.disassemble:
+        code = compile_program(statements)
+        if args.disassemble:
+            print(code.disassemble())
+            return
+    output = OutputSink(flush_policy=args.flush_policy)
+    profiler = None
+    if profiling:
+        with open(args.path, "r") as file:
+            profiler = Profiler(file.read())
+    if args.engine == "vm":
+        interpreter = VM(code, output=output, max_depth=args.max_depth)
+    else:
+        interpreter = Interpreter(statements, mode=args.engine, output=output, profiler=profiler,
+                                  memo_size=args.memo_size, max_depth=args.max_depth)
+    try:
+        interpreter.interpret()
+    finally:
+        if args.memo_stats and interpreter.memo is not None:
+            print(interpreter.memo.report(), file=sys.stderr)
+        if profiler is not None:
+            if args.profile:
+                print(profiler.report(), file=sys.stderr)
+            if args.profile_json:
+                profiler.write_json(args.profile_json)
+            if args.profile_collapsed:
+                profiler.write_collapsed(args.profile_collapsed)
+
+def run_statements(statements, args):
+    # One fresh engine per run; --optimize rewrites the tree, so it gets a copy
+    # and the statements the incremental parser keeps stay as parsed.
+    if args.optimize:
+        statements = optimize(copy.deepcopy(statements))
+    output = OutputSink(flush_policy=args.flush_policy)
+    if args.engine == "vm":
+        VM(compile_program(statements), output=output, max_depth=args.max_depth).interpret()
+    elif args.engine == "python":
+        PythonInterpreter(compile_python(statements, args.path), output=output, max_depth=args.max_depth).interpret()
+    else:
+        Interpreter(statements, mode=args.engine, output=output, memo_size=args.memo_size,
+                    max_depth=args.max_depth).interpret()
+
+def run_python(code, args):
+    if args.dump_python:
+        code.dump(args.dump_python)
+    PythonInterpreter(code, output=OutputSink(flush_policy=args.flush_policy), max_depth=args.max_depth).interpret()
 
 if __name__ == "__main__":
     main()
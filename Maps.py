@@ -0,0 +1,76 @@
+from ErrorHandler import InterpreterError
+from Rope import Rope
+from NumericArray import NumericArray
+
+# Maps are Python dicts: `{"a": 1, "b": 2}` builds one, `m["a"]` reads a key
+# and `m["a"] = 3;` sets one, both in O(1). The same `[]` indexes arrays,
+# numeric arrays and strings (read only) by position. Keys are any hashable
+# value, so integers and strings but not arrays or maps. A Rope key is
+# flattened when stored, it hashes and compares like its str anyway.
+#
+# A missing key or an index past the end stops the script with an error, like
+# any other bad operation; `m.get(k, default)` and `m.has(k)` check first.
+# Writing a value a numeric array can't hold reports the value, not the index:
+# NumericArray.set checks it before the index is used, like the constructor.
+
+TYPE_NAMES = {
+    bool: "boolean",
+    int: "integer",
+    float: "number",
+    str: "string",
+    Rope: "string",
+    list: "array",
+    dict: "map",
+    NumericArray: "numeric array",
+}
+
+def type_name(value):
+    return TYPE_NAMES.get(type(value), type(value).__name__)
+
+def map_key(key):
+    return key.flatten() if type(key) is Rope else key
+
+def key_text(key):
+    return repr(map_key(key))
+
+def index_error(container, key, error):
+    if isinstance(error, KeyError):
+        return InterpreterError(f"Key {key_text(key)} not found in map")
+    if isinstance(error, IndexError):
+        return InterpreterError(f"Index {key_text(key)} out of range for {type_name(container)} of {len(container)}")
+    if type(container) not in TYPE_NAMES or type(container) in (bool, int, float):
+        return InterpreterError(f"Can't index {type_name(container)}")
+    return InterpreterError(f"Can't index {type_name(container)} with {type_name(key)}")
+
+def get_item(container, key):
+    try:
+        return container[key]
+    except (KeyError, IndexError, TypeError) as e:
+        raise index_error(container, key, e)
+
+def set_item(container, key, value):
+    if type(container) is dict:
+        try:
+            container[map_key(key)] = value
+            return
+        except TypeError:
+            raise InterpreterError(f"Can't use {type_name(key)} as a map key")
+    if isinstance(container, (str, Rope)):
+        raise InterpreterError("Can't assign to an index of a string")
+    try:
+        container[key] = value
+    except (IndexError, TypeError) as e:
+        raise index_error(container, key, e)
+
+def build_map(items):
+    # items alternates keys and values, in the order the literal evaluated them.
+    table = {}
+    for position in range(0, len(items), 2):
+        set_item(table, items[position], items[position + 1])
+    return table
+
+def remove(table, key):
+    try:
+        return table.pop(key)
+    except KeyError:
+        raise InterpreterError(f"Key {key_text(key)} not found in map")
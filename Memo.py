@@ -0,0 +1,262 @@
+from collections import OrderedDict
+
+from Statement import (
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, Identifier, FunctionStatement, FunctionCall,
+    ArrayLiteral, MethodCall, ReturnStatement, MapLiteral, IndexExpression, IndexAssignment
+)
+from NumericArray import NumericArray
+from Builtins import BUILTINS
+
+# A fn is pure, and its calls can be answered from a cache keyed on the
+# argument values, when running it can't be observed except through its result:
+#
+# * no print/println and no nested fn (defining one registers it globally),
+# * every name it reads is a parameter or a local the body has definitely
+#   assigned by then, since an unassigned local falls back to the global,
+# * every fn it calls is pure, by name, for every definition of that name,
+#   or is a builtin (Builtins.py) no script fn is named after.
+#
+# Assignments are fine: under the resolver's scoping they only ever write the
+# call's own frame. Method calls are fine too, their object is a parameter or
+# a local, and only calls whose arguments are all hashable (so never arrays)
+# are cached. A `# nomemo` comment in a fn body keeps that fn out of the cache.
+# Writing to an index (`m[k] = v;`) is allowed for the same reason. A call
+# returning an array or map isn't cached either: the caller may change it, and
+# the next call must not see that.
+
+DEFAULT_MEMO_SIZE = 1024
+# A cache that has missed this often while hitting less than one lookup in
+# RETIRE_RATIO is switched off, so fns called with ever-new arguments go back
+# to plain calls instead of paying for the lookups.
+RETIRE_AFTER = 1000
+RETIRE_RATIO = 10
+MISSING = object()
+MUTABLE_RESULTS = (list, dict, NumericArray)
+
+class PurityChecker:
+    def __init__(self, function):
+        self.parameters = set(function.parameters)
+        self.calls = set()
+        self.pure = True
+        self.block(function.body, set())
+
+    def block(self, statements, assigned):
+        for statement in statements:
+            assigned = self.statement(statement, assigned)
+        return assigned
+
+    def statement(self, statement, assigned):
+        if isinstance(statement, IfStatement):
+            assigned = self.expression(statement.condition, assigned)
+            true_assigned = self.block(statement.true_statements, set(assigned))
+            false_assigned = self.block(statement.false_statements, set(assigned))
+            return true_assigned & false_assigned
+        elif isinstance(statement, WhileStatement):
+            assigned = self.expression(statement.condition, assigned)
+            self.block(statement.statements, set(assigned))
+            return assigned
+        elif isinstance(statement, ForStatement):
+            assigned = self.expression(statement.start, assigned) | {statement.identifier}
+            assigned = self.expression(statement.condition, assigned)
+            self.expression(statement.step, self.block(statement.statements, set(assigned)))
+            return assigned
+        elif isinstance(statement, ForEachStatement):
+            # Over nothing the body never runs and the variable stays unassigned.
+            assigned = self.expression(statement.iterable, assigned)
+            self.block(statement.statements, assigned | {statement.identifier})
+            return assigned
+        elif isinstance(statement, AssignmentStatement):
+            return self.expression(statement.value, assigned) | {statement.identifier}
+        elif isinstance(statement, (FunctionCall, MethodCall)):
+            return self.expression(statement, assigned)
+        elif isinstance(statement, IndexAssignment):
+            assigned = self.expression(statement.target, assigned)
+            assigned = self.expression(statement.index, assigned)
+            return self.expression(statement.value, assigned)
+        elif isinstance(statement, ReturnStatement):
+            if statement.value is not None:
+                return self.expression(statement.value, assigned)
+            return assigned
+        self.pure = False
+        return assigned
+
+    def expression(self, expression, assigned):
+        if isinstance(expression, Identifier):
+            self.read(expression.identifier, assigned)
+        elif isinstance(expression, BinaryExpression):
+            if expression.operator == '=' and isinstance(expression.left, Identifier):
+                return self.expression(expression.right, assigned) | {expression.left.identifier}
+            assigned = self.expression(expression.left, assigned)
+            return self.expression(expression.right, assigned)
+        elif isinstance(expression, UnaryExpression):
+            return self.expression(expression.expression, assigned)
+        elif isinstance(expression, ArrayLiteral):
+            for element in expression.elements:
+                assigned = self.expression(element, assigned)
+        elif isinstance(expression, IndexExpression):
+            assigned = self.expression(expression.target, assigned)
+            return self.expression(expression.index, assigned)
+        elif isinstance(expression, MapLiteral):
+            for key, value in zip(expression.keys, expression.values):
+                assigned = self.expression(key, assigned)
+                assigned = self.expression(value, assigned)
+        elif isinstance(expression, MethodCall):
+            self.read(expression.object_name, assigned)
+            for argument in expression.arguments:
+                assigned = self.expression(argument, assigned)
+        elif isinstance(expression, FunctionCall):
+            self.calls.add(expression.name)
+            for argument in expression.arguments:
+                assigned = self.expression(argument, assigned)
+        return assigned
+
+    def read(self, name, assigned):
+        if name not in self.parameters and name not in assigned:
+            self.pure = False
+
+def function_definitions(statements, definitions=None):
+    if definitions is None:
+        definitions = []
+    for statement in statements:
+        if isinstance(statement, FunctionStatement):
+            definitions.append(statement)
+            function_definitions(statement.body, definitions)
+        elif isinstance(statement, IfStatement):
+            function_definitions(statement.true_statements, definitions)
+            function_definitions(statement.false_statements, definitions)
+        elif isinstance(statement, (WhileStatement, ForStatement, ForEachStatement)):
+            function_definitions(statement.statements, definitions)
+    return definitions
+
+def mark_pure_functions(definitions):
+    # Sets `pure` on every FunctionStatement. Start from the fns that are pure
+    # on their own and drop names calling anything outside the set until
+    # nothing changes, so recursion between pure fns stays pure.
+    checkers = {}
+    by_name = {}
+    for function in definitions:
+        checkers[function] = PurityChecker(function)
+        by_name.setdefault(function.name, []).append(function)
+    pure_names = {name for name, functions in by_name.items()
+                  if all(checkers[function].pure for function in functions)}
+    pure_names |= {name for name in BUILTINS if name not in by_name}
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure_names):
+            if any(callee not in pure_names
+                   for function in by_name.get(name, ()) for callee in checkers[function].calls):
+                pure_names.discard(name)
+                changed = True
+    for function in definitions:
+        function.pure = function.name in pure_names
+    return pure_names
+
+def memo_key(values):
+    # Types are part of the key so 1, 1.0 and True don't share an entry.
+    return tuple(values) + tuple(map(type, values))
+
+class MemoCache:
+    def __init__(self, name, max_size=DEFAULT_MEMO_SIZE):
+        self.name = name
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+        self.active = True
+
+    def lookup(self, values):
+        # Returns (key, result) for these argument values. On a miss the result
+        # is MISSING and the caller runs the fn and passes its result to store,
+        # unless the key is None because the call can't be cached.
+        key = memo_key(values)
+        try:
+            result = self.entries.get(key, MISSING)
+        except TypeError:
+            self.uncacheable += 1
+            return None, MISSING
+        if result is not MISSING:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return key, result
+        self.misses += 1
+        if self.misses >= RETIRE_AFTER and self.hits * RETIRE_RATIO < self.misses:
+            self.active = False
+            self.entries.clear()
+            return None, MISSING
+        return key, MISSING
+
+    def store(self, key, result):
+        if key is None or not self.active:
+            return
+        if type(result) in MUTABLE_RESULTS:
+            self.uncacheable += 1
+            return
+        self.entries[key] = result
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'uncacheable': self.uncacheable, 'size': len(self.entries), 'active': self.active}
+
+    def __str__(self):
+        return f"MemoCache({self.name}, {self.stats()})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class Memoizer:
+    # Owns the caches of one interpreter, keyed by FunctionStatement.
+    def __init__(self, max_size=DEFAULT_MEMO_SIZE):
+        self.max_size = max_size
+        self.definitions = []
+        self.caches = {}
+
+    def analyze(self, statements):
+        # Purity is recomputed over every fn seen so far, so a REPL input that
+        # redefines a callee also updates the fns calling it.
+        function_definitions(statements, self.definitions)
+        mark_pure_functions(self.definitions)
+        caches = {}
+        for function in self.definitions:
+            if function.pure and function.memoize:
+                cache = self.caches.get(function)
+                if cache is None:
+                    cache = MemoCache(function.name, self.max_size)
+                caches[function] = cache
+                cache.active = True
+        self.caches = caches
+        self.invalidate()
+
+    def invalidate(self):
+        # Results may depend on the fns called, so redefining any fn drops them all.
+        for cache in self.caches.values():
+            cache.clear()
+
+    def stats(self):
+        stats = {}
+        for cache in self.caches.values():
+            totals = stats.setdefault(cache.name, {'hits': 0, 'misses': 0, 'evictions': 0, 'uncacheable': 0,
+                                                   'size': 0, 'active': False})
+            for key, value in cache.stats().items():
+                if key == 'active':
+                    totals[key] = totals[key] or value
+                else:
+                    totals[key] += value
+        return stats
+
+    def report(self):
+        lines = [f"{'hits':>10} {'misses':>10} {'evictions':>10} {'uncacheable':>12} {'size':>8}  function"]
+        for name, stats in sorted(self.stats().items(), key=lambda item: -item[1]['hits']):
+            note = "" if stats['active'] else "  (retired, too few hits)"
+            lines.append(f"{stats['hits']:>10} {stats['misses']:>10} {stats['evictions']:>10} "
+                         f"{stats['uncacheable']:>12} {stats['size']:>8}  fn {name}{note}")
+        return "\n".join(lines)
@@ -0,0 +1,194 @@
+from ErrorHandler import InterpreterError
+from Resolver import UNSET
+from Rope import Rope, flatten
+from NumericArray import NumericArray
+from Maps import remove
+
+# The methods scripts can call, per type of value: `x.name(...)` finds name in
+# the table of type(x) (or of a base class) and calls its function with x and
+# the arguments. Anything not registered here is out of reach of scripts,
+# Python's own methods included.
+#
+# Every MethodCall gets a MethodSite (see site_of) that remembers the
+# function it found for the last receiver type, so a call in a loop looks its
+# method up once instead of on every call. The arity is checked when a site
+# looks up a method, a site always passes the same number of arguments.
+#
+# Host programs add their own methods, or methods for their own types, with
+# register_method before running a script:
+#
+#     register_method(str, "shout", lambda text: text.upper() + "!")
+#     register_method(Point, "move", Point.move, 2)
+
+class Method:
+    __slots__ = ('name', 'function', 'arity', 'optional')
+
+    def __init__(self, name, function, arity, optional):
+        self.name = name
+        self.function = function
+        self.arity = arity
+        self.optional = optional
+
+    def accepts(self, argc):
+        return self.arity <= argc <= self.arity + self.optional
+
+    def expected(self):
+        if self.optional:
+            return f"{self.arity} to {self.arity + self.optional}"
+        return str(self.arity)
+
+    def __str__(self):
+        return f"Method({self.name}, {self.expected()} arguments)"
+
+    def __repr__(self):
+        return self.__str__()
+
+METHODS = {}
+
+def register_method(value_type, name, function, arity=0, optional=0):
+    # function(receiver, *arguments) takes `arity` arguments and up to
+    # `optional` more. Arguments arrive as YAL values: a long string may be a
+    # Rope, Rope.flatten gives the str.
+    METHODS.setdefault(value_type, {})[name] = Method(name, function, arity, optional)
+    if value_type is str:
+        # A Rope receiver is flattened first, so str methods only ever see a str.
+        METHODS.setdefault(Rope, {})[name] = Method(name, on_flattened(function), arity, optional)
+
+def on_flattened(function):
+    return lambda rope, *arguments: function(rope.flatten(), *arguments)
+
+def find_method(value_type, name):
+    for base in value_type.__mro__:
+        table = METHODS.get(base)
+        if table is not None and name in table:
+            return table[name]
+    return None
+
+class MethodSite:
+    # One `object.method(...)` in the source and the function its last lookup
+    # found. Engines call it inline:
+    #
+    #     function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
+    #
+    # A site that sees several types keeps what it found for each of them in
+    # `seen`, so switching between types costs a dict lookup, not a search.
+    __slots__ = ('object_name', 'method_name', 'argc', 'receiver_type', 'function', 'seen')
+
+    def __init__(self, object_name, method_name, argc):
+        self.object_name = object_name
+        self.method_name = method_name
+        self.argc = argc
+        self.receiver_type = None
+        self.function = None
+        self.seen = {}
+
+    def lookup(self, obj):
+        receiver_type = type(obj)
+        function = self.seen.get(receiver_type)
+        if function is None:
+            function = self.find(obj)
+            self.seen[receiver_type] = function
+        self.receiver_type = receiver_type
+        self.function = function
+        return function
+
+    def find(self, obj):
+        if obj is None or obj is UNSET:
+            raise InterpreterError(f"Object {self.object_name} not defined")
+        method = find_method(type(obj), self.method_name)
+        if method is None:
+            if self.method_name == 'count':
+                raise InterpreterError(f"Object {self.object_name} is not a string, list, or dictionary")
+            raise InterpreterError(f"Method {self.method_name} not found on object {self.object_name}")
+        if not method.accepts(self.argc):
+            raise InterpreterError(f"Method {self.method_name} on object {self.object_name} expects "
+                                   f"{method.expected()} arguments but got {self.argc}")
+        return method.function
+
+    def failure(self, error):
+        return InterpreterError(f"Error executing method {self.method_name} on object {self.object_name}: {error}")
+
+    def __reduce__(self):
+        # Pickled with an empty cache, the function may be a lambda.
+        return (MethodSite, (self.object_name, self.method_name, self.argc))
+
+    def __str__(self):
+        return f"MethodSite({self.object_name}.{self.method_name}, {self.argc} arguments)"
+
+    def __repr__(self):
+        return self.__str__()
+
+def site_of(node):
+    # The MethodSite of a MethodCall node, made on first use.
+    site = node.site
+    if site is None:
+        site = node.site = MethodSite(node.object_name, node.method_name, len(node.arguments))
+    return site
+
+def invoke(site, function, obj, *arguments):
+    try:
+        return function(obj, *arguments)
+    except Exception as e:
+        raise site.failure(e)
+
+def invoke_no_arguments(site, function, obj):
+    # Calling with an empty *arguments costs about as much as a call to len.
+    try:
+        return function(obj)
+    except Exception as e:
+        raise site.failure(e)
+
+# Built-in methods. str methods taking strings flatten Rope arguments.
+
+def flattening(function):
+    return lambda text, *arguments: function(text, *map(flatten, arguments))
+
+def join(text, items):
+    return text.join([flatten(item) for item in items])
+
+def list_set(items, index, value):
+    items[index] = value
+    return None
+
+register_method(str, 'count', len)
+register_method(Rope, 'count', len)
+for name in ('upper', 'lower', 'strip', 'lstrip', 'rstrip', 'isdigit', 'isalpha'):
+    register_method(str, name, getattr(str, name))
+register_method(str, 'startswith', flattening(str.startswith), 1)
+register_method(str, 'endswith', flattening(str.endswith), 1)
+register_method(str, 'find', flattening(str.find), 1)
+register_method(str, 'replace', flattening(str.replace), 2)
+register_method(str, 'split', flattening(str.split), 0, 1)
+register_method(str, 'join', join, 1)
+
+register_method(list, 'count', len)
+register_method(list, 'get', list.__getitem__, 1)
+register_method(list, 'set', list_set, 2)
+register_method(list, 'append', list.append, 1)
+register_method(list, 'extend', list.extend, 1)
+register_method(list, 'insert', list.insert, 2)
+register_method(list, 'pop', list.pop, 0, 1)
+register_method(list, 'remove', list.remove, 1)
+register_method(list, 'index', list.index, 1)
+register_method(list, 'reverse', list.reverse)
+register_method(list, 'sort', list.sort)
+register_method(list, 'clear', list.clear)
+register_method(list, 'copy', list.copy)
+register_method(list, 'numeric', NumericArray)
+
+register_method(dict, 'count', len)
+register_method(dict, 'get', dict.get, 1, 1)
+register_method(dict, 'has', dict.__contains__, 1)
+register_method(dict, 'remove', remove, 1)
+register_method(dict, 'keys', lambda table: list(table))
+register_method(dict, 'values', lambda table: list(table.values()))
+
+register_method(range, 'count', len)
+
+register_method(NumericArray, 'count', len)
+for name in ('sum', 'min', 'max', 'abs', 'square', 'list'):
+    register_method(NumericArray, name, getattr(NumericArray, name))
+register_method(NumericArray, 'get', NumericArray.get, 1)
+register_method(NumericArray, 'set', NumericArray.set, 2)
+register_method(NumericArray, 'append', NumericArray.append, 1)
+register_method(NumericArray, 'clip', NumericArray.clip, 2)
@@ -0,0 +1,244 @@
+import operator
+from array import array
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ErrorHandler import InterpreterError
+
+# Integer arrays are int64 ('q'), anything divided becomes float64 ('d').
+# Comparisons produce 0/1 integer arrays. Values that don't fit in int64 raise
+# an InterpreterError instead of silently wrapping, and dividing by zero raises
+# ZeroDivisionError like it does for plain numbers. Both backends give the same
+# results: values are checked before they are stored, and numpy results that
+# could have wrapped are computed again with Python ints.
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+# float64 is off by at most a few thousand at this size, so an estimated result
+# below it certainly fits in int64.
+SAFE_ESTIMATE = 2 ** 62
+
+def out_of_range():
+    return InterpreterError("Value out of range for a 64-bit numeric array")
+
+def check_value(value, typecode):
+    # The value to store, or an InterpreterError when the array can't hold it.
+    if type(value) is not int and type(value) is not bool:
+        if typecode == 'q':
+            raise InterpreterError(f"Numeric arrays only hold integers, got {value!r}")
+        if type(value) is not float:
+            raise InterpreterError(f"Numeric arrays only hold numbers, got {value!r}")
+        return value
+    if typecode == 'q':
+        if not INT64_MIN <= value <= INT64_MAX:
+            raise out_of_range()
+        return value
+    try:
+        return float(value)
+    except OverflowError:
+        raise out_of_range()
+
+def as_storage(values, typecode):
+    if numpy is not None:
+        return numpy.asarray(values, dtype=numpy.int64 if typecode == 'q' else numpy.float64)
+    return array(typecode, values)
+
+def fits_int64(operand):
+    return type(operand) is not int or INT64_MIN <= operand <= INT64_MAX
+
+def numpy_elementwise(function, left, right, typecode):
+    # The numpy result, or None when only Python ints give the right one.
+    if not (fits_int64(left) and fits_int64(right)):
+        return None
+    result = function(left, right)
+    if result.dtype == numpy.bool_:
+        return result.astype(numpy.int64)
+    if typecode == 'q' and result.size:
+        estimate = function(numpy.asarray(left, dtype=numpy.float64), numpy.asarray(right, dtype=numpy.float64))
+        if numpy.abs(estimate).max() >= SAFE_ESTIMATE:
+            return None
+    return result
+
+class NumericArray:
+    __hash__ = None
+
+    def __init__(self, values, typecode='q'):
+        if isinstance(values, NumericArray):
+            values = values.tolist()
+        self.data = as_storage([check_value(value, typecode) for value in values], typecode)
+        self.typecode = typecode
+
+    @classmethod
+    def wrap(cls, data, typecode):
+        result = cls.__new__(cls)
+        result.data = data
+        result.typecode = typecode
+        return result
+
+    def tolist(self):
+        return self.data.tolist()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __bool__(self):
+        return len(self.data) > 0
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __repr__(self):
+        return f"NumericArray({self.tolist()})"
+
+    def elementwise(self, other, function, typecode=None, reverse=False):
+        if typecode is None:
+            typecode = self.typecode
+            if isinstance(other, NumericArray):
+                if other.typecode == 'd':
+                    typecode = 'd'
+            elif isinstance(other, float):
+                typecode = 'd'
+        if isinstance(other, NumericArray):
+            if len(other) != len(self):
+                raise InterpreterError(f"Numeric arrays differ in length: {len(self)} and {len(other)}")
+            other_data = other.data
+        elif isinstance(other, (int, float)):
+            other_data = other
+        else:
+            return NotImplemented
+
+        left, right = (other_data, self.data) if reverse else (self.data, other_data)
+        if numpy is not None:
+            if function is operator.truediv and not numpy.all(right):
+                raise ZeroDivisionError("division by zero")
+            result = numpy_elementwise(function, left, right, typecode)
+            if result is not None:
+                return NumericArray.wrap(result, typecode)
+            # Plain Python ints below, as the array backend computes them.
+            left = left.tolist() if isinstance(left, numpy.ndarray) else left
+            right = right.tolist() if isinstance(right, numpy.ndarray) else right
+        if isinstance(other, NumericArray):
+            values = map(function, left, right)
+        elif reverse:
+            values = map(function, repeat(left), right)
+        else:
+            values = map(function, left, repeat(right))
+        try:
+            return NumericArray.wrap(as_storage(list(values) if numpy is not None else values, typecode), typecode)
+        except OverflowError:
+            raise out_of_range()
+
+    def __add__(self, other):
+        return self.elementwise(other, operator.add)
+
+    def __radd__(self, other):
+        return self.elementwise(other, operator.add, reverse=True)
+
+    def __sub__(self, other):
+        return self.elementwise(other, operator.sub)
+
+    def __rsub__(self, other):
+        return self.elementwise(other, operator.sub, reverse=True)
+
+    def __mul__(self, other):
+        return self.elementwise(other, operator.mul)
+
+    def __rmul__(self, other):
+        return self.elementwise(other, operator.mul, reverse=True)
+
+    def __truediv__(self, other):
+        return self.elementwise(other, operator.truediv, 'd')
+
+    def __rtruediv__(self, other):
+        return self.elementwise(other, operator.truediv, 'd', reverse=True)
+
+    def __lt__(self, other):
+        return self.elementwise(other, operator.lt, 'q')
+
+    def __le__(self, other):
+        return self.elementwise(other, operator.le, 'q')
+
+    def __gt__(self, other):
+        return self.elementwise(other, operator.gt, 'q')
+
+    def __ge__(self, other):
+        return self.elementwise(other, operator.ge, 'q')
+
+    def __eq__(self, other):
+        return self.elementwise(other, operator.eq, 'q')
+
+    def __ne__(self, other):
+        return self.elementwise(other, operator.ne, 'q')
+
+    def __neg__(self):
+        return self * -1
+
+    # Methods reachable from scripts (see Methods.py), e.g. `total = nums.sum();`
+
+    def sum(self):
+        if numpy is not None:
+            # An int64 sum that wrapped is only wrong when the true sum doesn't fit.
+            if self.typecode == 'q' and abs(self.data.sum(dtype=numpy.float64)) >= SAFE_ESTIMATE:
+                return sum(self.data.tolist())
+            return self.data.sum().item()
+        return sum(self.data)
+
+    def min(self):
+        if numpy is not None:
+            return self.data.min().item()
+        return min(self.data)
+
+    def max(self):
+        if numpy is not None:
+            return self.data.max().item()
+        return max(self.data)
+
+    def get(self, index):
+        value = self.data[operator.index(index)]
+        return value.item() if numpy is not None else value
+
+    def set(self, index, value):
+        value = check_value(value, self.typecode)
+        self.data[operator.index(index)] = value
+        return None
+
+    # `nums[i]` and `nums[i] = x;` in scripts.
+    __getitem__ = get
+    __setitem__ = set
+
+    def append(self, value):
+        value = check_value(value, self.typecode)
+        if numpy is not None:
+            self.data = numpy.append(self.data, as_storage([value], self.typecode))
+        else:
+            self.data.append(value)
+        return None
+
+    def abs(self):
+        if self.typecode == 'q' and INT64_MIN in self.data:
+            raise out_of_range()
+        if numpy is not None:
+            return NumericArray.wrap(numpy.abs(self.data), self.typecode)
+        return NumericArray.wrap(array(self.typecode, map(abs, self.data)), self.typecode)
+
+    def square(self):
+        return self * self
+
+    def clip(self, low, high):
+        low = check_value(low, self.typecode)
+        high = check_value(high, self.typecode)
+        if numpy is not None:
+            return NumericArray.wrap(numpy.clip(self.data, low, high), self.typecode)
+        values = (low if value < low else high if value > high else value for value in self.data)
+        return NumericArray.wrap(array(self.typecode, values), self.typecode)
+
+    def list(self):
+        return self.tolist()
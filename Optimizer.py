@@ -0,0 +1,339 @@
+from Statement import (
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, PrintStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, IntegerLiteral, Identifier, StringLiteral, FunctionStatement, FunctionCall,
+    ArrayLiteral, MethodCall, ReturnStatement, MapLiteral, IndexExpression, IndexAssignment
+)
+from ErrorHandler import nested_too_deeply
+from Resolver import assigned_names
+from Rope import STRING_TYPES, Rope, concat
+
+# Folding never turns a value into something the interpreter could not have
+# produced itself: only int and str results become literals again (comparisons
+# and `/` give bools and floats, which have no literal node), and results larger
+# than these limits stay as runtime expressions.
+MAX_FOLDED_INT_BITS = 256
+MAX_FOLDED_STRING_LENGTH = 4096
+
+NO_VALUE = object()
+
+def apply_operator(operator, left, right):
+    if operator == '+':
+        if isinstance(left, STRING_TYPES) or isinstance(right, STRING_TYPES):
+            return concat(left, right)
+        return left + right
+    elif operator == '-':
+        return left - right
+    elif operator == '*':
+        return left * right
+    elif operator == '/':
+        return left / right
+    elif operator == '>':
+        return left > right
+    elif operator == '<':
+        return left < right
+    elif operator == '==':
+        return left == right
+    elif operator == '!=':
+        return left != right
+    elif operator == '>=':
+        return left >= right
+    elif operator == '<=':
+        return left <= right
+    return NO_VALUE
+
+def literal_value(expression):
+    if isinstance(expression, (IntegerLiteral, StringLiteral)):
+        return expression.value
+    return NO_VALUE
+
+def make_literal(value):
+    if type(value) is Rope:
+        value = value.flatten()
+    if type(value) is int and value.bit_length() <= MAX_FOLDED_INT_BITS:
+        return IntegerLiteral(value)
+    if type(value) is str and len(value) <= MAX_FOLDED_STRING_LENGTH:
+        return StringLiteral(value)
+    return None
+
+def is_pure(expression):
+    # Only reads that can neither raise nor assign are safe to drop.
+    return isinstance(expression, (IntegerLiteral, StringLiteral, Identifier))
+
+def counter_step(step, name):
+    # Returns c when evaluating `step` yields `name + c` and has no other effect.
+    # Covers `i + c`, `i = i + c`, and `(i = i) + c`, and the same with `- c`.
+    if isinstance(step, BinaryExpression) and step.operator == '=':
+        if isinstance(step.left, Identifier) and step.left.identifier == name:
+            return counter_step(step.right, name)
+        return None
+    if not (isinstance(step, BinaryExpression) and step.operator in ('+', '-')):
+        return None
+    if type(literal_value(step.right)) is not int:
+        return None
+    left = step.left
+    if isinstance(left, BinaryExpression) and left.operator == '=':
+        if not (isinstance(left.left, Identifier) and left.left.identifier == name):
+            return None
+        left = left.right
+    if isinstance(left, Identifier) and left.identifier == name:
+        return step.right.value if step.operator == '+' else -step.right.value
+    return None
+
+def counter_bound(condition, name):
+    # Returns (operator, bound) for `name < bound`, `name <= bound` and friends.
+    if not isinstance(condition, BinaryExpression) or condition.operator not in ('<', '<=', '>', '>='):
+        return None
+    if not (isinstance(condition.left, Identifier) and condition.left.identifier == name):
+        return None
+    bound = literal_value(condition.right)
+    if type(bound) is not int:
+        return None
+    return condition.operator, bound
+
+def is_invariant(expression, assigned):
+    # True when evaluating `expression` has no effect and gives the same value
+    # as long as none of the `assigned` names change.
+    if isinstance(expression, (IntegerLiteral, StringLiteral)):
+        return True
+    if isinstance(expression, Identifier):
+        return expression.identifier not in assigned
+    if isinstance(expression, BinaryExpression):
+        return (expression.operator != '=' and is_invariant(expression.left, assigned)
+                and is_invariant(expression.right, assigned))
+    if isinstance(expression, UnaryExpression):
+        return is_invariant(expression.expression, assigned)
+    return False
+
+def counted_loop(statement):
+    # Returns (operator, bound, step) when the for loop `statement` counts
+    # towards a loop-invariant bound: `i < bound` (or <=, >, >=) with
+    # `i = i + c` stepping towards it, and a body that never assigns i or any
+    # name the bound reads. Functions can't assign their caller's variables
+    # (see Resolver.py), so the body alone decides. Otherwise None.
+    name = statement.identifier
+    condition = statement.condition
+    if not (isinstance(condition, BinaryExpression) and condition.operator in ('<', '<=', '>', '>=')
+            and isinstance(condition.left, Identifier) and condition.left.identifier == name):
+        return None
+    step = counter_step(statement.step, name)
+    if step is None or step == 0 or (step > 0) != (condition.operator in ('<', '<=')):
+        return None
+    assigned = set(assigned_names(statement.statements))
+    if name in assigned:
+        return None
+    assigned.add(name)
+    if not is_invariant(condition.right, assigned):
+        return None
+    return condition.operator, condition.right, step
+
+def counted_range(start, operator, bound, step):
+    # The counter values a counted loop runs its body with, for int start and bound.
+    if operator == '<=':
+        bound += 1
+    elif operator == '>=':
+        bound -= 1
+    return range(start, bound, step)
+
+def counted_loop_final_value(start, operator, bound, step):
+    if operator == '<':
+        if start >= bound:
+            return start
+        if step <= 0:
+            return None
+        return start + -(-(bound - start) // step) * step
+    elif operator == '<=':
+        if start > bound:
+            return start
+        if step <= 0:
+            return None
+        return start + ((bound - start) // step + 1) * step
+    elif operator == '>':
+        if start <= bound:
+            return start
+        if step >= 0:
+            return None
+        return start - -(-(start - bound) // -step) * -step
+    else:
+        if start < bound:
+            return start
+        if step >= 0:
+            return None
+        return start - ((start - bound) // -step + 1) * -step
+
+class Optimizer:
+    def __init__(self):
+        self.stats = {'folded': 0, 'branches_removed': 0, 'loops_removed': 0}
+
+    def optimize(self, statements):
+        return self.optimize_block(statements)
+
+    def optimize_block(self, statements):
+        optimized = []
+        for statement in statements:
+            optimized.extend(self.optimize_statement(statement))
+        return optimized
+
+    def optimize_statement(self, statement):
+        if isinstance(statement, IfStatement):
+            statement.condition = self.fold(statement.condition)
+            statement.true_statements = self.optimize_block(statement.true_statements)
+            statement.false_statements = self.optimize_block(statement.false_statements)
+            condition = self.constant_value(statement.condition)
+            if condition is not NO_VALUE:
+                self.stats['branches_removed'] += 1
+                return statement.true_statements if condition else statement.false_statements
+            if not statement.true_statements and not statement.false_statements and is_pure(statement.condition):
+                self.stats['branches_removed'] += 1
+                return []
+            return [statement]
+        elif isinstance(statement, WhileStatement):
+            statement.condition = self.fold(statement.condition)
+            statement.statements = self.optimize_block(statement.statements)
+            condition = self.constant_value(statement.condition)
+            if condition is not NO_VALUE and not condition:
+                self.stats['loops_removed'] += 1
+                return []
+            return [statement]
+        elif isinstance(statement, ForStatement):
+            statement.start = self.fold(statement.start)
+            statement.condition = self.fold(statement.condition)
+            statement.step = self.fold(statement.step)
+            statement.statements = self.optimize_block(statement.statements)
+            replacement = self.reduce_for(statement)
+            if replacement is not None:
+                replacement.line = statement.line
+                replacement.column = statement.column
+                self.stats['loops_removed'] += 1
+                return [replacement]
+            return [statement]
+        elif isinstance(statement, ForEachStatement):
+            statement.iterable = self.fold(statement.iterable)
+            statement.statements = self.optimize_block(statement.statements)
+            return [statement]
+        elif isinstance(statement, PrintStatement):
+            statement.expression = self.fold(statement.expression)
+        elif isinstance(statement, AssignmentStatement):
+            statement.value = self.fold(statement.value)
+        elif isinstance(statement, FunctionStatement):
+            statement.body = self.optimize_block(statement.body)
+        elif isinstance(statement, (FunctionCall, MethodCall)):
+            statement.arguments = [self.fold(argument) for argument in statement.arguments]
+        elif isinstance(statement, IndexAssignment):
+            statement.target = self.fold(statement.target)
+            statement.index = self.fold(statement.index)
+            statement.value = self.fold(statement.value)
+        elif isinstance(statement, ReturnStatement):
+            if statement.value is not None:
+                statement.value = self.fold(statement.value)
+        return [statement]
+
+    def reduce_for(self, statement):
+        # A for loop that never runs its body, or whose body is empty, only leaves
+        # the counter behind, so it can become a single assignment.
+        start = literal_value(statement.start)
+        if type(start) is not int:
+            return None
+        shape = counter_bound(statement.condition, statement.identifier)
+        if shape is None:
+            return None
+        operator, bound = shape
+        if apply_operator(operator, start, bound) is False:
+            return AssignmentStatement(statement.identifier, IntegerLiteral(start))
+        if statement.statements:
+            return None
+        step = counter_step(statement.step, statement.identifier)
+        if step is None:
+            return None
+        final = counted_loop_final_value(start, operator, bound, step)
+        if final is None:
+            return None
+        return AssignmentStatement(statement.identifier, IntegerLiteral(final))
+
+    def constant_value(self, expression):
+        value = literal_value(expression)
+        if value is not NO_VALUE:
+            return value
+        if isinstance(expression, BinaryExpression) and expression.operator != '=':
+            left = self.constant_value(expression.left)
+            right = self.constant_value(expression.right)
+            if left is NO_VALUE or right is NO_VALUE:
+                return NO_VALUE
+            try:
+                return apply_operator(expression.operator, left, right)
+            except Exception:
+                return NO_VALUE
+        if isinstance(expression, UnaryExpression) and expression.operator == '-':
+            value = self.constant_value(expression.expression)
+            if value is NO_VALUE:
+                return NO_VALUE
+            try:
+                return -value
+            except Exception:
+                return NO_VALUE
+        return NO_VALUE
+
+    def fold(self, expression):
+        if isinstance(expression, BinaryExpression):
+            expression.left = self.fold(expression.left)
+            expression.right = self.fold(expression.right)
+            if expression.operator == '=':
+                return expression
+        elif isinstance(expression, UnaryExpression):
+            expression.expression = self.fold(expression.expression)
+        elif isinstance(expression, ArrayLiteral):
+            expression.elements = [self.fold(element) for element in expression.elements]
+            return expression
+        elif isinstance(expression, (FunctionCall, MethodCall)):
+            expression.arguments = [self.fold(argument) for argument in expression.arguments]
+            return expression
+        elif isinstance(expression, IndexExpression):
+            expression.target = self.fold(expression.target)
+            expression.index = self.fold(expression.index)
+            return expression
+        elif isinstance(expression, MapLiteral):
+            expression.keys = [self.fold(key) for key in expression.keys]
+            expression.values = [self.fold(value) for value in expression.values]
+            return expression
+        else:
+            return expression
+        value = self.constant_value(expression)
+        if value is NO_VALUE:
+            return expression
+        literal = make_literal(value)
+        if literal is None:
+            return expression
+        self.stats['folded'] += 1
+        return literal
+
+def optimize(statements):
+    try:
+        return Optimizer().optimize(statements)
+    except RecursionError:
+        raise nested_too_deeply("optimizer") from None
+
+def dump(statements, indent=0):
+    lines = []
+    pad = "    " * indent
+    for statement in statements:
+        if isinstance(statement, IfStatement):
+            lines.append(f"{pad}IfStatement({statement.condition})")
+            lines.extend(dump(statement.true_statements, indent + 1))
+            if statement.false_statements:
+                lines.append(f"{pad}else")
+                lines.extend(dump(statement.false_statements, indent + 1))
+        elif isinstance(statement, WhileStatement):
+            lines.append(f"{pad}WhileStatement({statement.condition})")
+            lines.extend(dump(statement.statements, indent + 1))
+        elif isinstance(statement, ForStatement):
+            lines.append(f"{pad}ForStatement({statement.identifier}, {statement.start}, "
+                         f"{statement.condition}, {statement.step})")
+            lines.extend(dump(statement.statements, indent + 1))
+        elif isinstance(statement, ForEachStatement):
+            lines.append(f"{pad}ForEachStatement({statement.identifier}, {statement.iterable})")
+            lines.extend(dump(statement.statements, indent + 1))
+        elif isinstance(statement, FunctionStatement):
+            lines.append(f"{pad}FunctionStatement({statement.name}, {statement.parameters})")
+            lines.extend(dump(statement.body, indent + 1))
+        else:
+            lines.append(f"{pad}{statement}")
+    return lines
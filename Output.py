@@ -0,0 +1,61 @@
+import io
+import sys
+
+class OutputSink:
+    # Collects print/println output and hands it to the target in large chunks.
+    #   "size" flushes once buffer_size characters are pending,
+    #   "line" flushes after every println (interactive use),
+    #   "end"  only flushes when the program ends or flush() is called.
+    FLUSH_POLICIES = ("size", "line", "end")
+
+    def __init__(self, target=None, buffer_size=65536, flush_policy="size"):
+        if flush_policy not in self.FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy: {flush_policy}")
+        # None means whatever sys.stdout is at flush time, so redirect_stdout keeps working.
+        self.target = target
+        self.buffer_size = buffer_size
+        self.flush_policy = flush_policy
+        self.chunks = []
+        self.pending = 0
+        self.bytes_written = 0
+        self.lines_written = 0
+        self.flushes = 0
+
+    def write(self, value, newline=True):
+        text = str(value)
+        if newline:
+            text += "\n"
+        self.chunks.append(text)
+        self.pending += len(text)
+        if self.flush_policy == "size":
+            if self.pending >= self.buffer_size:
+                self.flush()
+        elif self.flush_policy == "line" and newline:
+            self.flush()
+
+    def flush(self):
+        if not self.chunks:
+            return
+        data = "".join(self.chunks)
+        self.chunks = []
+        self.pending = 0
+        target = self.target if self.target is not None else sys.stdout
+        if isinstance(target, (io.RawIOBase, io.BufferedIOBase)):
+            encoded = data.encode()
+            target.write(encoded)
+            self.bytes_written += len(encoded)
+        else:
+            target.write(data)
+            self.bytes_written += len(data) if data.isascii() else len(data.encode())
+        if hasattr(target, "flush"):
+            target.flush()
+        self.lines_written += data.count("\n")
+        self.flushes += 1
+
+    def stats(self):
+        return {'bytes_written': self.bytes_written, 'lines_written': self.lines_written, 'flushes': self.flushes}
+
+def make_output(output):
+    if isinstance(output, OutputSink):
+        return output
+    return OutputSink(output)
@@ -0,0 +1,145 @@
+import json
+import time
+
+# Times are attributed like this:
+#   statement inclusive  wall time from entering the statement until it finishes
+#   statement exclusive  inclusive minus the nested statements and calls it ran
+#   function  inclusive  wall time of each call, counted once for recursive calls
+#   function  exclusive  inclusive minus the time spent in calls to other functions
+# The collapsed output has one "frame;frame;frame microseconds" line per stack,
+# the format flamegraph.pl and speedscope read.
+
+class ProfileEntry:
+    def __init__(self, node, kind, name=None):
+        self.node = node
+        self.kind = kind
+        self.name = name
+        self.line = node.line
+        self.column = node.column
+        self.hits = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.active = 0
+
+    def location(self):
+        if self.line is None:
+            return "?"
+        return f"{self.line}:{self.column}"
+
+    def label(self):
+        if self.name is not None:
+            return f"fn:{self.name}:{self.line}"
+        return f"{self.kind}:{self.line}"
+
+    def to_dict(self):
+        entry = {'kind': self.kind, 'line': self.line, 'column': self.column, 'hits': self.hits,
+                 'inclusive': self.inclusive, 'exclusive': self.exclusive}
+        if self.name is not None:
+            entry['name'] = self.name
+        return entry
+
+    def __str__(self):
+        return f"ProfileEntry({self.label()}, {self.hits}, {self.inclusive:.6f}, {self.exclusive:.6f})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class Profiler:
+    def __init__(self, source=None, clock=time.perf_counter):
+        self.clock = clock
+        self.source_lines = source.splitlines() if source is not None else []
+        self.statements = {}
+        self.functions = {}
+        # Each frame is [entry, start, time in nested frames, time in nested calls].
+        self.stack = []
+        self.function_stack = []
+        self.collapsed = {}
+
+    def statement_entry(self, statement):
+        entry = self.statements.get(statement)
+        if entry is None:
+            entry = self.statements[statement] = ProfileEntry(statement, type(statement).__name__)
+        return entry
+
+    def function_entry(self, function):
+        entry = self.functions.get(function)
+        if entry is None:
+            entry = self.functions[function] = ProfileEntry(function, type(function).__name__, function.name)
+        return entry
+
+    def enter(self, entry, is_function=False):
+        entry.hits += 1
+        entry.active += 1
+        frame = [entry, 0.0, 0.0, 0.0]
+        self.stack.append(frame)
+        if is_function:
+            self.function_stack.append(frame)
+        frame[1] = self.clock()
+
+    def exit(self):
+        now = self.clock()
+        frame = self.stack.pop()
+        entry, start, child_time, call_time = frame
+        elapsed = now - start
+        entry.active -= 1
+        if not entry.active:
+            entry.inclusive += elapsed
+        if self.function_stack and self.function_stack[-1] is frame:
+            self.function_stack.pop()
+            entry.exclusive += elapsed - call_time
+            if self.function_stack:
+                self.function_stack[-1][3] += elapsed
+        else:
+            entry.exclusive += elapsed - child_time
+        path = ";".join([item[0].label() for item in self.stack] + [entry.label()])
+        self.collapsed[path] = self.collapsed.get(path, 0.0) + elapsed - child_time
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def source_text(self, entry, width=40):
+        if entry.line is None or entry.line > len(self.source_lines):
+            return ""
+        text = self.source_lines[entry.line - 1].strip()
+        if len(text) > width:
+            text = text[:width - 3] + "..."
+        return text
+
+    def report(self, limit=20, sort="exclusive"):
+        if sort not in ("exclusive", "inclusive", "hits"):
+            raise ValueError(f"Unknown sort key: {sort}")
+        lines = []
+        header = f"{'hits':>10} {'inclusive':>12} {'exclusive':>12}  {'location':<10} "
+        for title, entries in (("Functions", self.functions.values()), ("Statements", self.statements.values())):
+            rows = sorted(entries, key=lambda entry: getattr(entry, sort), reverse=True)[:limit]
+            if not rows:
+                continue
+            if lines:
+                lines.append("")
+            lines.append(f"{title} (top {len(rows)} by {sort}, times in ms)")
+            lines.append(header + ("function" if title == "Functions" else "statement"))
+            for entry in rows:
+                description = f"fn {entry.name}" if entry.name is not None else entry.kind
+                text = self.source_text(entry)
+                if text:
+                    description = f"{description}  {text}"
+                lines.append(f"{entry.hits:>10} {entry.inclusive * 1000:>12.3f} {entry.exclusive * 1000:>12.3f}  "
+                             f"{entry.location():<10} {description}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'functions': [entry.to_dict() for entry in self.functions.values()],
+            'statements': [entry.to_dict() for entry in self.statements.values()],
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def collapsed_stacks(self):
+        return [f"{path} {round(seconds * 1000000)}" for path, seconds in sorted(self.collapsed.items())]
+
+    def write_collapsed(self, path):
+        with open(path, "w") as file:
+            for line in self.collapsed_stacks():
+                file.write(line + "\n")
@@ -0,0 +1,84 @@
+import sys
+
+from ErrorHandler import LexerError, ParserError, InterpreterError
+from Ast import Parser, Interpreter
+from Lexer import StreamingLexer
+from Output import OutputSink
+from Memo import DEFAULT_MEMO_SIZE
+from CallStack import DEFAULT_MAX_DEPTH
+
+# Every input runs on the same Interpreter, so variables and functions defined
+# by earlier inputs stay visible. Input continues over several lines while
+# braces are open, and an input that does not end in `;` or `}` is treated as
+# an expression and printed.
+
+PROMPT = "yal> "
+CONTINUATION_PROMPT = "...> "
+
+class Repl:
+    def __init__(self, mode="tree", output=None, stdin=sys.stdin, log=sys.stderr, memo_size=DEFAULT_MEMO_SIZE,
+                 max_depth=DEFAULT_MAX_DEPTH):
+        self.output = output if output is not None else OutputSink(flush_policy="line")
+        self.interpreter = Interpreter([], mode=mode, output=self.output, memo_size=memo_size, max_depth=max_depth)
+        self.stdin = stdin
+        self.log = log
+
+    def read(self):
+        lines = []
+        depth = 0
+        while True:
+            self.log.write(CONTINUATION_PROMPT if lines else PROMPT)
+            self.log.flush()
+            line = self.stdin.readline()
+            if not line:
+                return "\n".join(lines) if lines else None
+            lines.append(line.rstrip("\n"))
+            depth += line.count("{") - line.count("}")
+            if depth <= 0:
+                return "\n".join(lines)
+
+    def evaluate(self, source):
+        source = source.strip()
+        if not source:
+            return
+        if source[-1] not in ";}":
+            source = f"println({source});"
+        tokens = StreamingLexer(source).tokenize()
+        if not tokens:
+            return
+        self.interpreter.run(Parser(tokens).parse())
+
+    def command(self, source):
+        if source in (":quit", ":q"):
+            return False
+        if source == ":vars":
+            for name, value in self.interpreter.variables.items():
+                self.log.write(f"{name} = {value!r}\n")
+            for name in self.interpreter.functions:
+                self.log.write(f"fn {name}\n")
+        else:
+            self.log.write(f"Unknown command: {source} (try :vars or :quit)\n")
+        return True
+
+    def run(self):
+        while True:
+            try:
+                source = self.read()
+            except KeyboardInterrupt:
+                self.log.write("\n")
+                continue
+            if source is None:
+                self.log.write("\n")
+                return
+            if source.strip().startswith(":"):
+                if not self.command(source.strip()):
+                    return
+                continue
+            try:
+                self.evaluate(source)
+            except (LexerError, ParserError, InterpreterError) as e:
+                self.output.flush()
+                self.log.write(f"{type(e).__name__}: {e}\n")
+            except KeyboardInterrupt:
+                self.output.flush()
+                self.log.write("Interrupted\n")
@@ -0,0 +1,128 @@
+from Statement import (
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, PrintStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, Identifier, FunctionStatement, FunctionCall,
+    ArrayLiteral, MethodCall, ReturnStatement, MapLiteral, IndexExpression, IndexAssignment
+)
+
+# Scoping rules applied by the resolver, shared by every execution engine:
+#
+# * Top-level code reads and writes globals, i.e. Interpreter.variables.
+# * Inside a fn body the parameters and every name the body assigns (plain
+#   assignments, `name = ...` expressions, for-loop counters and for-each
+#   variables) are locals.
+#   Each local gets a fixed slot in a per-call frame list, parameters first.
+# * Any other name inside a fn body is a global. Functions no longer see the
+#   caller's locals, and a call costs a frame of the function's own size
+#   instead of a copy of every variable in scope.
+# * A local that has not been assigned yet in the current call reads the
+#   global of the same name (or 0), so `x = x + 1` inside a fn still starts from
+#   the global x. Writes to locals never touch globals.
+# * A fn declared inside another fn is registered globally as before and gets
+#   its own scope. It does not capture the enclosing function's locals.
+
+class Unset:
+    def __repr__(self):
+        return "UNSET"
+
+UNSET = Unset()
+
+def new_frame(function):
+    return [UNSET] * function.frame_size
+
+class Resolver:
+    # Walks the tree over an explicit stack of (node, scope) pairs, like the
+    # parser, so deeply nested blocks or long operator chains never run into
+    # Python's recursion limit. scope is None at top level.
+    def __init__(self):
+        self.scope = None
+
+    def resolve(self, statements):
+        stack = [(statement, self.scope) for statement in reversed(statements)]
+        while stack:
+            node, scope = stack.pop()
+            if isinstance(node, FunctionStatement):
+                scope = self.function_scope(node)
+                children = node.body
+            else:
+                if isinstance(node, (ForStatement, ForEachStatement, AssignmentStatement, Identifier)):
+                    node.slot = None if scope is None else scope.get(node.identifier)
+                elif isinstance(node, MethodCall):
+                    node.slot = None if scope is None else scope.get(node.object_name)
+                children = child_nodes(node)
+            for child in reversed(children):
+                stack.append((child, scope))
+        return statements
+
+    def function_scope(self, function):
+        scope = {}
+        parameter_slots = []
+        for parameter in function.parameters:
+            if parameter not in scope:
+                scope[parameter] = len(scope)
+            parameter_slots.append(scope[parameter])
+        for name in assigned_names(function.body):
+            if name not in scope:
+                scope[name] = len(scope)
+        function.parameter_slots = parameter_slots
+        function.frame_size = len(scope)
+        function.local_names = list(scope)
+        return scope
+
+def child_nodes(node):
+    # The statements and expressions directly inside node, in source order.
+    # A nested fn's body is not included, it has a scope of its own.
+    if isinstance(node, BinaryExpression):
+        return (node.left, node.right)
+    elif isinstance(node, UnaryExpression):
+        return (node.expression,)
+    elif isinstance(node, (FunctionCall, MethodCall)):
+        return node.arguments
+    elif isinstance(node, AssignmentStatement):
+        return (node.value,)
+    elif isinstance(node, IfStatement):
+        return [node.condition] + node.true_statements + node.false_statements
+    elif isinstance(node, WhileStatement):
+        return [node.condition] + node.statements
+    elif isinstance(node, ForStatement):
+        return [node.start, node.condition, node.step] + node.statements
+    elif isinstance(node, ForEachStatement):
+        return [node.iterable] + node.statements
+    elif isinstance(node, PrintStatement):
+        return (node.expression,)
+    elif isinstance(node, ReturnStatement):
+        return () if node.value is None else (node.value,)
+    elif isinstance(node, ArrayLiteral):
+        return node.elements
+    elif isinstance(node, IndexExpression):
+        return (node.target, node.index)
+    elif isinstance(node, IndexAssignment):
+        return (node.target, node.index, node.value)
+    elif isinstance(node, MapLiteral):
+        return [item for pair in zip(node.keys, node.values) for item in pair]
+    return ()
+
+def left_chain(expression):
+    # The binary expressions down the left side of `a + b - c ...`, innermost first.
+    chain = []
+    while isinstance(expression, BinaryExpression) and expression.operator != '=':
+        chain.append(expression)
+        expression = expression.left
+    chain.reverse()
+    return chain
+
+def assigned_names(statements):
+    # Every name the statements assign, in source order, outside nested fns.
+    # Writing to an index changes the container, not the name holding it.
+    names = []
+    stack = list(reversed(statements))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (AssignmentStatement, ForStatement, ForEachStatement)):
+            names.append(node.identifier)
+        elif isinstance(node, BinaryExpression) and node.operator == '=' and isinstance(node.left, Identifier):
+            names.append(node.left.identifier)
+        stack.extend(reversed(child_nodes(node)))
+    return names
+
+def resolve(statements):
+    return Resolver().resolve(statements)
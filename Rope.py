@@ -0,0 +1,154 @@
+# `s = s + "..."` in a loop copies all of s every time, so building a long
+# string that way is quadratic. Once a `+` result reaches ROPE_MIN_LENGTH
+# characters it is a Rope instead: a length into a StringBuffer that only
+# ever grows. Adding to the newest Rope of a buffer appends to the buffer,
+# and the text is joined only when the value is flattened: printed, compared,
+# hashed, or handed to a method. A Rope behaves like the str it stands for
+# everywhere else, so no engine has to tell them apart except in `+`.
+
+ROPE_MIN_LENGTH = 1024
+# Pieces appended one by one are joined into a chunk this many at a time, so
+# a buffer holds a few large strings rather than millions of small ones.
+TAIL_PIECES = 64
+
+class StringBuffer:
+    __slots__ = ('chunks', 'tail', 'length')
+
+    def __init__(self, text):
+        self.chunks = [text]
+        self.tail = []
+        self.length = len(text)
+
+    def append(self, text):
+        tail = self.tail
+        tail.append(text)
+        self.length += len(text)
+        if len(tail) >= TAIL_PIECES:
+            self.chunks.append("".join(tail))
+            self.tail = []
+
+    def text(self):
+        # Leaves the whole text as the only chunk, so flattening again later
+        # only joins what was appended since.
+        if self.tail:
+            self.chunks.append("".join(self.tail))
+            self.tail = []
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0]
+
+    def __str__(self):
+        return f"StringBuffer({self.length} characters, {len(self.chunks)} chunks, {len(self.tail)} pieces)"
+
+    def __repr__(self):
+        return self.__str__()
+
+class Rope:
+    # The first `length` characters of `buffer`.
+    __slots__ = ('buffer', 'length', 'flat')
+
+    def __init__(self, buffer, length):
+        self.buffer = buffer
+        self.length = length
+        self.flat = None
+
+    def append(self, text):
+        buffer = self.buffer
+        if buffer.length != self.length:
+            # A longer Rope grew out of this one already, `s + "a"` and
+            # `s + "b"` can't share the characters after s.
+            buffer = StringBuffer(self.flatten())
+        buffer.append(text)
+        return Rope(buffer, buffer.length)
+
+    def flatten(self):
+        flat = self.flat
+        if flat is None:
+            text = self.buffer.text()
+            flat = self.flat = text if len(text) == self.length else text[:self.length]
+        return flat
+
+    def __str__(self):
+        return self.flatten()
+
+    def __repr__(self):
+        # As the str would print, e.g. inside a printed array.
+        return repr(self.flatten())
+
+    def __format__(self, spec):
+        return format(self.flatten(), spec)
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __hash__(self):
+        return hash(self.flatten())
+
+    def __getitem__(self, index):
+        return self.flatten()[index]
+
+    # Every other operator works on the flattened str, errors included.
+    def __eq__(self, other):
+        return self.flatten() == flatten(other)
+
+    def __ne__(self, other):
+        return self.flatten() != flatten(other)
+
+    def __lt__(self, other):
+        return self.flatten() < flatten(other)
+
+    def __le__(self, other):
+        return self.flatten() <= flatten(other)
+
+    def __gt__(self, other):
+        return self.flatten() > flatten(other)
+
+    def __ge__(self, other):
+        return self.flatten() >= flatten(other)
+
+    def __add__(self, other):
+        return self.flatten() + flatten(other)
+
+    def __radd__(self, other):
+        return other + self.flatten()
+
+    def __sub__(self, other):
+        return self.flatten() - other
+
+    def __rsub__(self, other):
+        return other - self.flatten()
+
+    def __mul__(self, other):
+        return self.flatten() * other
+
+    def __rmul__(self, other):
+        return other * self.flatten()
+
+    def __truediv__(self, other):
+        return self.flatten() / other
+
+    def __rtruediv__(self, other):
+        return other / self.flatten()
+
+    def __neg__(self):
+        return -self.flatten()
+
+STRING_TYPES = (str, Rope)
+
+def flatten(value):
+    return value.flatten() if type(value) is Rope else value
+
+def concat(left, right):
+    # `left + right` when either side is a string.
+    if type(left) is Rope:
+        return left.append(str(right))
+    text = str(left)
+    more = str(right)
+    if len(text) + len(more) < ROPE_MIN_LENGTH:
+        return text + more
+    buffer = StringBuffer(text)
+    buffer.append(more)
+    return Rope(buffer, buffer.length)
@@ -0,0 +1,153 @@
+import asyncio
+import io
+import time
+from collections import deque
+
+from ErrorHandler import InterpreterError
+from Lexer import parse_source
+from Bytecode import CodeObject, compile_program
+from VM import VM
+from Output import OutputSink
+from CallStack import DEFAULT_MAX_DEPTH
+
+# Green threads: many programs share one Python thread by taking turns. Each
+# Task is a VM whose run() generator pauses after a slice of steps, a step
+# being a loop iteration or a fn call, so even `while (1) {}` gives the others
+# a turn. The Scheduler resumes the ready tasks round-robin, one slice each,
+# and stops a task for good when it finishes, fails, passes its step budget
+# or its deadline, or is cancelled. Deadlines are checked before every slice,
+# so a task can overrun its deadline by at most one slice.
+
+DEFAULT_SLICE_SIZE = 1000
+
+READY = "ready"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed out"
+OVER_BUDGET = "over budget"
+
+class Task:
+    def __init__(self, code, name=None, budget=None, deadline=None, output=None, max_depth=DEFAULT_MAX_DEPTH):
+        self.name = name
+        self.budget = budget
+        self.deadline = deadline
+        # Output is captured per task unless a sink is given.
+        self.target = io.StringIO() if output is None else None
+        if output is None:
+            output = OutputSink(self.target, flush_policy="end")
+        self.vm = VM(code, output=output, max_depth=max_depth)
+        self.steps = None
+        self.state = READY
+        self.error = None
+        self.ticks = 0
+        self.slices = 0
+        self.run_time = 0.0
+
+    @property
+    def finished(self):
+        return self.state != READY
+
+    @property
+    def output(self):
+        return self.target.getvalue() if self.target is not None else None
+
+    def run_slice(self, slice_size):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.finish(TIMED_OUT, InterpreterError("Deadline exceeded"))
+            return
+        if self.budget is not None:
+            slice_size = min(slice_size, self.budget - self.ticks)
+            if slice_size <= 0:
+                self.finish(OVER_BUDGET, InterpreterError(f"Budget of {self.budget} steps exceeded"))
+                return
+        start = time.perf_counter()
+        try:
+            if self.steps is None:
+                self.steps = self.vm.run(self.vm.code, None, slice_size)
+                next(self.steps)
+            else:
+                self.steps.send(slice_size)
+            self.ticks += slice_size
+        except StopIteration as stop:
+            self.ticks += slice_size - stop.value
+            self.finish(DONE)
+        except Exception as e:
+            self.finish(FAILED, e)
+        finally:
+            self.run_time += time.perf_counter() - start
+            self.slices += 1
+
+    def cancel(self):
+        if not self.finished:
+            self.finish(CANCELLED, InterpreterError("Cancelled"))
+
+    def finish(self, state, error=None):
+        self.state = state
+        self.error = error
+        if self.steps is not None:
+            self.steps.close()
+        self.vm.output.flush()
+
+    def stats(self):
+        return {'name': self.name, 'state': self.state, 'ticks': self.ticks, 'slices': self.slices,
+                'run_time': self.run_time, 'error': str(self.error) if self.error is not None else None}
+
+    def __str__(self):
+        return f"Task({self.name}, {self.state}, {self.ticks} steps)"
+
+    def __repr__(self):
+        return self.__str__()
+
+class Scheduler:
+    def __init__(self, slice_size=DEFAULT_SLICE_SIZE):
+        self.slice_size = slice_size
+        self.ready = deque()
+
+    def spawn(self, program, name=None, budget=None, timeout=None, deadline=None, output=None,
+              max_depth=DEFAULT_MAX_DEPTH):
+        # program is YAL source, a parsed statement list or compiled bytecode.
+        # budget caps the task's steps, timeout is in seconds from now and
+        # deadline a time.monotonic() value, whichever comes first.
+        if isinstance(program, str):
+            program = parse_source(program)
+        if not isinstance(program, CodeObject):
+            program = compile_program(program)
+        if timeout is not None:
+            expires = time.monotonic() + timeout
+            deadline = expires if deadline is None else min(deadline, expires)
+        task = Task(program, name, budget, deadline, output, max_depth)
+        self.ready.append(task)
+        return task
+
+    def step(self):
+        # Runs one slice of the next ready task. False once no task is left.
+        ready = self.ready
+        while ready:
+            task = ready.popleft()
+            if task.finished:
+                # Cancelled while waiting for its turn.
+                continue
+            task.run_slice(self.slice_size)
+            if not task.finished:
+                ready.append(task)
+            return True
+        return False
+
+    def run(self):
+        while self.step():
+            pass
+
+    async def run_async(self):
+        # Lets the event loop in after every round, so coroutines can spawn,
+        # cancel and watch tasks while they run.
+        while self.ready:
+            for _ in range(len(self.ready)):
+                self.step()
+            await asyncio.sleep(0)
+
+    def __str__(self):
+        return f"Scheduler({len(self.ready)} ready, slice {self.slice_size})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,11 +1,23 @@
-class Statement:
-    pass
+class Node:
+    # Nodes have __slots__ instead of a per-instance __dict__, a large
+    # program has millions of them. line and column are the source position
+    # of the token the node starts at, set by the parser. Every constructor
+    # starts them as None, for nodes built elsewhere (e.g. by the optimizer).
+    # No __getattr__ fallback for that: defining one slows down every
+    # attribute read on every node.
+    __slots__ = ('line', 'column')
 
-class Expression:
-    pass
+class Statement(Node):
+    __slots__ = ()
+
+class Expression(Node):
+    __slots__ = ()
 
 class IfStatement(Statement):
+    __slots__ = ('condition', 'true_statements', 'false_statements')
+
     def __init__(self, condition, true_statements, false_statements):
+        self.line = self.column = None
         self.condition = condition
         self.true_statements = true_statements
         self.false_statements = false_statements
@@ -17,7 +29,10 @@ class IfStatement(Statement):
         return self.__str__()
 
 class WhileStatement(Statement):
+    __slots__ = ('condition', 'statements')
+
     def __init__(self, condition, statements):
+        self.line = self.column = None
         self.condition = condition
         self.statements = statements
 
@@ -28,12 +43,16 @@ class WhileStatement(Statement):
         return self.__str__()
 
 class ForStatement(Statement):
+    __slots__ = ('identifier', 'start', 'condition', 'step', 'statements', 'slot')
+
     def __init__(self, identifier, start, condition, step, statements):
+        self.line = self.column = None
         self.identifier = identifier
         self.start = start
         self.condition = condition
         self.step = step
         self.statements = statements
+        self.slot = None
 
     def __str__(self):
         return f"ForStatement({self.identifier}, {self.start}, {self.condition}, {self.step}, {self.statements})"
@@ -41,20 +60,47 @@ class ForStatement(Statement):
     def __repr__(self):
         return self.__str__()
 
+class ForEachStatement(Statement):
+    # `for (identifier in iterable) { statements }`, see Iteration.py.
+    __slots__ = ('identifier', 'iterable', 'statements', 'slot')
+
+    def __init__(self, identifier, iterable, statements):
+        self.line = self.column = None
+        self.identifier = identifier
+        self.iterable = iterable
+        self.statements = statements
+        self.slot = None
+
+    def __str__(self):
+        return f"ForEachStatement({self.identifier}, {self.iterable}, {self.statements})"
+
+    def __repr__(self):
+        return self.__str__()
+
 class PrintStatement(Statement):
-    def __init__(self, expression):
+    __slots__ = ('expression', 'newline')
+
+    def __init__(self, expression, newline=True):
+        self.line = self.column = None
         self.expression = expression
+        self.newline = newline
 
     def __str__(self):
+        if not self.newline:
+            return f"PrintStatement({self.expression}, newline=False)"
         return f"PrintStatement({self.expression})"
 
     def __repr__(self):
         return self.__str__()
 
 class AssignmentStatement(Statement):
+    __slots__ = ('identifier', 'value', 'slot')
+
     def __init__(self, identifier, value):
+        self.line = self.column = None
         self.identifier = identifier
         self.value = value
+        self.slot = None
 
     def __str__(self):
         return f"AssignmentStatement({self.identifier}, {self.value})"
@@ -63,7 +109,10 @@ class AssignmentStatement(Statement):
         return self.__str__()
 
 class BinaryExpression(Expression):
+    __slots__ = ('left', 'operator', 'right')
+
     def __init__(self, left, operator, right):
+        self.line = self.column = None
         self.left = left
         self.operator = operator
         self.right = right
@@ -75,7 +124,10 @@ class BinaryExpression(Expression):
         return self.__str__()
 
 class UnaryExpression(Expression):
+    __slots__ = ('operator', 'expression')
+
     def __init__(self, operator, expression):
+        self.line = self.column = None
         self.operator = operator
         self.expression = expression
 
@@ -86,7 +138,10 @@ class UnaryExpression(Expression):
         return self.__str__()
 
 class IntegerLiteral(Expression):
+    __slots__ = ('value',)
+
     def __init__(self, value):
+        self.line = self.column = None
         self.value = value
 
     def __str__(self):
@@ -96,8 +151,12 @@ class IntegerLiteral(Expression):
         return self.__str__()
 
 class Identifier(Expression):
+    __slots__ = ('identifier', 'slot')
+
     def __init__(self, identifier):
+        self.line = self.column = None
         self.identifier = identifier
+        self.slot = None
 
     def __str__(self):
         return f"Identifier({self.identifier})"
@@ -106,7 +165,10 @@ class Identifier(Expression):
         return self.__str__()
 
 class StringLiteral(Expression):
+    __slots__ = ('value',)
+
     def __init__(self, value):
+        self.line = self.column = None
         self.value = value
 
     def __str__(self):
@@ -116,10 +178,19 @@ class StringLiteral(Expression):
         return self.__str__()
 
 class FunctionStatement(Statement):
+    __slots__ = ('name', 'parameters', 'body', 'parameter_slots', 'frame_size', 'local_names', 'pure', 'memoize')
+
     def __init__(self, name, parameters, body):
+        self.line = self.column = None
         self.name = name
         self.parameters = parameters
         self.body = body
+        self.parameter_slots = []
+        self.frame_size = 0
+        self.local_names = []
+        # Set by the purity analysis in Memo.py; `# nomemo` in the body clears memoize.
+        self.pure = False
+        self.memoize = True
 
     def __str__(self):
         return f"FunctionStatement({self.name}, {self.parameters}, {self.body})"
@@ -128,7 +199,10 @@ class FunctionStatement(Statement):
         return self.__str__()
 
 class FunctionCall(Expression):
+    __slots__ = ('name', 'arguments')
+
     def __init__(self, name, arguments):
+        self.line = self.column = None
         self.name = name
         self.arguments = arguments
 
@@ -137,3 +211,112 @@ class FunctionCall(Expression):
 
     def __repr__(self):
         return self.__str__()
+
+class ReturnStatement(Statement):
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.line = self.column = None
+        self.value = value
+
+    def __str__(self):
+        return f"ReturnStatement({self.value})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ArrayLiteral(Expression):
+    __slots__ = ('elements',)
+
+    def __init__(self, elements):
+        self.line = self.column = None
+        self.elements = elements
+
+    def append(self, element):
+        self.elements.append(element)
+        return None
+
+    def __str__(self):
+        return f"ArrayLiteral({self.elements})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class MethodCall(Expression):
+    __slots__ = ('object_name', 'method_name', 'arguments', 'slot', 'site')
+
+    def __init__(self, object_name, method_name, arguments):
+        self.line = self.column = None
+        self.object_name = object_name
+        self.method_name = method_name
+        self.arguments = arguments
+        self.slot = None
+        # Inline cache of the engines, see Methods.MethodSite.
+        self.site = None
+
+    def __str__(self):
+        return f"MethodCall({self.object_name}, {self.method_name}, {self.arguments})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class MapLiteral(Expression):
+    # `{k: v, ...}`, the keys and values in source order.
+    __slots__ = ('keys', 'values')
+
+    def __init__(self, keys, values):
+        self.line = self.column = None
+        self.keys = keys
+        self.values = values
+
+    def __str__(self):
+        return f"MapLiteral({self.keys}, {self.values})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class IndexExpression(Expression):
+    # `target[index]`, target is an Identifier or another IndexExpression.
+    __slots__ = ('target', 'index')
+
+    def __init__(self, target, index):
+        self.line = self.column = None
+        self.target = target
+        self.index = index
+
+    def __str__(self):
+        return f"IndexExpression({self.target}, {self.index})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class IndexAssignment(Statement):
+    # `target[index] = value;`
+    __slots__ = ('target', 'index', 'value')
+
+    def __init__(self, target, index, value):
+        self.line = self.column = None
+        self.target = target
+        self.index = index
+        self.value = value
+
+    def __str__(self):
+        return f"IndexAssignment({self.target}, {self.index}, {self.value})"
+
+    def __repr__(self):
+        return self.__str__()
+
+# The attribute names each node class has slots for, base classes first.
+NODE_FIELDS = {}
+
+def node_fields(node):
+    node_type = type(node)
+    fields = NODE_FIELDS.get(node_type)
+    if fields is None:
+        fields = tuple(name for base in reversed(node_type.__mro__) for name in base.__dict__.get('__slots__', ()))
+        NODE_FIELDS[node_type] = fields
+    return fields
+
+def node_values(node):
+    # What vars(node) would have held, with None for fields that aren't set.
+    return [getattr(node, name, None) for name in node_fields(node)]
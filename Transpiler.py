@@ -0,0 +1,472 @@
+import marshal
+
+from Statement import (
+    IfStatement, WhileStatement, ForStatement, ForEachStatement, PrintStatement, AssignmentStatement,
+    BinaryExpression, UnaryExpression, IntegerLiteral, Identifier, StringLiteral, FunctionStatement, FunctionCall,
+    ArrayLiteral, MethodCall, ReturnStatement, MapLiteral, IndexExpression, IndexAssignment
+)
+from ErrorHandler import InterpreterError, nested_too_deeply
+from Resolver import UNSET, child_nodes, left_chain, resolve
+from Output import make_output
+from Methods import MethodSite, invoke, invoke_no_arguments
+from Maps import get_item, set_item, build_map
+from Iteration import iterate
+from Builtins import BUILTINS
+from Rope import STRING_TYPES, concat
+from CallStack import DEFAULT_MAX_DEPTH, DEFAULT_RETURN, TailCall, run_calls, depth_exceeded
+from Bytecode import compile_program
+from VM import VM
+
+# Bump whenever the generated source changes so cached code is regenerated.
+TRANSPILER_VERSION = 8
+
+# How YAL maps onto the generated Python:
+#
+# * A YAL variable x becomes the Python global v_x and a fn f becomes f_f, so
+#   no YAL name can clash with Python keywords, builtins or the runtime
+#   helpers below (YAL names never contain underscores).
+# * Every variable is predeclared to 0, which keeps the "unknown identifiers
+#   read as 0" rule without a lookup per read. Names used as the object of a
+#   method call start as UNSET instead so `x.count()` on a never assigned x
+#   still reports "Object x not defined", and plain reads of those names turn
+#   UNSET back into 0.
+# * A fn that is only ever called, never defined, starts as the builtin of that
+#   name if there is one (see Builtins.py), and as _undefined otherwise.
+# * `for (x in v)` is a Python for loop over _iterate(v).
+# * Top-level code runs inside _main() with its variables declared global.
+# * A fn becomes a def whose locals are the resolver's locals. Locals that
+#   are not parameters start as the global of the same name: only top-level
+#   code can assign globals, so the global cannot change during the call and
+#   this matches the "unassigned local reads the global" rule.
+# * Every other name a def mentions is declared global so a nested def reads
+#   globals instead of closing over the enclosing def's locals.
+# * Calls inside a def are `(yield f_f(...))` and `return f(...)` yields a
+#   _TailCall, which makes every def that calls something a generator run by
+#   CallStack.run_calls, so YAL recursion never uses the Python stack. Calls in
+#   _main hand the callee to _run. A def that calls nothing stays a plain
+#   function and checks the depth itself against _calls, the stack _run uses.
+# * A chain of more than CHAIN_LENGTH operators, `a + b - c ...`, is a flat
+#   tuple of steps through a temporary, `(_t0 := a, _t0 := _add(_t0, b), ...)[-1]`,
+#   instead of one call or parenthesis inside the next: CPython stops parsing
+#   at 200 nested parentheses.
+# * CPython also stops at 100 levels of indentation and 20 nested loops. A
+#   program past any of its limits runs on the VM instead, see compile_python.
+
+def add(left, right):
+    if isinstance(left, STRING_TYPES) or isinstance(right, STRING_TYPES):
+        return concat(left, right)
+    return left + right
+
+def fail(message, *operands):
+    raise InterpreterError(message)
+
+class UndefinedFunction:
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, *arguments):
+        raise InterpreterError(f"Function {self.name} not defined")
+
+    def __repr__(self):
+        return f"UndefinedFunction({self.name})"
+
+def check_arity(function, name, argc):
+    if isinstance(function, UndefinedFunction):
+        raise InterpreterError(f"Function {name} not defined")
+    expected = function.__code__.co_argcount
+    if expected != argc:
+        raise InterpreterError(f"Function {name} expects {expected} arguments but got {argc}")
+    return function
+
+RUNTIME = {
+    '_add': add,
+    '_concat': concat,
+    '_MethodSite': MethodSite,
+    '_invoke': invoke,
+    '_invoke_no_arguments': invoke_no_arguments,
+    '_get_item': get_item,
+    '_set_item': set_item,
+    '_build_map': build_map,
+    '_iterate': iterate,
+    '_BUILTINS': BUILTINS,
+    '_fail': fail,
+    '_undefined': UndefinedFunction,
+    '_check_arity': check_arity,
+    '_UNSET': UNSET,
+    '_TailCall': TailCall,
+    '_depth_exceeded': depth_exceeded,
+}
+
+def python_name(prefix, name):
+    if name.isascii():
+        return prefix + name
+    # Keep non-ASCII names apart from each other after Python's NFKC normalisation.
+    return prefix + "_" + "_".join(f"{ord(character):x}" for character in name)
+
+BINARY_OPERATORS = frozenset(['-', '*', '/', '>', '<', '==', '!=', '>=', '<='])
+
+CHAIN_LENGTH = 16
+
+class Transpiler:
+    def __init__(self):
+        self.lines = []
+        self.variable_names = {}
+        self.object_names = set()
+        self.function_names = {}
+        self.arities = {}
+        self.local_names = None
+        self.sites = []
+        self.temporaries = 0
+
+    def transpile(self, statements):
+        statements = resolve(statements)
+        self.scan(statements)
+        for name in self.function_names:
+            if name in BUILTINS:
+                self.arities.setdefault(name, set()).add(len(BUILTINS[name].parameters))
+        self.emit(0, "# Generated from YAL, see Transpiler.py for how names and scopes map.")
+        for name in self.variable_names:
+            self.emit(0, f"{python_name('v_', name)} = {'_UNSET' if name in self.object_names else '0'}")
+        for name in self.function_names:
+            if name in BUILTINS:
+                self.emit(0, f"{python_name('f_', name)} = _BUILTINS[{name!r}].function")
+            else:
+                self.emit(0, f"{python_name('f_', name)} = _undefined({name!r})")
+        self.emit(0, "_VARIABLES = {" + ", ".join(f"{python_name('v_', name)!r}: {name!r}"
+                                                  for name in self.variable_names) + "}")
+        self.emit(0, "_FUNCTIONS = {" + ", ".join(f"{python_name('f_', name)!r}: {name!r}"
+                                                  for name in self.function_names) + "}")
+        self.emit(0, "")
+        self.emit(0, "def _main():")
+        declared = [python_name('v_', name) for name in self.variable_names]
+        declared += [python_name('f_', name) for name in self.function_names]
+        if declared:
+            self.emit(1, "global " + ", ".join(declared))
+        self.emit_block(statements, 1)
+        self.emit(0, "")
+        # Every method call's inline cache, see Methods.MethodSite.
+        for index, expression in enumerate(self.sites):
+            self.emit(0, f"_site{index} = _MethodSite({expression.object_name!r}, {expression.method_name!r}, "
+                         f"{len(expression.arguments)})")
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def scan(self, statements):
+        stack = list(reversed(statements))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Identifier):
+                self.variable_names[node.identifier] = None
+            elif isinstance(node, (AssignmentStatement, ForStatement, ForEachStatement)):
+                self.variable_names[node.identifier] = None
+            elif isinstance(node, FunctionStatement):
+                self.function_names[node.name] = None
+                self.arities.setdefault(node.name, set()).add(len(node.parameters))
+                for name in node.local_names:
+                    self.variable_names[name] = None
+                stack.extend(reversed(node.body))
+            elif isinstance(node, FunctionCall):
+                self.function_names[node.name] = None
+            elif isinstance(node, MethodCall):
+                self.variable_names[node.object_name] = None
+                self.object_names.add(node.object_name)
+            stack.extend(reversed(child_nodes(node)))
+
+    def emit_block(self, statements, indent):
+        start = len(self.lines)
+        for statement in statements:
+            self.emit_statement(statement, indent)
+        if len(self.lines) == start:
+            self.emit(indent, "pass")
+
+    def emit_statement(self, statement, indent):
+        if isinstance(statement, IfStatement):
+            self.emit(indent, f"if {self.expression(statement.condition)}:")
+            self.emit_block(statement.true_statements, indent + 1)
+            if statement.false_statements:
+                self.emit(indent, "else:")
+                self.emit_block(statement.false_statements, indent + 1)
+        elif isinstance(statement, WhileStatement):
+            self.emit(indent, f"while {self.expression(statement.condition)}:")
+            self.emit_block(statement.statements, indent + 1)
+        elif isinstance(statement, ForStatement):
+            counter = python_name('v_', statement.identifier)
+            self.emit(indent, f"{counter} = {self.expression(statement.start)}")
+            self.emit(indent, f"while {self.expression(statement.condition)}:")
+            for stmt in statement.statements:
+                self.emit_statement(stmt, indent + 1)
+            self.emit(indent + 1, f"{counter} = {self.expression(statement.step)}")
+        elif isinstance(statement, ForEachStatement):
+            variable = python_name('v_', statement.identifier)
+            self.emit(indent, f"for {variable} in _iterate({self.expression(statement.iterable)}):")
+            self.emit_block(statement.statements, indent + 1)
+        elif isinstance(statement, PrintStatement):
+            self.emit(indent, f"_write({self.expression(statement.expression)}, {statement.newline})")
+        elif isinstance(statement, AssignmentStatement):
+            self.emit(indent, f"{python_name('v_', statement.identifier)} = {self.expression(statement.value)}")
+        elif isinstance(statement, FunctionStatement):
+            self.emit_function(statement, indent)
+        elif isinstance(statement, (FunctionCall, MethodCall)):
+            self.emit(indent, self.expression(statement))
+        elif isinstance(statement, IndexAssignment):
+            self.emit(indent, f"_set_item({self.expression(statement.target)}, {self.expression(statement.index)}, "
+                              f"{self.expression(statement.value)})")
+        elif isinstance(statement, ReturnStatement):
+            if isinstance(statement.value, FunctionCall):
+                call = statement.value
+                arguments = "".join(self.expression(argument) + ", " for argument in call.arguments)
+                self.emit(indent, f"yield _TailCall({self.call(call.name, len(call.arguments))}, ({arguments}))")
+            elif statement.value is None:
+                self.emit(indent, f"return {DEFAULT_RETURN!r}")
+            else:
+                self.emit(indent, f"return {self.expression(statement.value)}")
+        else:
+            self.emit(indent, f"_fail({'Unknown statement type: ' + str(type(statement))!r})")
+
+    def emit_function(self, statement, indent):
+        parameters = []
+        renamed = []
+        for index, name in enumerate(statement.parameters):
+            if name in statement.parameters[:index]:
+                # Repeated parameters share a slot and the last argument wins.
+                parameters.append(f"_p{index}")
+                renamed.append((python_name('v_', name), f"_p{index}"))
+            else:
+                parameters.append(python_name('v_', name))
+        self.emit(indent, f"def {python_name('f_', statement.name)}({', '.join(parameters)}):")
+        if not calls_a_fn(statement.body):
+            self.emit(indent + 1, "if len(_calls) >= _MAX_DEPTH: raise _depth_exceeded(_MAX_DEPTH)")
+
+        local_names = set(statement.local_names)
+        mentioned = {}
+        nested = {}
+        collect_mentions(statement.body, mentioned, nested)
+        declared = [python_name('v_', name) for name in mentioned if name not in local_names]
+        declared += [python_name('f_', name) for name in nested]
+        if declared:
+            self.emit(indent + 1, "global " + ", ".join(declared))
+        for target, source in renamed:
+            self.emit(indent + 1, f"{target} = {source}")
+        for name in statement.local_names[len(set(statement.parameters)):]:
+            target = python_name('v_', name)
+            self.emit(indent + 1, f"{target} = _G[{target!r}]")
+
+        enclosing = self.local_names
+        self.local_names = local_names
+        try:
+            self.emit_block(statement.body, indent + 1)
+        finally:
+            self.local_names = enclosing
+        if not (statement.body and isinstance(statement.body[-1], ReturnStatement)):
+            self.emit(indent + 1, f"return {DEFAULT_RETURN!r}")
+
+    def call(self, name, argc):
+        function = python_name('f_', name)
+        if self.arities.get(name) == {argc}:
+            return function
+        return f"_check_arity({function}, {name!r}, {argc})"
+
+    def call_expression(self, expression):
+        arguments = ", ".join(self.expression(argument) for argument in expression.arguments)
+        return f"{self.call(expression.name, len(expression.arguments))}({arguments})"
+
+    def expression(self, expression):
+        if isinstance(expression, (IntegerLiteral, StringLiteral)):
+            return repr(expression.value)
+        elif isinstance(expression, Identifier):
+            name = python_name('v_', expression.identifier)
+            if expression.identifier in self.object_names:
+                return f"(0 if {name} is _UNSET else {name})"
+            return name
+        elif isinstance(expression, ArrayLiteral):
+            return "[" + ", ".join(self.expression(element) for element in expression.elements) + "]"
+        elif isinstance(expression, IndexExpression):
+            return f"_get_item({self.expression(expression.target)}, {self.expression(expression.index)})"
+        elif isinstance(expression, MapLiteral):
+            items = [self.expression(item) for pair in zip(expression.keys, expression.values) for item in pair]
+            return "_build_map([" + ", ".join(items) + "])"
+        elif isinstance(expression, FunctionCall):
+            if self.local_names is None:
+                return f"_run({self.call_expression(expression)})"
+            return f"(yield {self.call_expression(expression)})"
+        elif isinstance(expression, MethodCall):
+            site = f"_site{len(self.sites)}"
+            self.sites.append(expression)
+            obj = python_name('v_', expression.object_name)
+            arguments = "".join(", " + self.expression(argument) for argument in expression.arguments)
+            # _o is read right after the lookup, before any argument can assign the object.
+            method = f"{site}.function if type(_o := {obj}) is {site}.receiver_type else {site}.lookup(_o)"
+            if not arguments:
+                return f"_invoke_no_arguments({site}, {method}, _o)"
+            return f"_invoke({site}, {method}, _o{arguments})"
+        elif isinstance(expression, BinaryExpression):
+            operator = expression.operator
+            if operator == '=':
+                right = self.expression(expression.right)
+                if isinstance(expression.left, Identifier):
+                    return f"({python_name('v_', expression.left.identifier)} := {right})"
+                left = self.expression(expression.left)
+                return f"_fail('Left side of assignment must be an identifier', {left}, {right})"
+            chain = left_chain(expression)
+            if len(chain) > CHAIN_LENGTH:
+                return self.chain(chain)
+            return self.operation(expression, self.expression(expression.left), self.expression(expression.right))
+        elif isinstance(expression, UnaryExpression):
+            value = self.expression(expression.expression)
+            if expression.operator == '-':
+                return f"(-{value})"
+            return f"_fail({'Unknown operator: ' + expression.operator!r}, {value})"
+        return f"_fail({'Unknown expression type: ' + str(type(expression))!r})"
+
+    def operation(self, expression, left, right):
+        operator = expression.operator
+        if operator == '+':
+            if isinstance(expression.left, StringLiteral) or isinstance(expression.right, StringLiteral):
+                return f"_concat({left}, {right})"
+            return f"_add({left}, {right})"
+        if operator in BINARY_OPERATORS:
+            return f"({left} {operator} {right})"
+        return f"_fail({'Unknown operator: ' + operator!r}, {left}, {right})"
+
+    def chain(self, chain):
+        temporary = f"_t{self.temporaries}"
+        self.temporaries += 1
+        steps = [f"{temporary} := {self.expression(chain[0].left)}"]
+        for expression in chain:
+            steps.append(f"{temporary} := {self.operation(expression, temporary, self.expression(expression.right))}")
+        return "(" + ", ".join(steps) + ")[-1]"
+
+def calls_a_fn(statements):
+    # Only a call puts a yield into the def, so a def without one is a plain
+    # function, `return` or not, and has to check the call depth itself.
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FunctionCall):
+            return True
+        stack.extend(child_nodes(node))
+    return False
+
+def collect_mentions(statements, names, functions):
+    # Variable names a fn body mentions, and the fns it defines, stopping at nested fn bodies.
+    stack = list(reversed(statements))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Identifier):
+            names[node.identifier] = None
+        elif isinstance(node, (AssignmentStatement, ForStatement, ForEachStatement)):
+            names[node.identifier] = None
+        elif isinstance(node, FunctionStatement):
+            functions[node.name] = None
+        elif isinstance(node, MethodCall):
+            names[node.object_name] = None
+        stack.extend(reversed(child_nodes(node)))
+
+class PythonCode:
+    # Generated source plus its compiled code object. Pickling goes through
+    # marshal, so cached PythonCode only loads on the Python version that wrote it.
+    # Without a source it holds the statements of a program CPython can't
+    # compile, and PythonInterpreter runs them on the VM.
+    def __init__(self, source, filename="<yal>", statements=None):
+        self.source = source
+        self.filename = filename
+        self.statements = statements
+        self.code = None
+        if source is not None:
+            try:
+                self.code = compile(source, filename, "exec")
+            except (SyntaxError, RecursionError, MemoryError) as e:
+                raise InterpreterError(f"Cannot compile the generated Python: {e}") from e
+
+    def __getstate__(self):
+        return {'source': self.source, 'filename': self.filename, 'statements': self.statements,
+                'code': marshal.dumps(self.code)}
+
+    def __setstate__(self, state):
+        self.source = state['source']
+        self.filename = state['filename']
+        self.statements = state['statements']
+        self.code = marshal.loads(state['code'])
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            if self.source is None:
+                file.write("# Nested too deeply for CPython, this program runs on the VM instead.\n")
+            else:
+                file.write(self.source)
+
+    def __str__(self):
+        if self.source is None:
+            return f"PythonCode({self.filename}, runs on the VM)"
+        return f"PythonCode({self.filename}, {self.source.count(chr(10))} lines)"
+
+    def __repr__(self):
+        return self.__str__()
+
+def transpile(statements):
+    try:
+        return Transpiler().transpile(statements)
+    except RecursionError:
+        raise nested_too_deeply("python engine") from None
+
+def beyond_python(error):
+    # CPython's own limits on nesting, which YAL programs don't share.
+    if isinstance(error, SyntaxError):
+        return error.msg.startswith("too many")
+    return isinstance(error, (RecursionError, MemoryError))
+
+def compile_python(statements, filename="<yal>"):
+    try:
+        return PythonCode(Transpiler().transpile(statements), filename)
+    except RecursionError:
+        pass
+    except InterpreterError as e:
+        if not beyond_python(e.__cause__):
+            raise
+    return PythonCode(None, filename, statements)
+
+class PythonInterpreter:
+    def __init__(self, code, output=None, max_depth=DEFAULT_MAX_DEPTH):
+        self.code = code
+        self.output = make_output(output)
+        self.max_depth = max_depth
+        self.namespace = {}
+        self.vm = None
+
+    def interpret(self):
+        if self.code.code is None:
+            self.vm = VM(compile_program(self.code.statements), self.output, self.max_depth)
+            self.vm.interpret()
+            return
+        namespace = dict(RUNTIME)
+        namespace['_write'] = self.output.write
+        max_depth = self.max_depth
+        calls = []
+        namespace['_calls'] = calls
+        namespace['_MAX_DEPTH'] = max_depth
+        namespace['_run'] = lambda steps: run_calls(steps, max_depth, calls)
+        namespace['_G'] = namespace
+        self.namespace = namespace
+        try:
+            exec(self.code.code, namespace)
+            namespace['_main']()
+        finally:
+            self.output.flush()
+
+    @property
+    def variables(self):
+        if self.vm is not None:
+            return self.vm.variables
+        names = self.namespace.get('_VARIABLES', {})
+        return {name: self.namespace[key] for key, name in names.items() if self.namespace[key] is not UNSET}
+
+    @property
+    def functions(self):
+        if self.vm is not None:
+            return self.vm.functions
+        names = self.namespace.get('_FUNCTIONS', {})
+        return {name: self.namespace[key] for key, name in names.items()
+                if not isinstance(self.namespace[key], UndefinedFunction)
+                and not (name in BUILTINS and self.namespace[key] is BUILTINS[name].function)}
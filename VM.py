@@ -0,0 +1,286 @@
+from ErrorHandler import InterpreterError
+from Resolver import UNSET
+from Output import make_output
+from Rope import STRING_TYPES, concat
+from CallStack import DEFAULT_MAX_DEPTH
+from Maps import set_item, build_map, index_error
+from Iteration import iterate
+from Builtins import Builtin, find_builtin
+from Bytecode import (
+    LOAD_CONST, LOAD_NAME, STORE_NAME, DUP_TOP, POP_TOP, JUMP, POP_JUMP_IF_FALSE,
+    BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV,
+    COMPARE_GT, COMPARE_LT, COMPARE_EQ, COMPARE_NE, COMPARE_GE, COMPARE_LE,
+    UNARY_NEG, BUILD_ARRAY, PRINT, LOAD_METHOD, CALL_METHOD, CALL_METHOD_NOARGS,
+    LOAD_FUNCTION, CALL_FUNCTION, DEFINE_FUNCTION, FAIL, STORE_NAME_KEEP,
+    LOAD_FAST, STORE_FAST, STORE_FAST_KEEP, RETURN_VALUE, TAIL_CALL, JUMP_BACKWARD,
+    BUILD_MAP, LOAD_INDEX, STORE_INDEX, GET_ITER, FOR_ITER, OPERAND_CONST, OPERAND_NAME
+)
+
+DISPATCH_ORDER = (
+    LOAD_NAME, LOAD_FAST, LOAD_CONST, STORE_NAME, STORE_FAST, POP_JUMP_IF_FALSE, JUMP_BACKWARD,
+    BINARY_ADD, COMPARE_LT, BINARY_SUB, BINARY_MUL, BINARY_DIV, COMPARE_GT, COMPARE_EQ,
+    COMPARE_NE, COMPARE_GE, COMPARE_LE, STORE_NAME_KEEP, STORE_FAST_KEEP, DUP_TOP, POP_TOP, PRINT
+)
+
+class VM:
+    def __init__(self, code, output=None, max_depth=DEFAULT_MAX_DEPTH):
+        self.code = code
+        self.variables = {}
+        self.functions = {}
+        self.output = make_output(output)
+        self.max_depth = max_depth
+
+    def interpret(self):
+        try:
+            for _ in self.run(self.code, None):
+                pass
+        finally:
+            self.output.flush()
+
+    def run(self, code_object, frame, slice_size=0):
+        # A generator. With a slice_size it pauses after that many steps (loop
+        # iterations and calls) and resumes with the size of the next slice
+        # sent in, and it returns what is left of the last slice. With 0 it
+        # runs to the end without ever yielding.
+        ticks = slice_size
+        code = code_object.code
+        constants = code_object.constants
+        names = code_object.names
+        local_names = code_object.local_names
+        variables = self.variables
+        functions = self.functions
+        write = self.output.write
+        max_depth = self.max_depth
+        # (code object, pc, frame, stack) of every suspended caller.
+        calls = []
+        # Opcodes are bound as locals so the dispatch chain never touches module globals.
+        (LOAD_NAME_, LOAD_FAST_, LOAD_CONST_, STORE_NAME_, STORE_FAST_, POP_JUMP_IF_FALSE_, JUMP_BACKWARD_,
+         BINARY_ADD_, COMPARE_LT_, BINARY_SUB_, BINARY_MUL_, BINARY_DIV_, COMPARE_GT_, COMPARE_EQ_,
+         COMPARE_NE_, COMPARE_GE_, COMPARE_LE_, STORE_NAME_KEEP_, STORE_FAST_KEEP_, DUP_TOP_, POP_TOP_,
+         PRINT_) = DISPATCH_ORDER
+        BINARY_FIRST = BINARY_ADD
+        BINARY_LAST = COMPARE_LE
+        OPERAND_CONST_ = OPERAND_CONST
+        OPERAND_NAME_ = OPERAND_NAME
+        UNSET_ = UNSET
+        STRING_TYPES_ = STRING_TYPES
+        concat_ = concat
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        end = len(code)
+        while pc < end:
+            opcode = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if BINARY_FIRST <= opcode <= BINARY_LAST:
+                if arg == 0:
+                    right = pop()
+                else:
+                    kind = arg & 3
+                    if kind == OPERAND_CONST_:
+                        right = constants[arg >> 2]
+                    elif kind == OPERAND_NAME_:
+                        right = variables.get(names[arg >> 2], 0)
+                    else:
+                        right = frame[arg >> 2]
+                        if right is UNSET_:
+                            right = variables.get(local_names[arg >> 2], 0)
+                left = stack[-1]
+                if opcode == BINARY_ADD_:
+                    if isinstance(left, STRING_TYPES_) or isinstance(right, STRING_TYPES_):
+                        stack[-1] = concat_(left, right)
+                    else:
+                        stack[-1] = left + right
+                elif opcode == COMPARE_LT_:
+                    stack[-1] = left < right
+                elif opcode == BINARY_SUB_:
+                    stack[-1] = left - right
+                elif opcode == BINARY_MUL_:
+                    stack[-1] = left * right
+                elif opcode == BINARY_DIV_:
+                    stack[-1] = left / right
+                elif opcode == COMPARE_GT_:
+                    stack[-1] = left > right
+                elif opcode == COMPARE_EQ_:
+                    stack[-1] = left == right
+                elif opcode == COMPARE_NE_:
+                    stack[-1] = left != right
+                elif opcode == COMPARE_GE_:
+                    stack[-1] = left >= right
+                else:
+                    stack[-1] = left <= right
+            elif opcode == LOAD_NAME_:
+                push(variables.get(names[arg], 0))
+            elif opcode == LOAD_FAST_:
+                value = frame[arg]
+                if value is UNSET_:
+                    value = variables.get(local_names[arg], 0)
+                push(value)
+            elif opcode == LOAD_CONST_:
+                push(constants[arg])
+            elif opcode == STORE_NAME_:
+                variables[names[arg]] = pop()
+            elif opcode == STORE_FAST_:
+                frame[arg] = pop()
+            elif opcode == POP_JUMP_IF_FALSE_:
+                if not pop():
+                    pc = arg
+            elif opcode == JUMP_BACKWARD_:
+                pc = arg
+                ticks -= 1
+                if ticks == 0:
+                    ticks = (yield) or slice_size
+            elif opcode == STORE_NAME_KEEP_:
+                variables[names[arg]] = stack[-1]
+            elif opcode == STORE_FAST_KEEP_:
+                frame[arg] = stack[-1]
+            elif opcode == DUP_TOP_:
+                push(stack[-1])
+            elif opcode == POP_TOP_:
+                pop()
+            elif opcode == PRINT_:
+                write(pop(), arg == 1)
+            elif opcode == LOAD_INDEX:
+                if arg == 0:
+                    key = pop()
+                else:
+                    kind = arg & 3
+                    if kind == OPERAND_CONST_:
+                        key = constants[arg >> 2]
+                    elif kind == OPERAND_NAME_:
+                        key = variables.get(names[arg >> 2], 0)
+                    else:
+                        key = frame[arg >> 2]
+                        if key is UNSET_:
+                            key = variables.get(local_names[arg >> 2], 0)
+                container = stack[-1]
+                try:
+                    stack[-1] = container[key]
+                except (KeyError, IndexError, TypeError) as e:
+                    raise index_error(container, key, e)
+            elif opcode == STORE_INDEX:
+                value = pop()
+                key = pop()
+                set_item(pop(), key, value)
+            elif opcode == FOR_ITER:
+                value = next(stack[-1], UNSET_)
+                if value is UNSET_:
+                    pop()
+                    pc = arg
+                else:
+                    push(value)
+            elif opcode == GET_ITER:
+                stack[-1] = iter(iterate(stack[-1]))
+            elif opcode == JUMP:
+                pc = arg
+            elif opcode == UNARY_NEG:
+                stack[-1] = -stack[-1]
+            elif opcode == BUILD_ARRAY:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(elements)
+            elif opcode == BUILD_MAP:
+                if arg:
+                    items = stack[-2 * arg:]
+                    del stack[-2 * arg:]
+                else:
+                    items = []
+                push(build_map(items))
+            elif opcode == CALL_METHOD_NOARGS:
+                site, slot = constants[arg]
+                obj = self.load_object(site.object_name, slot, frame)
+                function = site.function if type(obj) is site.receiver_type else site.lookup(obj)
+                try:
+                    push(function(obj))
+                except Exception as e:
+                    raise site.failure(e)
+            elif opcode == LOAD_METHOD:
+                site, slot = constants[arg]
+                obj = self.load_object(site.object_name, slot, frame)
+                push(site.function if type(obj) is site.receiver_type else site.lookup(obj))
+                push(obj)
+            elif opcode == CALL_METHOD:
+                site = constants[arg][0]
+                argc = site.argc
+                if argc:
+                    arguments = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    arguments = ()
+                obj = pop()
+                function = pop()
+                try:
+                    push(function(obj, *arguments))
+                except Exception as e:
+                    raise site.failure(e)
+            elif opcode == LOAD_FUNCTION:
+                name, argc = constants[arg]
+                function = functions.get(name)
+                if function is None:
+                    function = find_builtin(name, argc)
+                elif len(function.parameters) != argc:
+                    raise InterpreterError(f"Function {name} expects {len(function.parameters)} arguments but got {argc}")
+                push(function)
+            elif opcode == CALL_FUNCTION or opcode == TAIL_CALL:
+                function = stack[-arg - 1]
+                if type(function) is Builtin:
+                    # Runs in place, a tail call to one is followed by a RETURN_VALUE.
+                    value = function.call(stack[-arg:] if arg else ())
+                    del stack[-arg - 1:]
+                    push(value)
+                    continue
+                local_frame = [UNSET_] * function.frame_size
+                if arg:
+                    for slot, value in zip(function.parameter_slots, stack[-arg:]):
+                        local_frame[slot] = value
+                del stack[-arg - 1:]
+                if opcode == CALL_FUNCTION:
+                    if len(calls) >= max_depth:
+                        raise InterpreterError(f"Maximum call depth of {max_depth} exceeded")
+                    calls.append((code_object, pc, frame, stack))
+                    stack = []
+                    push = stack.append
+                    pop = stack.pop
+                # A tail call leaves the caller's state where it is and takes over this call's place.
+                code_object = function.code
+                code = code_object.code
+                constants = code_object.constants
+                names = code_object.names
+                local_names = code_object.local_names
+                frame = local_frame
+                pc = 0
+                end = len(code)
+                ticks -= 1
+                if ticks == 0:
+                    ticks = (yield) or slice_size
+            elif opcode == RETURN_VALUE:
+                value = pop()
+                code_object, pc, frame, stack = calls.pop()
+                code = code_object.code
+                constants = code_object.constants
+                names = code_object.names
+                local_names = code_object.local_names
+                end = len(code)
+                push = stack.append
+                pop = stack.pop
+                push(value)
+            elif opcode == DEFINE_FUNCTION:
+                function = constants[arg]
+                functions[function.name] = function
+            elif opcode == FAIL:
+                raise InterpreterError(constants[arg])
+            else:
+                raise InterpreterError(f"Unknown opcode: {opcode}")
+        return ticks
+
+    def load_object(self, object_name, slot, frame):
+        if slot is not None:
+            obj = frame[slot]
+            if obj is not UNSET:
+                return obj
+        return self.variables.get(object_name)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Batch import BatchOptions, BatchRunner, run_script
+
+# Writes `count` small independent scripts to a temporary directory and runs
+# them once in this process, one after another, and then through the process
+# pool with 1, 2, 4, ... workers up to the CPU count. The pool with one worker
+# shows what the pool itself costs, the rest how the batch scales across cores.
+SCRIPT = '''
+total = 0;
+for (i = 0; i < {loops}; i = i + 1) {{
+    if (i > {seed}) {{
+        total = total + i;
+    }}
+}}
+fn fib(n) {{
+    if (n < 2) {{ return n; }}
+    return fib(n - 1) + fib(n - 2);
+}}
+println(total + fib({fib}));
+'''
+
+def write_scripts(directory, count, loops):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"script{index:05}.rpl")
+        with open(path, "w") as file:
+            file.write(SCRIPT.format(loops=loops, seed=index % 100, fib=10 + index % 5))
+        paths.append(path)
+    return paths
+
+def worker_counts():
+    counts = []
+    workers = 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    counts.append(os.cpu_count() or 1)
+    return counts
+
+def report(label, elapsed, count, baseline):
+    print(f"{label:<24} {elapsed:>9.3f}s {count / elapsed:>10,.1f} scripts/sec {baseline / elapsed:>7.2f}x")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    loops = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    engine = sys.argv[3] if len(sys.argv) > 3 else "closure"
+    chunksize = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    directory = tempfile.mkdtemp(prefix="yal-batch-")
+    try:
+        paths = write_scripts(directory, count, loops)
+        # Cache misses would write __yalcache__ files during the timed runs.
+        options = BatchOptions(engine=engine, memo_size=0, use_cache=False)
+        print(f"{count} scripts, {loops} loop iterations each, engine {engine}, chunksize {chunksize}, "
+              f"{os.cpu_count()} CPUs")
+        start = time.perf_counter()
+        for path in paths:
+            result = run_script(path, options)
+            if not result.ok:
+                raise SystemExit(f"{path}: {result.error_type}: {result.error}")
+        sequential = time.perf_counter() - start
+        report("in process", sequential, count, sequential)
+        for workers in worker_counts():
+            summary = BatchRunner(workers, options, chunksize).run(paths)
+            if summary.failed:
+                raise SystemExit(summary.report(5))
+            report(f"pool, {workers} workers", summary.elapsed, count, sequential)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
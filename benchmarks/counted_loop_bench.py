@@ -0,0 +1,76 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+
+# The for loops of Example.rpl scaled up to millions of iterations. Each
+# program runs as written, where the loops take the counted fast path, and
+# with the step `i = i + 1` written as `i = i + one`, which is the same loop
+# but not a counted one, so it takes the general path.
+PROGRAMS = {
+    "for hello": '''
+for (i = 0; i < {n}; i = i + 1) {{
+    println("for hello");
+}}
+''',
+    "sum": '''
+total = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    total = total + i;
+}}
+println(total);
+''',
+    "nested": '''
+total = 0;
+for (i = 0; i < {rows}; i = i + 1) {{
+    for (j = 1000; j > 0; j = j - 1) {{
+        total = total + j;
+    }}
+}}
+println(total);
+''',
+    "in fn": '''
+fn count(n) {{
+    total = 0;
+    for (i = 0; i < n; i = i + 1) {{
+        total = total + i * 2;
+    }}
+    return total;
+}}
+println(count({n}));
+''',
+}
+
+def general(source):
+    return "one = 1; minus = -1;\n" + source.replace("+ 1)", "+ one)").replace("- 1)", "+ minus)")
+
+def best_of(statements, mode, repetitions):
+    best = None
+    for _ in range(repetitions):
+        interpreter = Interpreter(statements, mode=mode, output=io.StringIO())
+        start = time.perf_counter()
+        interpreter.interpret()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{iterations:,} iterations per program, best of {repetitions}")
+    print(f"{'program':<12}{'mode':<9}{'general':>10}{'counted':>10}{'speedup':>9}")
+    for name, template in PROGRAMS.items():
+        source = template.format(n=iterations, rows=iterations // 1000)
+        for mode in Interpreter.MODES:
+            slow = best_of(parse_source(general(source)), mode, repetitions)
+            fast = best_of(parse_source(source), mode, repetitions)
+            print(f"{name:<12}{mode:<9}{slow:>9.3f}s{fast:>9.3f}s{slow / fast:>8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from DaemonClient import DaemonError, ping, run_remote
+
+# Latency of running a tiny script: a cold `python Lexer.py` process, the
+# DaemonClient.py CLI talking to a warm daemon (still a Python process, but
+# one that imports nothing of the interpreter), and run_remote from a process
+# that is already running. Then requests/sec with several clients at once
+# against the daemon's worker pool.
+SCRIPT = '''
+total = 0;
+for (i = 0; i < 10; i = i + 1) {
+    total = total + i;
+}
+println("total " + total);
+'''
+
+def timings(run, count):
+    results = []
+    for _ in range(count):
+        start = time.perf_counter()
+        run()
+        results.append(time.perf_counter() - start)
+    return results
+
+def report(label, results):
+    results = sorted(results)
+    p95 = results[min(len(results) - 1, int(len(results) * 0.95))]
+    print(f"{label:<28}{statistics.median(results) * 1000:>9.2f}ms{p95 * 1000:>9.2f}ms{min(results) * 1000:>9.2f}ms")
+
+def start_daemon(socket_path, workers):
+    daemon = subprocess.Popen([sys.executable, os.path.join(ROOT, "Daemon.py"), "--socket", socket_path,
+                               "--workers", str(workers)], stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + 10
+    while True:
+        try:
+            ping(socket_path)
+            return daemon
+        except DaemonError:
+            if time.perf_counter() > deadline:
+                daemon.kill()
+                raise
+            time.sleep(0.05)
+
+def concurrent(socket_path, clients, requests):
+    def client(_):
+        for _ in range(requests):
+            result = run_remote(path, socket_path=socket_path)
+            assert result['ok'], result
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        list(executor.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+    print(f"{clients:>3} clients x {requests} requests  {elapsed:>8.3f}s {clients * requests / elapsed:>10,.0f} requests/sec")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    global path
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "tiny.rpl")
+    with open(path, "w") as file:
+        file.write(SCRIPT)
+    socket_path = os.path.join(directory, "daemon.sock")
+    daemon = start_daemon(socket_path, workers)
+    try:
+        # Both sides run with a warm __yalcache__ entry for the script.
+        subprocess.run([sys.executable, os.path.join(ROOT, "Lexer.py"), path], check=True, stdout=subprocess.DEVNULL)
+        print(f"{count} runs of a tiny script, daemon with {workers} workers")
+        print(f"{'':<28}{'median':>11}{'p95':>11}{'min':>11}")
+        report("cold python Lexer.py", timings(lambda: subprocess.run(
+            [sys.executable, os.path.join(ROOT, "Lexer.py"), path], check=True, stdout=subprocess.DEVNULL), count))
+        report("python DaemonClient.py", timings(lambda: subprocess.run(
+            [sys.executable, os.path.join(ROOT, "DaemonClient.py"), path, "--socket", socket_path],
+            check=True, stdout=subprocess.DEVNULL), count))
+        report("run_remote in process", timings(lambda: run_remote(path, socket_path=socket_path), count * 10))
+        for clients in (1, workers, workers * 4):
+            concurrent(socket_path, clients, count * 10)
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+if __name__ == "__main__":
+    main()
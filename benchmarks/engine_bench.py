@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+from Transpiler import PythonInterpreter, compile_python
+
+PROGRAMS = {
+    "for_sum": '''
+total = 0;
+for (i = 0; i < 200000; i = i + 1) {
+    total = total + i;
+}
+''',
+    "nested_while": '''
+i = 0;
+hits = 0;
+while (i < 400) {
+    j = 0;
+    while (j < 400) {
+        if (j > i) {
+            hits = hits + 1;
+        }
+        j = j + 1;
+    }
+    i = i + 1;
+}
+''',
+    "calls_in_loop": '''
+fn bump(x) {
+    y = x * 2;
+}
+for (i = 0; i < 50000; i = i + 1) {
+    bump(i);
+}
+''',
+}
+
+def run_tree(statements):
+    Interpreter(statements).interpret()
+
+def run_closure(statements):
+    Interpreter(statements, mode="closure").interpret()
+
+def run_vm(statements):
+    VM(compile_program(statements)).interpret()
+
+def run_python(statements):
+    PythonInterpreter(compile_python(statements)).interpret()
+
+ENGINES = [("tree", run_tree), ("closure", run_closure), ("vm", run_vm), ("python", run_python)]
+
+def measure(run, statements, repetitions):
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        run(statements)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"best of {repetitions}")
+    print(f"{'program':<16}" + "".join(f"{name:>12}" for name, _ in ENGINES) + f"{'closure/tree':>14}")
+    for program_name, source in PROGRAMS.items():
+        statements = parse_source(source)
+        timings = [measure(run, statements, repetitions) for _, run in ENGINES]
+        row = f"{program_name:<16}" + "".join(f"{timing:>11.4f}s" for timing in timings)
+        print(row + f"{timings[0] / timings[1]:>13.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import FileLexer, StreamingLexer
+from lexer_bench import make_source
+
+# Every approach runs in its own process so its peak RSS can be read back
+# with getrusage, measured against the RSS of the process before lexing.
+#   read          file.read() and a token list, what main() does today
+#   read-stream   file.read() but tokens are consumed as they are produced
+#   file          FileLexer over the path, tokens consumed as produced
+APPROACHES = ("read", "read-stream", "file")
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def measure(approach, path, chunk_size):
+    before = peak_rss()
+    start = time.perf_counter()
+    if approach == "read":
+        with open(path, "r") as file:
+            count = len(StreamingLexer(file.read()).tokenize())
+    elif approach == "read-stream":
+        with open(path, "r") as file:
+            count = sum(1 for _ in StreamingLexer(file.read()))
+    else:
+        count = sum(1 for _ in FileLexer(path, chunk_size=chunk_size))
+    elapsed = time.perf_counter() - start
+    print(count, elapsed, before, peak_rss())
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        measure(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1 << 20
+    with tempfile.NamedTemporaryFile("w", suffix=".rpl", delete=False) as file:
+        block = make_source(1_000_000)
+        for _ in range(max(1, size // len(block))):
+            file.write(block)
+        path = file.name
+    try:
+        print(f"source: {os.path.getsize(path):,} bytes, chunk size {chunk_size:,}")
+        print(f"{'approach':<14} {'tokens':>10} {'time':>9} {'tokens/sec':>12} {'peak RSS growth':>16}")
+        for approach in APPROACHES:
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", approach, path,
+                                     str(chunk_size)], capture_output=True, text=True, check=True)
+            count, elapsed, before, after = result.stdout.split()
+            count, elapsed = int(count), float(elapsed)
+            growth = (int(after) - int(before)) / (1 << 20)
+            print(f"{approach:<14} {count:>10,} {elapsed:>8.2f}s {count / elapsed:>12,.0f} {growth:>14.1f}MB")
+    finally:
+        os.unlink(path)
+
+if __name__ == "__main__":
+    main()
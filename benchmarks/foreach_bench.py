@@ -0,0 +1,168 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+from Transpiler import PythonInterpreter, compile_python
+
+# The same loop written three ways: a counter loop reading each element with
+# `get(i)`, the same loop with `[i]`, and `for (x in ...)`. The array and the
+# string are made in Python and handed to the script as globals, so only the
+# loop is timed; the python engine is left out of those, its generated code
+# sets every global itself. The range loops need no data and run in every
+# engine, against a counter loop (the tree and closure engines run that one
+# on their counted fast path) and a while loop. Peak memory of the range
+# loop is measured separately under tracemalloc, for n and for 10n.
+ARRAY = {
+    "get(i)": '''
+total = 0;
+n = items.count();
+for (i = 0; i < n; i = i + 1) {
+    total = total + items.get(i);
+}
+println(total);
+''',
+    "[i]": '''
+total = 0;
+n = items.count();
+for (i = 0; i < n; i = i + 1) {
+    total = total + items[i];
+}
+println(total);
+''',
+    "for-each": '''
+total = 0;
+for (x in items) {
+    total = total + x;
+}
+println(total);
+''',
+}
+
+STRING = {
+    "get(i)": None,
+    "[i]": '''
+hits = 0;
+n = text.count();
+for (i = 0; i < n; i = i + 1) {
+    if (text[i] == "a") {
+        hits = hits + 1;
+    }
+}
+println(hits);
+''',
+    "for-each": '''
+hits = 0;
+for (c in text) {
+    if (c == "a") {
+        hits = hits + 1;
+    }
+}
+println(hits);
+''',
+}
+
+RANGE = {
+    "while": '''
+total = 0;
+i = 0;
+while (i < {n}) {{
+    total = total + i;
+    i = i + 1;
+}}
+println(total);
+''',
+    "counter": '''
+total = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    total = total + i;
+}}
+println(total);
+''',
+    "for-each": '''
+total = 0;
+for (i in range(0, {n})) {{
+    total = total + i;
+}}
+println(total);
+''',
+}
+
+def run_tree(statements, variables, output):
+    interpreter = Interpreter(statements, output=output)
+    interpreter.variables.update(variables)
+    interpreter.interpret()
+
+def run_closure(statements, variables, output):
+    interpreter = Interpreter(statements, mode="closure", output=output)
+    interpreter.variables.update(variables)
+    interpreter.interpret()
+
+def run_vm(statements, variables, output):
+    vm = VM(compile_program(statements), output=output)
+    vm.variables.update(variables)
+    vm.interpret()
+
+def run_python(statements, variables, output):
+    PythonInterpreter(compile_python(statements), output=output).interpret()
+
+ENGINES = [("tree", run_tree), ("closure", run_closure), ("vm", run_vm), ("python", run_python)]
+
+def best_of(run, statements, variables, repetitions):
+    best = None
+    for _ in range(repetitions):
+        output = io.StringIO()
+        start = time.perf_counter()
+        run(statements, variables, output)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, output.getvalue()
+
+def peak(run, source):
+    statements = parse_source(source)
+    tracemalloc.start()
+    run(statements, {}, io.StringIO())
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+def compare(title, programs, engines, variables, expected, repetitions):
+    names = [name for name, source in programs.items() if source is not None]
+    print(title)
+    print(f"  {'engine':<9}" + "".join(f"{name:>11}" for name in names) + f"{'speedup':>10}")
+    for engine, run in engines:
+        times = []
+        for name in names:
+            elapsed, output = best_of(run, parse_source(programs[name]), variables, repetitions)
+            assert output == expected, (engine, name, output)
+            times.append(elapsed)
+        # for-each against the fastest of the other ways.
+        print(f"  {engine:<9}" + "".join(f"{elapsed:>10.3f}s" for elapsed in times)
+              + f"{min(times[:-1]) / times[-1]:>9.2f}x")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{n:,} iterations per loop, best of {repetitions}")
+    items = list(range(n))
+    text = "abc" * (n // 3)
+    compare("array", ARRAY, ENGINES[:3], {'items': items}, f"{sum(items)}\n", repetitions)
+    compare("string", STRING, ENGINES[:3], {'text': text}, f"{text.count('a')}\n", repetitions)
+    ranges = {name: source.format(n=n) for name, source in RANGE.items()}
+    compare("range", ranges, ENGINES, {}, f"{sum(range(n))}\n", repetitions)
+    print("range loop peak memory")
+    for engine, run in ENGINES:
+        small = peak(run, RANGE["for-each"].format(n=n))
+        large = peak(run, RANGE["for-each"].format(n=n * 10))
+        print(f"  {engine:<9}{small / 1024:>9.1f}KB for {n:,}{large / 1024:>9.1f}KB for {n * 10:,}")
+
+if __name__ == "__main__":
+    main()
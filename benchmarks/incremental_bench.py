@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Incremental import IncrementalParser
+
+# A large file made of many fns, where each edit changes one fn body, the way
+# a script is edited between --watch runs.
+BLOCK = '''
+fn step{name}(a, b) {{
+    total = a + b;
+    for (i = 0; i < 10; i = i + 1) {{
+        if (i >= 5) {{
+            total = total + 1;
+        }} else {{
+            total = total + i * 2;
+        }}
+    }}
+}}
+step{name}(1, 2);
+'''
+
+def make_source(target_bytes):
+    blocks = []
+    size = 0
+    index = 0
+    while size < target_bytes:
+        name = "".join(chr(ord("a") + int(digit)) for digit in str(index))
+        block = BLOCK.format(name=name)
+        blocks.append(block)
+        size += len(block)
+        index += 1
+    return "".join(blocks)
+
+def edit(source, count):
+    # Changes the constant in the middle fn, a different value on every edit.
+    middle = source.find("total = a + b;", len(source) // 2)
+    return source[:middle] + f"total = a + b + {count};" + source[middle + len("total = a + b;"):]
+
+def best_of(run, repetitions):
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    source = make_source(size)
+    print(f"source: {len(source):,} bytes, best of {repetitions}")
+
+    parser = IncrementalParser()
+    parser.parse(source)
+    edits = [edit(source, count) for count in range(repetitions + 1)]
+    if str(parser.parse(edits[0])) != str(parse_source(edits[0])):
+        raise SystemExit("incremental and full parse differ")
+
+    full = best_of(lambda: parse_source(source), repetitions)
+    pending = iter(edits[1:])
+    incremental = best_of(lambda: parser.parse(next(pending)), repetitions)
+    print(f"{'full lex + parse':<24} {full * 1000:10.2f}ms")
+    print(f"{'incremental update':<24} {incremental * 1000:10.2f}ms  ({parser.last_update})")
+    print(f"speedup: {full / incremental:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import Lexer, StreamingLexer
+
+SNIPPET = '''
+# generated block
+total = 0;
+for (i = 0; i < 10; i = i + 1) {
+    if (i >= 5) {
+        println("big " + i);
+    } else {
+        total = total + i * 2;
+    }
+}
+fn greet(name, times) {
+    println("hello " + name);
+}
+greet("world", 3);
+myArray = [1, 2, 3, 4];
+println(myArray.count());
+'''
+
+def make_source(target_bytes):
+    repeats = max(1, target_bytes // len(SNIPPET))
+    return SNIPPET * repeats
+
+def measure(label, run, repetitions):
+    best = None
+    count = 0
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        count = run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print(f"{label:<28} {count:>9} tokens  {best:8.4f}s  {count / best:>12,.0f} tokens/sec")
+    return best
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    source = make_source(size)
+    print(f"source: {len(source):,} bytes, best of {repetitions}")
+
+    reference = [(t.type, t.value) for t in Lexer(source).tokenize()]
+    streamed = [(t.type, t.value) for t in StreamingLexer(source)]
+    if reference != streamed:
+        raise SystemExit("token streams differ")
+
+    def run_lexer():
+        return len(Lexer(source).tokenize())
+
+    def run_lexer_logging():
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+            return len(Lexer(source, debug=True).tokenize())
+
+    def run_streaming():
+        return len(StreamingLexer(source).tokenize())
+
+    logging_time = measure("Lexer (token logging)", run_lexer_logging, repetitions)
+    lexer_time = measure("Lexer", run_lexer, repetitions)
+    streaming_time = measure("StreamingLexer", run_streaming, repetitions)
+    print(f"speedup: {lexer_time / streaming_time:.1f}x over Lexer, "
+          f"{logging_time / streaming_time:.1f}x over Lexer with logging")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+
+# Time per lookup of a string key among n entries: a map read `table[key]`
+# against the linear scan scripts had to write before maps, a while loop
+# over an array of keys next to an array of values. The keys, values, map
+# and queries are made in Python and handed to the script as globals, so
+# only the lookups are timed. Queries are spread evenly over the entries, a
+# scan walks half the array on average. The python engine is left out, its
+# generated code sets every global itself.
+SCAN = '''
+fn find(names, values, key) {
+    i = 0;
+    n = names.count();
+    while (i < n) {
+        if (names.get(i) == key) {
+            return values.get(i);
+        }
+        i = i + 1;
+    }
+    return 0;
+}
+total = 0;
+count = queries.count();
+for (q = 0; q < count; q = q + 1) {
+    total = total + find(names, values, queries.get(q));
+}
+println(total);
+'''
+
+KEYED = '''
+total = 0;
+count = queries.count();
+for (q = 0; q < count; q = q + 1) {
+    total = total + table[queries[q]];
+}
+println(total);
+'''
+
+def run_tree(source, variables, output):
+    interpreter = Interpreter(parse_source(source), output=output)
+    interpreter.variables.update(variables)
+    interpreter.interpret()
+
+def run_closure(source, variables, output):
+    interpreter = Interpreter(parse_source(source), mode="closure", output=output)
+    interpreter.variables.update(variables)
+    interpreter.interpret()
+
+def run_vm(source, variables, output):
+    vm = VM(compile_program(parse_source(source)), output=output)
+    vm.variables.update(variables)
+    vm.interpret()
+
+ENGINES = [("tree", run_tree), ("closure", run_closure), ("vm", run_vm)]
+
+def queries_for(names, count):
+    stride = max(1, len(names) // count)
+    return [names[(index * stride + stride // 2) % len(names)] for index in range(count)]
+
+def best_of(run, source, variables, repetitions):
+    best = None
+    for _ in range(repetitions):
+        output = io.StringIO()
+        start = time.perf_counter()
+        run(source, variables, output)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, output
+
+def main():
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000, 1_000_000]
+    scans = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    lookups = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    repetitions = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    print(f"{scans} scan lookups and {lookups:,} map lookups per run, best of {repetitions}")
+    print(f"{'entries':>10}  {'engine':<9}{'scan':>14}{'map':>14}{'speedup':>12}")
+    for size in sizes:
+        names = [f"key{index}" for index in range(size)]
+        values = list(range(size))
+        table = dict(zip(names, values))
+        for engine, run in ENGINES:
+            scan_queries = queries_for(names, scans)
+            map_queries = queries_for(names, lookups)
+            scan_time, scan_output = best_of(run, SCAN, {'names': names, 'values': values,
+                                                         'queries': scan_queries}, repetitions)
+            map_time, map_output = best_of(run, KEYED, {'table': table, 'queries': map_queries}, repetitions)
+            # Both answer with the sum of the values they found.
+            assert scan_output.getvalue() == f"{sum(table[key] for key in scan_queries)}\n"
+            assert map_output.getvalue() == f"{sum(table[key] for key in map_queries)}\n"
+            scan_each = scan_time / scans
+            map_each = map_time / lookups
+            print(f"{size:>10,}  {engine:<9}{scan_each * 1e6:>12,.1f}us{map_each * 1e6:>12.3f}us"
+                  f"{scan_each / map_each:>11,.0f}x")
+
+if __name__ == "__main__":
+    main()
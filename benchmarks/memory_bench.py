@@ -0,0 +1,59 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import tokenize, buffer_tokens
+from Ast import Parser
+from Statement import Node, node_values
+from lexer_bench import make_source
+
+# Memory held by the tokens of a large generated program, as a list of Token
+# objects and packed into a TokenBuffer, and by the AST parsed from them.
+# tracemalloc counts every block allocated while a step runs that is still
+# alive when it ends, so the numbers include the token values and the lists
+# holding the nodes, not just the objects themselves.
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+def count_nodes(statements):
+    count = 0
+    pending = list(statements)
+    while pending:
+        value = pending.pop()
+        if isinstance(value, Node):
+            count += 1
+            pending.extend(node_values(value))
+        elif isinstance(value, list):
+            pending.extend(value)
+    return count
+
+def report(label, count, unit, current, peak, elapsed):
+    print(f"{label:<16} {count:>10,} {unit:<7} {current / 1024 / 1024:>9.1f}MB held {current / count:>8.1f} bytes/{unit[:-1]} "
+          f"{peak / 1024 / 1024:>9.1f}MB peak {elapsed:>8.3f}s")
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    source = make_source(size)
+    print(f"{len(source):,} bytes of source, times are under tracemalloc")
+    tokens, current, peak, elapsed = traced(lambda: tokenize(source))
+    report("token list", len(tokens), "tokens", current, peak, elapsed)
+    buffer, current, peak, elapsed = traced(lambda: buffer_tokens(source))
+    report("token buffer", len(buffer), "tokens", current, peak, elapsed)
+    del buffer
+    statements, current, peak, elapsed = traced(lambda: Parser(tokens).parse())
+    report("AST", count_nodes(statements), "nodes", current, peak, elapsed)
+
+if __name__ == "__main__":
+    main()
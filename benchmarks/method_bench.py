@@ -0,0 +1,102 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+from Transpiler import PythonInterpreter, compile_python
+
+# Method calls per second, one call per loop iteration, in every engine. Each
+# call site sees one receiver type except in "two types", where the site in
+# size() gets an array and a string in turns, so its inline cache misses on
+# every call and it looks the method up again each time.
+PROGRAMS = {
+    "count": '''
+items = [1, 2, 3];
+total = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    total = total + items.count();
+}}
+println(total);
+''',
+    "get": '''
+items = [1, 2, 3];
+total = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    total = total + items.get(1);
+}}
+println(total);
+''',
+    "string": '''
+text = "yet another language";
+hits = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    hits = hits + text.startswith("yet");
+}}
+println(hits);
+''',
+    "numeric sum": '''
+items = [1, 2, 3, 4];
+nums = items.numeric();
+total = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    total = total + nums.sum();
+}}
+println(total);
+''',
+    "two types": '''
+fn size(x) {{
+    return x.count();
+}}
+items = [1, 2, 3];
+text = "abc";
+total = 0;
+for (i = 0; i < {half}; i = i + 1) {{
+    total = total + size(items) + size(text);
+}}
+println(total);
+''',
+}
+
+def run_tree(source):
+    Interpreter(parse_source(source), output=io.StringIO()).interpret()
+
+def run_closure(source):
+    Interpreter(parse_source(source), mode="closure", output=io.StringIO()).interpret()
+
+def run_vm(source):
+    VM(compile_program(parse_source(source)), output=io.StringIO()).interpret()
+
+def run_python(source):
+    PythonInterpreter(compile_python(parse_source(source)), output=io.StringIO()).interpret()
+
+ENGINES = [("tree", run_tree), ("closure", run_closure), ("vm", run_vm), ("python", run_python)]
+
+def best_of(run, source, repetitions):
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        run(source)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{calls:,} method calls per program, best of {repetitions}")
+    print(f"{'program':<13}{'engine':<9}{'time':>9}{'calls/sec':>14}")
+    for name, template in PROGRAMS.items():
+        source = template.format(n=calls, half=calls // 2)
+        for engine, run in ENGINES:
+            elapsed = best_of(run, source, repetitions)
+            print(f"{name:<13}{engine:<9}{elapsed:>8.3f}s{calls / elapsed:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
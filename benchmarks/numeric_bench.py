@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+from NumericArray import NumericArray, numpy
+
+SIZE = 20000
+
+# Each workload is written twice: once as the YAL loop a script would need
+# without numeric arrays, once with the bulk method or element-wise operator.
+# `nums` is handed to the interpreter up front so only the workload is timed.
+VALUES = [n % 97 for n in range(SIZE)]
+
+WORKLOADS = {
+    "sum": (f'''
+total = 0;
+for (i = 0; i < {SIZE}; i = i + 1) {{
+    total = total + nums.get(i);
+}}
+''', '''
+total = nums.sum();
+'''),
+    "scale": (f'''
+out = [];
+for (i = 0; i < {SIZE}; i = i + 1) {{
+    out.append(nums.get(i) * 3);
+}}
+''', '''
+out = nums * 3;
+'''),
+    "max": (f'''
+best = 0;
+for (i = 0; i < {SIZE}; i = i + 1) {{
+    if (nums.get(i) > best) {{
+        best = nums.get(i);
+    }}
+}}
+''', '''
+best = nums.max();
+'''),
+}
+
+def measure(statements, repetitions):
+    best = None
+    for _ in range(repetitions):
+        interpreter = Interpreter(statements, mode="closure")
+        interpreter.variables['nums'] = NumericArray(VALUES)
+        start = time.perf_counter()
+        interpreter.interpret()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"best of {repetitions}, {SIZE} elements, backend: {'numpy' if numpy is not None else 'array'}")
+    print(f"{'workload':<12}{'loop':>12}{'numeric':>12}{'speedup':>10}")
+    for name, (loop_source, bulk_source) in WORKLOADS.items():
+        loop = measure(parse_source(loop_source), repetitions)
+        bulk = measure(parse_source(bulk_source), repetitions)
+        print(f"{name:<12}{loop:>11.4f}s{bulk:>11.4f}s{loop / bulk:>9.0f}x")
+
+if __name__ == "__main__":
+    main()
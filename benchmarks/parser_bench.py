@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import tokenize
+from Ast import Parser
+from lexer_bench import make_source
+
+# Wide inputs are many ordinary statements; deep ones nest a single construct
+# until the source is the requested size. The deep inputs are parsed with a
+# tiny recursion limit, which only works because the parser keeps its nesting
+# on explicit stacks.
+RECURSION_LIMIT = 100
+
+def deep_sources(depth):
+    return {
+        "nested if/else": "if (x < 1) { " * depth + "y = 1;" + " } else { y = 2; }" * depth,
+        "nested while": "while (x) { " * depth + "x = x - 1;" + " }" * depth,
+        "nested fn": "fn f(a) { " * depth + "a = a + 1;" + " }" * depth,
+        "nested arrays": "x = " + "[1, " * depth + "2" + "]" * depth + ";",
+        "nested parens": "x = " + "(1 + " * depth + "2" + ")" * depth + ";",
+        "method arguments": "x = " + "a.get(" * depth + "1" + ")" * depth + ";",
+        "operator chain": "x = " + " + ".join(["1 * 2"] * depth) + ";",
+        "assignment chain": "x = " + "a = " * depth + "1;",
+        "prefix chain": "x = " + "-" * depth + "1;",
+    }
+
+def best_of(run, repetitions):
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def report(label, tokens, repetitions, recursion_limit=None):
+    limit = sys.getrecursionlimit()
+    if recursion_limit is not None:
+        sys.setrecursionlimit(recursion_limit)
+    try:
+        elapsed = best_of(lambda: Parser(tokens).parse(), repetitions)
+    finally:
+        sys.setrecursionlimit(limit)
+    print(f"{label:<20} {len(tokens):>10,} tokens {elapsed * 1000:>10.2f}ms {len(tokens) / elapsed:>14,.0f} tokens/sec")
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 50_000
+    print(f"best of {repetitions}; deep inputs nest {depth:,} levels under recursion limit {RECURSION_LIMIT}")
+    report("wide", tokenize(make_source(size)), repetitions)
+    for label, source in deep_sources(depth).items():
+        report(label, tokenize(source), repetitions, RECURSION_LIMIT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+from Transpiler import PythonInterpreter, compile_python
+
+# Every program runs under a tiny Python recursion limit, which only works
+# because YAL calls keep their frames on an explicit stack (see CallStack.py).
+# Memoization is off so fib and ackermann really make every call.
+RECURSION_LIMIT = 100
+
+PROGRAMS = {
+    "fib(20)": '''
+fn fib(n) {
+    if (n < 2) { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+println(fib(20));
+''',
+    "ackermann(2, 300)": '''
+fn ack(m, n) {
+    if (m == 0) { return n + 1; }
+    if (n == 0) { return ack(m - 1, 1); }
+    return ack(m - 1, ack(m, n - 1));
+}
+println(ack(2, 300));
+''',
+    "depth(100000)": '''
+fn depth(n) {
+    if (n == 0) { return 0; }
+    return 1 + depth(n - 1);
+}
+println(depth(100000));
+''',
+    "tail sum(100000)": '''
+fn sum(n, acc) {
+    if (n == 0) { return acc; }
+    return sum(n - 1, acc + n);
+}
+println(sum(100000, 0));
+''',
+}
+
+def run_tree(statements):
+    Interpreter(statements, output=io.StringIO(), memo_size=0).interpret()
+
+def run_closure(statements):
+    Interpreter(statements, mode="closure", output=io.StringIO(), memo_size=0).interpret()
+
+def run_vm(statements):
+    VM(compile_program(statements), output=io.StringIO()).interpret()
+
+def run_python(statements):
+    PythonInterpreter(compile_python(statements), output=io.StringIO()).interpret()
+
+ENGINES = [("tree", run_tree), ("closure", run_closure), ("vm", run_vm), ("python", run_python)]
+
+def measure(run, statements, repetitions):
+    best = None
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    try:
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            run(statements)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    finally:
+        sys.setrecursionlimit(limit)
+    return best
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"best of {repetitions}, recursion limit {RECURSION_LIMIT}")
+    print(f"{'program':<20}" + "".join(f"{name:>12}" for name, _ in ENGINES))
+    for program_name, source in PROGRAMS.items():
+        statements = parse_source(source)
+        timings = [measure(run, statements, repetitions) for _, run in ENGINES]
+        print(f"{program_name:<20}" + "".join(f"{timing:>11.4f}s" for timing in timings))
+
+if __name__ == "__main__":
+    main()
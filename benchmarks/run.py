@@ -0,0 +1,167 @@
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import tokenize, parse
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+from Transpiler import PythonInterpreter, compile_python
+from Output import OutputSink
+
+PROGRAMS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+
+# The "generated" workload repeats this block until the source reaches
+# --generated-size bytes, so lexer and parser throughput can be measured on a
+# large file without keeping one in the repo.
+GENERATED_BLOCK = '''
+# generated block
+total = 0;
+for (i = 0; i < 10; i = i + 1) {
+    if (i >= 5) {
+        total = total + 1;
+    } else {
+        total = total + i * 2;
+    }
+}
+fn greet(name, times) {
+    message = "hello " + name;
+}
+greet("world", 3);
+myArray = [1, 2, 3, 4];
+size = myArray.count();
+'''
+
+def load_workloads(generated_size):
+    workloads = {}
+    for path in sorted(glob.glob(os.path.join(PROGRAMS_DIRECTORY, "*.rpl"))):
+        with open(path, "r") as file:
+            workloads[os.path.splitext(os.path.basename(path))[0]] = file.read()
+    workloads["generated"] = GENERATED_BLOCK * max(1, generated_size // len(GENERATED_BLOCK))
+    return workloads
+
+def summarize(samples):
+    return {
+        'mean': statistics.mean(samples),
+        'median': statistics.median(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'min': min(samples),
+        'samples': samples,
+    }
+
+def run_once(source, engine):
+    timings = {}
+    start = time.perf_counter()
+    tokens = tokenize(source)
+    timings['tokenize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    statements = parse(tokens)
+    timings['parse'] = time.perf_counter() - start
+
+    output = OutputSink(io.StringIO(), flush_policy="end")
+    if engine == "vm":
+        start = time.perf_counter()
+        code = compile_program(statements)
+        timings['compile'] = time.perf_counter() - start
+        interpreter = VM(code, output=output)
+    elif engine == "python":
+        start = time.perf_counter()
+        code = compile_python(statements)
+        timings['compile'] = time.perf_counter() - start
+        interpreter = PythonInterpreter(code, output=output)
+    else:
+        interpreter = Interpreter(statements, mode=engine, output=output)
+    start = time.perf_counter()
+    interpreter.interpret()
+    timings['interpret'] = time.perf_counter() - start
+    return timings
+
+def run_workload(source, engine, warmup, repetitions):
+    for _ in range(warmup):
+        run_once(source, engine)
+    samples = {}
+    for _ in range(repetitions):
+        for phase, elapsed in run_once(source, engine).items():
+            samples.setdefault(phase, []).append(elapsed)
+    return {phase: summarize(values) for phase, values in samples.items()}
+
+def print_results(results):
+    print(f"{'workload':<12} {'phase':<10} {'mean':>10} {'median':>10} {'stdev':>10}")
+    for name, phases in results.items():
+        for phase, summary in phases.items():
+            print(f"{name:<12} {phase:<10} {summary['mean'] * 1000:>8.2f}ms {summary['median'] * 1000:>8.2f}ms "
+                  f"{summary['stdev'] * 1000:>8.2f}ms")
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, "r") as file:
+        report = json.load(file)
+    baseline = report['results']
+    print(f"\ncompared with {baseline_path}, engine {report['metadata']['engine']} (median, <1.00x is faster)")
+    print(f"{'workload':<12} {'phase':<10} {'before':>10} {'after':>10} {'ratio':>8}")
+    for name, phases in results.items():
+        for phase, summary in phases.items():
+            before = baseline.get(name, {}).get(phase)
+            if before is None:
+                continue
+            ratio = summary['median'] / before['median'] if before['median'] else float('inf')
+            print(f"{name:<12} {phase:<10} {before['median'] * 1000:>8.2f}ms {summary['median'] * 1000:>8.2f}ms "
+                  f"{ratio:>7.2f}x")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Time tokenize, parse and interpret on the benchmark programs")
+    arg_parser.add_argument("workloads", nargs="*",
+                            help="names of the workloads to run (default: all programs plus generated)")
+    arg_parser.add_argument("--engine", choices=["tree", "closure", "vm", "python"], default="tree")
+    arg_parser.add_argument("--warmup", type=int, default=1, help="untimed runs before measuring")
+    arg_parser.add_argument("--repetitions", type=int, default=5, help="timed runs per workload")
+    arg_parser.add_argument("--generated-size", type=int, default=500_000,
+                            help="size in bytes of the generated source")
+    arg_parser.add_argument("--json", metavar="PATH", help="write the results as JSON to PATH")
+    arg_parser.add_argument("--compare", metavar="PATH", help="compare with the JSON of an earlier run")
+    args = arg_parser.parse_args()
+    if args.repetitions < 1:
+        arg_parser.error("--repetitions must be at least 1")
+
+    workloads = load_workloads(args.generated_size)
+    if args.workloads:
+        unknown = [name for name in args.workloads if name not in workloads]
+        if unknown:
+            arg_parser.error(f"unknown workloads: {', '.join(unknown)} (available: {', '.join(workloads)})")
+        workloads = {name: workloads[name] for name in args.workloads}
+
+    print(f"engine {args.engine}, {args.warmup} warmup, {args.repetitions} repetitions")
+    results = {}
+    for name, source in workloads.items():
+        results[name] = run_workload(source, args.engine, args.warmup, args.repetitions)
+    print_results(results)
+
+    if args.json:
+        report = {
+            'metadata': {
+                'engine': args.engine,
+                'warmup': args.warmup,
+                'repetitions': args.repetitions,
+                'generated_size': args.generated_size,
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            'results': results,
+        }
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Lexer import parse_source
+from Bytecode import compile_program
+from VM import VM
+from Scheduler import Scheduler
+
+# Throughput: the same finite programs run one after another on plain VMs and
+# then all at once as scheduler tasks, so the difference is what time slicing
+# costs. Fairness: spinning tasks, some with much heavier loop bodies, share
+# the scheduler until their common deadline. Jain's index is 1.0 when every
+# task got the same share: slices are counted in steps, so steps come out even
+# and CPU time follows how much work a task does per step.
+FINITE = '''
+total = 0;
+for (i = 0; i < {loops}; i = i + 1) {{
+    total = total + i * 2;
+}}
+'''
+
+SPINNERS = {
+    "light": "x = 0; while (1) { x = x + 1; }",
+    "heavy": "x = 0; while (1) { y = [x, x + 1, x * 2, x / 3, x - 4]; x = x + 1; }",
+    "calls": "fn spin(n) { return spin(n + 1); } spin(0);",
+}
+
+def jain(values):
+    total = sum(values)
+    return total * total / (len(values) * sum(value * value for value in values)) if total else 1.0
+
+def throughput(count, loops, slice_size):
+    code = compile_program(parse_source(FINITE.format(loops=loops)))
+    start = time.perf_counter()
+    for _ in range(count):
+        VM(code, output=io.StringIO()).interpret()
+    sequential = time.perf_counter() - start
+
+    scheduler = Scheduler(slice_size)
+    tasks = [scheduler.spawn(code) for _ in range(count)]
+    start = time.perf_counter()
+    scheduler.run()
+    scheduled = time.perf_counter() - start
+    steps = sum(task.ticks for task in tasks)
+    slices = sum(task.slices for task in tasks)
+    print(f"{count:,} tasks x {loops:,} loop iterations, slice {slice_size}")
+    print(f"  one after another  {sequential:>8.3f}s {steps / sequential:>14,.0f} steps/sec")
+    print(f"  scheduled          {scheduled:>8.3f}s {steps / scheduled:>14,.0f} steps/sec "
+          f"({slices:,} slices, {scheduled / sequential - 1:+.1%})")
+
+def fairness(count, seconds, slice_size):
+    scheduler = Scheduler(slice_size)
+    codes = {name: compile_program(parse_source(source)) for name, source in SPINNERS.items()}
+    names = list(codes)
+    tasks = []
+    for index in range(count):
+        name = names[index % len(names)]
+        tasks.append(scheduler.spawn(codes[name], name=name, timeout=seconds))
+    start = time.perf_counter()
+    scheduler.run()
+    elapsed = time.perf_counter() - start
+    run_times = [task.run_time for task in tasks]
+    turns = [task.slices for task in tasks]
+    print(f"{count:,} spinning tasks for {seconds}s, slice {slice_size}: {elapsed:.3f}s, "
+          f"{sum(turns) / elapsed:,.0f} slices/sec")
+    print(f"  turns per task     min {min(turns):,} max {max(turns):,}, "
+          f"Jain index over steps {jain([task.ticks for task in tasks]):.3f}")
+    print(f"  cpu time per task  min {min(run_times) * 1000:.2f}ms median {statistics.median(run_times) * 1000:.2f}ms "
+          f"max {max(run_times) * 1000:.2f}ms, Jain index {jain(run_times):.3f}")
+    for name in names:
+        group = [task for task in tasks if task.name == name]
+        print(f"  {name:<6} {statistics.mean(task.ticks for task in group):>12,.0f} steps "
+              f"{statistics.mean(task.run_time for task in group) * 1000:>8.2f}ms per task")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    loops = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    slice_size = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 3.0
+    throughput(count, loops, slice_size)
+    fairness(count, seconds, slice_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Rope
+from Lexer import parse_source
+from Ast import Interpreter
+from Bytecode import compile_program
+from VM import VM
+from Transpiler import PythonInterpreter, compile_python
+
+# Loops that build one long string with `s = s + ...`, run with ropes and
+# again with Rope.ROPE_MIN_LENGTH out of reach, which is plain str
+# concatenation copying the whole string on every `+`. Peak memory is
+# measured separately under tracemalloc, which slows everything down.
+PROGRAMS = {
+    "append": '''
+s = "";
+i = 0;
+while (i < {n}) {{
+    s = s + "0123456789";
+    i = i + 1;
+}}
+println(s.count());
+''',
+    "numbers": '''
+s = "";
+for (i = 0; i < {n}; i = i + 1) {{
+    s = s + i + ",";
+}}
+println(s.count());
+''',
+    "lines in fn": '''
+fn build(n) {{
+    s = "";
+    for (i = 0; i < n; i = i + 1) {{
+        s = s + "line " + i + "\\n";
+    }}
+    return s;
+}}
+text = build({n});
+println(text.count());
+''',
+}
+
+def run_tree(statements):
+    Interpreter(statements, output=io.StringIO()).interpret()
+
+def run_closure(statements):
+    Interpreter(statements, mode="closure", output=io.StringIO()).interpret()
+
+def run_vm(statements):
+    VM(compile_program(statements), output=io.StringIO()).interpret()
+
+def run_python(statements):
+    PythonInterpreter(compile_python(statements), output=io.StringIO()).interpret()
+
+ENGINES = [("tree", run_tree), ("closure", run_closure), ("vm", run_vm), ("python", run_python)]
+
+def measure(run, statements, min_length):
+    saved = Rope.ROPE_MIN_LENGTH
+    Rope.ROPE_MIN_LENGTH = min_length
+    try:
+        start = time.perf_counter()
+        run(statements)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        run(statements)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        Rope.ROPE_MIN_LENGTH = saved
+    return elapsed, peak
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{iterations:,} appends per program")
+    print(f"{'program':<13}{'engine':<9}{'str':>10}{'rope':>10}{'speedup':>9}{'str peak':>11}{'rope peak':>11}")
+    for name, template in PROGRAMS.items():
+        statements = parse_source(template.format(n=iterations))
+        for engine, run in ENGINES:
+            plain, plain_peak = measure(run, statements, sys.maxsize)
+            rope, rope_peak = measure(run, statements, Rope.ROPE_MIN_LENGTH)
+            print(f"{name:<13}{engine:<9}{plain:>9.3f}s{rope:>9.3f}s{plain / rope:>8.1f}x"
+                  f"{plain_peak / 1024 / 1024:>9.1f}MB{rope_peak / 1024 / 1024:>9.1f}MB")
+
+if __name__ == "__main__":
+    main()
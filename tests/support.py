@@ -0,0 +1,29 @@
+import io
+
+from Batch import ENGINES, BatchOptions, load_source, make_interpreter
+from CallStack import DEFAULT_MAX_DEPTH
+from ErrorHandler import InterpreterError
+
+def run(source, engine="tree", optimize=False, memo_size=0, max_depth=DEFAULT_MAX_DEPTH):
+    # Memoization is off unless a test asks for it, so every engine runs every call.
+    options = BatchOptions(engine, optimize, memo_size, max_depth)
+    output = io.StringIO()
+    make_interpreter(load_source(source, options), options, output).interpret()
+    return output.getvalue()
+
+def outcome(source, engine, optimize=False, max_depth=DEFAULT_MAX_DEPTH):
+    # The output, ending with the error when the program stops on an InterpreterError.
+    options = BatchOptions(engine, optimize, 0, max_depth)
+    output = io.StringIO()
+    try:
+        make_interpreter(load_source(source, options), options, output).interpret()
+    except InterpreterError as e:
+        output.write(f"InterpreterError: {e}\n")
+    return output.getvalue()
+
+def run_everywhere(source, optimize=False, max_depth=DEFAULT_MAX_DEPTH):
+    return {engine: outcome(source, engine, optimize, max_depth) for engine in ENGINES}
+
+def assert_everywhere(source, expected, optimize=False, max_depth=DEFAULT_MAX_DEPTH):
+    # Same output from every engine, and the one expected.
+    assert run_everywhere(source, optimize, max_depth) == {engine: expected for engine in ENGINES}
@@ -0,0 +1,40 @@
+import glob
+
+from Lexer import parse_source
+from Cache import AstCache
+from Optimizer import dump
+
+def cached_load(path, cache_dir):
+    cache = AstCache(parse_source, cache_dir=str(cache_dir))
+    return dump(cache.load(str(path))), cache.stats
+
+def damage(cache_dir, old, new):
+    [cache_path] = glob.glob(str(cache_dir / "*.ast"))
+    with open(cache_path, "rb") as file:
+        data = file.read()
+    assert old in data
+    with open(cache_path, "wb") as file:
+        file.write(data.replace(old, new))
+
+def test_hit_after_write(tmp_path):
+    script = tmp_path / "hello.rpl"
+    script.write_text('println("for hello");\n')
+    first, stats = cached_load(script, tmp_path / "cache")
+    assert stats['misses'] == 1 and stats['writes'] == 1
+    second, stats = cached_load(script, tmp_path / "cache")
+    assert second == first
+    assert stats['hits'] == 1
+
+def test_payload_that_still_unpickles_is_rejected(tmp_path):
+    script = tmp_path / "hello.rpl"
+    script.write_text('println("for hello");\n')
+    expected, _ = cached_load(script, tmp_path / "cache")
+    # Same length, so the pickle stays loadable, only the checksum can tell.
+    damage(tmp_path / "cache", b"for hello", b"FOR HELLO")
+    statements, stats = cached_load(script, tmp_path / "cache")
+    assert statements == expected
+    assert stats['errors'] == 1 and stats['misses'] == 1 and stats['hits'] == 0
+    # The parse rewrote the entry.
+    statements, stats = cached_load(script, tmp_path / "cache")
+    assert statements == expected
+    assert stats['hits'] == 1
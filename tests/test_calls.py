@@ -0,0 +1,20 @@
+import pytest
+
+from support import assert_everywhere
+
+# Every engine counts call depth the same way, including fns that run
+# without a generator: ones that call nothing, with or without `return`.
+
+RETURNS_ONLY = "fn g(x) {\nreturn x;\n}\nfn k(x) {\nreturn 1 + g(x);\n}\nprintln(k(3));\n"
+NEITHER = "fn g(x) {\ny = x;\n}\nfn k(x) {\ng(x);\nreturn x;\n}\nprintln(k(3));\n"
+
+@pytest.mark.parametrize("optimize", [False, True])
+@pytest.mark.parametrize("source", [RETURNS_ONLY, NEITHER], ids=["returns", "neither"])
+def test_fn_that_calls_nothing_counts_towards_the_depth(source, optimize):
+    expected = "4\n" if source is RETURNS_ONLY else "3\n"
+    assert_everywhere(source, expected, optimize, max_depth=2)
+    assert_everywhere(source, "InterpreterError: Maximum call depth of 1 exceeded\n", optimize, max_depth=1)
+
+def test_output_before_the_depth_error_is_kept():
+    source = 'println("before");\n' + RETURNS_ONLY
+    assert_everywhere(source, "before\nInterpreterError: Maximum call depth of 1 exceeded\n", max_depth=1)
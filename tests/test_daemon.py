@@ -0,0 +1,73 @@
+import json
+import os
+import signal
+import socket
+
+import pytest
+
+import Daemon
+from Daemon import DaemonServer
+
+# One request's failure, however late it comes, is an answer to that client
+# and never takes the worker down.
+
+# Daemon.signal is the signal module itself, so keep the real one for cleanup.
+SETITIMER = signal.setitimer
+
+def replies(connection):
+    connection.shutdown(socket.SHUT_WR)
+    with connection.makefile("rb") as reader:
+        return [json.loads(line) for line in reader]
+
+@pytest.fixture
+def alarm_handler():
+    handler = signal.getsignal(signal.SIGALRM)
+    yield
+    SETITIMER(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, handler)
+
+def test_timeout_as_the_script_ends_is_an_answer(monkeypatch, alarm_handler):
+    def late_alarm(which, seconds):
+        if seconds == 0:
+            # Fires after interpret() returned, before the timer is off.
+            os.kill(os.getpid(), signal.SIGALRM)
+        return SETITIMER(which, seconds)
+    monkeypatch.setattr(Daemon.signal, "setitimer", late_alarm)
+    server, client = socket.socketpair()
+    with server, client:
+        answer = DaemonServer(timeout=5).run({'source': "println(1);", 'use_cache': False}, server)
+        server.close()
+        assert replies(client) == [{'output': "1\n"}]
+    assert answer['ok'] is False
+    assert (answer['error_type'], answer['error']) == ("InterpreterError", "Request timed out")
+
+class Stop(BaseException):
+    pass
+
+class Listener:
+    def __init__(self, connections):
+        self.connections = connections
+
+    def accept(self):
+        if not self.connections:
+            raise Stop()
+        return self.connections.pop(0), None
+
+def test_worker_survives_a_failing_request(monkeypatch):
+    pairs = [socket.socketpair() for _ in range(2)]
+    requests = []
+    def handle(connection):
+        requests.append(connection)
+        if len(requests) == 1:
+            raise RuntimeError("broken")
+        Daemon.send(connection, {'done': True, 'ok': True})
+    server = DaemonServer()
+    server.listener = Listener([worker_end for worker_end, _ in pairs])
+    monkeypatch.setattr(server, "handle", handle)
+    with pytest.raises(Stop):
+        server.work()
+    first, second = [replies(client) for _, client in pairs]
+    assert [(reply['ok'], reply['error_type'], reply['error']) for reply in first] == [(False, "RuntimeError", "broken")]
+    assert second == [{'done': True, 'ok': True}]
+    for worker_end, client in pairs:
+        client.close()
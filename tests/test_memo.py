@@ -0,0 +1,110 @@
+import io
+
+import pytest
+
+from Lexer import parse_source
+from Ast import Interpreter
+
+# Only pure fns are answered from the memo caches (see Memo.py), everything
+# else has to run on every call. Memoization is in the tree and closure engines.
+MODES = ["tree", "closure"]
+
+def run_memoized(source, mode):
+    output = io.StringIO()
+    interpreter = Interpreter(parse_source(source), mode=mode, output=output)
+    interpreter.interpret()
+    return output.getvalue(), interpreter.memo.stats()
+
+@pytest.mark.parametrize("mode", MODES)
+def test_pure_fn_is_cached(mode):
+    output, stats = run_memoized('''
+fn square(n) {
+    return n * n;
+}
+println(square(4) + square(4));
+''', mode)
+    assert output == "32\n"
+    assert stats['square']['hits'] == 1
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("source, expected", [
+    ('''
+fn shout(n) {
+    println(n);
+    return n;
+}
+shout(1);
+shout(1);
+''', "1\n1\n"),
+    ('''
+base = 10;
+fn offset(n) {
+    return n + base;
+}
+println(offset(1));
+base = 20;
+println(offset(1));
+''', "11\n21\n"),
+    ('''
+fn noisy(n) {
+    print("*");
+    return n;
+}
+fn wrap(n) {
+    return noisy(n) + 1;
+}
+println(wrap(1));
+println(wrap(1));
+''', "*2\n*2\n"),
+    ('''
+fn plain(n) {
+    # nomemo
+    return n * 2;
+}
+println(plain(3) + plain(3));
+''', "12\n"),
+], ids=["prints", "reads global", "calls impure fn", "nomemo"])
+def test_impure_fns_are_never_cached(mode, source, expected):
+    output, stats = run_memoized(source, mode)
+    assert output == expected
+    assert stats == {}
+
+@pytest.mark.parametrize("mode", MODES)
+def test_array_and_map_arguments_are_not_cached(mode):
+    output, stats = run_memoized('''
+fn first(items) {
+    return items[0];
+}
+list = [1];
+println(first(list));
+list[0] = 2;
+println(first(list));
+table = {0: 3};
+println(first(table));
+table[0] = 4;
+println(first(table));
+''', mode)
+    assert output == "1\n2\n3\n4\n"
+    assert stats['first']['hits'] == 0
+    assert stats['first']['size'] == 0
+    assert stats['first']['uncacheable'] == 4
+
+@pytest.mark.parametrize("mode", MODES)
+def test_redefined_callee_clears_caller_cache(mode):
+    output, stats = run_memoized('''
+fn base(n) {
+    return n;
+}
+fn twice(n) {
+    return base(n) * 2;
+}
+println(twice(3));
+println(twice(3));
+fn base(n) {
+    return n + 1;
+}
+println(twice(3));
+''', mode)
+    assert output == "6\n6\n8\n"
+    assert stats['twice']['hits'] == 1
+    assert stats['twice']['misses'] == 2
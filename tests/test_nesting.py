@@ -0,0 +1,79 @@
+import pytest
+
+from Lexer import parse_source
+from Resolver import resolve
+from Optimizer import optimize
+from ErrorHandler import InterpreterError
+from Batch import ENGINES
+from support import run
+
+# The parser and the resolver walk the tree over explicit stacks, so nesting
+# is only limited where an engine still recurses, and there it stops with an
+# InterpreterError instead of a RecursionError.
+
+def nested_ifs(depth):
+    return "x = 0;\n" + "if (1) {\n" * depth + "x = x + 1;\n" + "}\n" * depth + "println(x);\n"
+
+def negations(depth):
+    return "println(" + "-" * depth + "1);\n"
+
+def long_sum(terms):
+    return "y = " + " + ".join(["1"] * terms) + ";\nprintln(y);\n"
+
+def nested_whiles(depth):
+    return "x = 0;\n" + "while (x < 1) {\n" * depth + "x = x + 1;\n" + "}\n" * depth + "println(x);\n"
+
+def in_function(depth):
+    return "fn f(n) {\n" + "if (n) {\n" * depth + "m = n;\n" + "}\n" * depth + "return m;\n}\nprintln(f(3));\n"
+
+def test_resolver_handles_deep_nesting():
+    for source in (nested_ifs(3000), negations(3000), long_sum(20000)):
+        resolve(parse_source(source))
+    statements = resolve(parse_source(in_function(3000)))
+    function = statements[0]
+    assert function.local_names == ['n', 'm']
+    innermost = function.body[0]
+    while isinstance(innermost.true_statements[0], type(innermost)):
+        innermost = innermost.true_statements[0]
+    assignment = innermost.true_statements[0]
+    assert assignment.slot == 1 and assignment.value.slot == 0
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("source", [nested_ifs(3000), negations(3000), in_function(3000)],
+                         ids=["ifs", "negations", "fn"])
+def test_too_deep_is_an_interpreter_error(engine, source):
+    with pytest.raises(InterpreterError, match="nested too deeply"):
+        run(source, engine)
+
+@pytest.mark.parametrize("engine", ["tree", "vm"])
+def test_long_sum_too_deep_is_an_interpreter_error(engine):
+    with pytest.raises(InterpreterError, match="nested too deeply"):
+        run(long_sum(20000), engine)
+
+def test_closure_engine_runs_long_chains_in_a_loop():
+    assert run(long_sum(800), "closure") == "800\n"
+    assert run(long_sum(20000), "closure") == "20000\n"
+    # With a call in the chain it runs as steps.
+    source = "fn g(n) {\nreturn n;\n}\nfn f() {\nreturn " + " + ".join(["g(1)"] * 800) + ";\n}\nprintln(f());\n"
+    assert run(source, "closure") == "800\n"
+
+def test_python_engine_flattens_long_chains():
+    assert run(long_sum(300), "python") == "300\n"
+    assert run(long_sum(20000), "python") == "20000\n"
+    assert run('println("a" + ' + " + ".join(["1"] * 40) + ' == "a' + "1" * 40 + '");', "python") == "True\n"
+
+def test_python_engine_falls_back_to_the_vm():
+    # Past CPython's 100 levels of indentation and 20 nested loops.
+    assert run(nested_ifs(120), "python") == "1\n"
+    assert run(nested_whiles(25), "python") == "1\n"
+    assert run(in_function(400), "python") == "3\n"
+
+def test_optimizer_too_deep_is_an_interpreter_error():
+    with pytest.raises(InterpreterError, match="nested too deeply for the optimizer"):
+        optimize(parse_source(nested_ifs(3000)))
+
+@pytest.mark.parametrize("engine", ["tree", "vm", "python"])
+def test_moderate_nesting_runs(engine):
+    assert run(nested_ifs(200), engine) == "1\n"
+    assert run(negations(201), engine) == "-1\n"
+    assert run(long_sum(500), engine) == "500\n"
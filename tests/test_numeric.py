@@ -0,0 +1,62 @@
+import pytest
+
+import NumericArray
+from Batch import ENGINES
+from support import assert_everywhere, run
+
+# Numeric arrays give the same results on either backend. numpy wraps int64
+# silently and divides by zero into inf, so its results are checked against
+# what array.array gives.
+
+@pytest.fixture(params=["array", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(NumericArray, "numpy", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(NumericArray, "numpy", None)
+    return request.param
+
+HALF = 2 ** 62
+NUMS = "t = [1, 2, 3];\na = t.numeric();\n"
+IN_METHOD = "InterpreterError: Error executing method {} on object {}: "
+BIG = f"t = [{HALF}, {HALF}, 1];\nb = t.numeric();\n"
+
+CASES = [
+    (NUMS + "println(a * 2 + 1);\nprintln(a < 2);\nprintln(a / 2);\nprintln(a[1 == 1]);\n",
+     "[3, 5, 7]\n[1, 0, 0]\n[0.5, 1.0, 1.5]\n2\n"),
+    (NUMS + 'a[0] = "z";\n', "InterpreterError: Numeric arrays only hold integers, got 'z'\n"),
+    (NUMS + "a[0] = 3 / 2;\n", "InterpreterError: Numeric arrays only hold integers, got 1.5\n"),
+    (NUMS + 'a.set(1, "z");\n', f"{IN_METHOD.format('set', 'a')}Numeric arrays only hold integers, got 'z'\n"),
+    (NUMS + 'a.append("z");\nprintln(a);\n',
+     f"{IN_METHOD.format('append', 'a')}Numeric arrays only hold integers, got 'z'\n"),
+    (NUMS + "a.append(4);\nprintln(a.sum());\n", "10\n"),
+    (BIG + "println(b + b);\n", "InterpreterError: Value out of range for a 64-bit numeric array\n"),
+    (BIG + "println(b * 2);\n", "InterpreterError: Value out of range for a 64-bit numeric array\n"),
+    (BIG + "println(0 - b - b - b);\n", "InterpreterError: Value out of range for a 64-bit numeric array\n"),
+    (BIG + f"println(b + {HALF - 1});\nprintln(b * 0 - b - b);\n",
+     f"[{2 ** 63 - 1}, {2 ** 63 - 1}, {HALF}]\n[{-2 ** 63}, {-2 ** 63}, -2]\n"),
+    (BIG + f"println(b * 0 + {2 ** 64});\n", "InterpreterError: Value out of range for a 64-bit numeric array\n"),
+    (BIG + "println(b.sum());\n", f"{2 * HALF + 1}\n"),
+    (BIG + "c = b * 0 - b - b;\nprintln(c.abs());\n",
+     f"{IN_METHOD.format('abs', 'c')}Value out of range for a 64-bit numeric array\n"),
+    (NUMS + "println(a.clip(2, 3 / 2));\n", f"{IN_METHOD.format('clip', 'a')}Numeric arrays only hold integers, got 1.5\n"),
+]
+
+# Element writes report the value or the index, whichever is wrong.
+CASES += [
+    (NUMS + 'a[5] = "z";\n', "InterpreterError: Numeric arrays only hold integers, got 'z'\n"),
+    (NUMS + "a[5] = 1;\n", "InterpreterError: Index 5 out of range for numeric array of 3\n"),
+    (NUMS + 'a["x"] = 1;\n', "InterpreterError: Can't index numeric array with string\n"),
+    (NUMS + f"a[0] = {2 ** 63};\n", "InterpreterError: Value out of range for a 64-bit numeric array\n"),
+    (NUMS + "a[0 - 1] = 9;\nprintln(a);\n", "[1, 2, 9]\n"),
+]
+
+@pytest.mark.parametrize("source, expected", CASES)
+def test_backends_agree(backend, source, expected):
+    assert_everywhere(source, expected)
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("division", ["a / 0", "6 / (a - 2)", "a / (a * 0)"])
+def test_division_by_zero(backend, engine, division):
+    with pytest.raises(ZeroDivisionError):
+        run(NUMS + f"println({division});\n", engine)
@@ -0,0 +1,119 @@
+import io
+import random
+
+import pytest
+
+from Lexer import parse_source
+from Optimizer import optimize, dump
+from Batch import ENGINES, BatchOptions, load_source, make_interpreter
+from support import assert_everywhere
+
+# --optimize must never change what a program prints: explicit cases for each
+# rewrite, then random programs run with and without it on every engine.
+
+def optimized(source):
+    return dump(optimize(parse_source(source)))
+
+def test_folds_string_concatenation():
+    assert optimized('println("a" + 1);') == ['PrintStatement(StringLiteral("a1"))']
+    assert optimized('println(2 * 3 + "a");') == ['PrintStatement(StringLiteral("6a"))']
+    assert_everywhere('println("a" + 1); println(2 * 3 + "a");', "a1\n6a\n", optimize=True)
+
+def test_dead_branch_is_not_folded_into_an_error():
+    assert optimized('if (0) { x = 1 / 0; }') == []
+    assert_everywhere('if (0) { x = 1 / 0; } println(x);', "0\n", optimize=True)
+
+def test_live_division_by_zero_is_left_to_run_time():
+    assert optimized('x = 1 / 0;') == ['AssignmentStatement(x, BinaryExpression(IntegerLiteral(1), /, IntegerLiteral(0)))']
+
+def test_empty_for_loop_keeps_final_counter():
+    source = 'for (i = 0; i < 5; i = i + 2) { } println(i);'
+    assert optimized(source) == ['AssignmentStatement(i, IntegerLiteral(6))', 'PrintStatement(Identifier(i))']
+    assert_everywhere(source, "6\n")
+    assert_everywhere(source, "6\n", optimize=True)
+
+def test_for_loop_that_never_runs_keeps_start():
+    source = 'for (i = 7; i < 5; i = i + 1) { println(i); } println(i);'
+    assert optimized(source) == ['AssignmentStatement(i, IntegerLiteral(7))', 'PrintStatement(Identifier(i))']
+    assert_everywhere(source, "7\n", optimize=True)
+
+def test_false_while_loop_is_dropped():
+    source = 'while (0) { println("never"); } println("after");'
+    assert optimized(source) == ['PrintStatement(StringLiteral("after"))']
+    assert_everywhere(source, "after\n", optimize=True)
+
+class ProgramGenerator:
+    # Small random programs mixing constants and variables, so some of every
+    # expression folds and some doesn't, with loops that always end.
+    NAMES = ['a', 'b', 'c', 'n', 's']
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def expression(self, depth=0):
+        r = self.random.random()
+        if depth > 2 or r < 0.3:
+            kind = self.random.random()
+            if kind < 0.5:
+                return str(self.random.randint(0, 9))
+            if kind < 0.58:
+                return '"' + self.random.choice(['x', 'yy', '', 'z1']) + '"'
+            return self.random.choice(self.NAMES)
+        if r < 0.4:
+            return '-' + self.expression(depth + 1)
+        operator = self.random.choice(['+', '-', '*', '<', '>', '==', '!=', '<=', '>=', '+', '+'])
+        return f"{self.expression(depth + 1)} {operator} {self.expression(depth + 1)}"
+
+    def block(self, depth, in_function=False):
+        return "\n".join(self.statement(depth, in_function) for _ in range(self.random.randint(1, 4)))
+
+    def statement(self, depth, in_function=False):
+        r = self.random.random()
+        if depth > 2:
+            r *= 0.5
+        if r < 0.3:
+            return f"{self.random.choice(self.NAMES)} = {self.expression()};"
+        if r < 0.5:
+            return f"println({self.expression()});"
+        if r < 0.6:
+            return (f"if ({self.expression()}) {{\n{self.block(depth + 1, in_function)}\n}} "
+                    f"else {{\n{self.block(depth + 1, in_function)}\n}}")
+        if r < 0.7:
+            counter = self.random.choice(['i', 'j']) + 'abcd'[depth]
+            return (f"for ({counter} = {self.random.randint(-2, 3)}; {counter} < {self.random.randint(0, 5)}; "
+                    f"{counter} = {counter} + {self.random.randint(1, 2)}) {{\n{self.block(depth + 1, in_function)}\n}}")
+        if r < 0.75:
+            return f"for (k = 0; k < {self.random.randint(0, 4)}; k = k + 1) {{\n}}"
+        if r < 0.8:
+            counter = 'w' + 'xyzu'[depth]
+            return (f"{counter} = 0; while ({counter} < {self.random.randint(0, 3)}) {{\n"
+                    f"{self.block(depth + 1, in_function)}\n{counter} = {counter} + 1;\n}}")
+        if r < 0.85 and not in_function:
+            return f"f({self.expression()}, {self.expression()});"
+        if r < 0.9:
+            return 'arr = [1, "q", 3]; arr.append(a); println(arr.count());'
+        if r < 0.95:
+            return f'if (1 {self.random.choice(["==", "<", ">"])} 2) {{ println("const"); }}'
+        return "while (0) { println(n); }"
+
+    def program(self):
+        return "fn f(a, b) {\n" + self.block(1, True) + "\n}\n" + self.block(0)
+
+def outcome(source, engine, optimize):
+    # What the program printed, and the type of the error that stopped it, if any.
+    options = BatchOptions(engine, optimize, 0)
+    output = io.StringIO()
+    try:
+        make_interpreter(load_source(source, options), options, output).interpret()
+    except Exception as e:
+        return output.getvalue(), type(e).__name__
+    return output.getvalue(), None
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_programs_unchanged_by_optimizer(seed):
+    generator = ProgramGenerator(seed)
+    for _ in range(10):
+        source = generator.program()
+        expected = outcome(source, "tree", False)
+        for engine in ENGINES:
+            assert outcome(source, engine, True) == expected, source
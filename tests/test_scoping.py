@@ -0,0 +1,93 @@
+from support import assert_everywhere
+
+# The scoping rules of Resolver.py, which every engine has to agree on.
+
+def test_parameter_shadows_global():
+    assert_everywhere('''
+x = 1;
+fn show(x) {
+    println(x);
+}
+show(2);
+println(x);
+''', "2\n1\n")
+
+def test_unassigned_local_reads_global():
+    assert_everywhere('''
+x = 5;
+fn f() {
+    println(x);
+    x = x + 1;
+    println(x);
+}
+f();
+f();
+println(x);
+''', "5\n6\n5\n6\n5\n")
+
+def test_global_read_sees_later_assignment():
+    assert_everywhere('''
+fn show() {
+    println(limit);
+}
+limit = 1;
+show();
+limit = 2;
+show();
+''', "1\n2\n")
+
+def test_writes_inside_fn_do_not_leak():
+    assert_everywhere('''
+total = 10;
+fn f(n) {
+    total = n;
+    fresh = n;
+    for (i = 0; i < 3; i = i + 1) {
+        total = total + i;
+    }
+    return total;
+}
+println(f(1));
+println(total);
+println(fresh);
+println(i);
+''', "4\n10\n0\n0\n")
+
+def test_callee_does_not_see_caller_locals():
+    assert_everywhere('''
+fn inner() {
+    println(a);
+}
+fn outer() {
+    a = 7;
+    inner();
+}
+a = 1;
+outer();
+''', "1\n")
+
+def test_nested_fn_does_not_capture_enclosing_locals():
+    assert_everywhere('''
+x = 1;
+fn outer(y) {
+    x = 2;
+    fn inner() {
+        println(x);
+        println(y);
+    }
+    inner();
+}
+outer(3);
+''', "1\n0\n")
+
+def test_each_call_has_its_own_frame():
+    assert_everywhere('''
+fn count(n) {
+    seen = n;
+    if (n > 0) {
+        count(n - 1);
+    }
+    println(seen);
+}
+count(2);
+''', "0\n1\n2\n")